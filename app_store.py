@@ -0,0 +1,544 @@
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import datetime
+
+from classification_cache import normalize_subject
+from run_metrics import count, get_logger
+
+log = get_logger(__name__)
+
+STORE_FILE = os.environ.get("STORE_FILE", "job_applications.db")
+
+STORE_COLUMNS = [
+    "company",
+    "job_title",
+    "date_applied",
+    "response_type",
+    "subject",
+    "email",
+    "thread_id",
+    "preview",
+]
+
+UNKNOWN = {"", "unknown"}
+PENDING_STATUSES = ("Applied", "No Reply Yet")  # still waiting on the company
+_WHITESPACE = re.compile(r"\s+")
+
+_store = None
+
+_ADD_NEW = """
+    INSERT INTO status_daily VALUES (coalesce(NEW.response_type, ''), coalesce(NEW.date_applied, ''), 1)
+    ON CONFLICT (response_type, day) DO UPDATE SET applications = applications + 1;
+"""
+_REMOVE_OLD = """
+    UPDATE status_daily SET applications = applications - 1
+    WHERE response_type = coalesce(OLD.response_type, '') AND day = coalesce(OLD.date_applied, '');
+"""
+STATUS_TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS status_daily_insert AFTER INSERT ON applications BEGIN {_ADD_NEW} END;
+    CREATE TRIGGER IF NOT EXISTS status_daily_update AFTER UPDATE OF response_type, date_applied ON applications
+    WHEN OLD.response_type IS NOT NEW.response_type OR OLD.date_applied IS NOT NEW.date_applied
+    BEGIN {_REMOVE_OLD} {_ADD_NEW} END;
+    CREATE TRIGGER IF NOT EXISTS status_daily_delete AFTER DELETE ON applications BEGIN {_REMOVE_OLD} END;
+"""
+
+
+def _key(value: str) -> str:
+    return _WHITESPACE.sub(" ", value).strip().lower()
+
+
+def application_keys(record: dict) -> list:
+    """Index keys that identify the application an email belongs to, most specific first."""
+    company = _key(_text(record.get("company")))
+    title = _key(_text(record.get("job_title")))
+    keys = []
+    if record.get("conversation_id"):
+        keys.append(f"conv:{record['conversation_id']}")
+    if company not in UNKNOWN and title not in UNKNOWN:
+        keys.append(f"title:{company}|{title}")
+    # Scoped by company: ATS confirmations share generic subjects across employers
+    keys.append(f"subj:{company}|{normalize_subject(_text(record.get('subject')))}")
+    return keys
+
+
+def _text(value) -> str:
+    # Rows read back from a workbook carry NaN/NaT for blanks and Timestamps for dates
+    # (NaN and NaT are the only values unequal to themselves, so pandas need not be imported)
+    if value is None or (not isinstance(value, str) and value != value):
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+class ApplicationStore:
+    """Transactional home of the tracker; the workbook is exported from here."""
+
+    def __init__(self, path: str = STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS applications (
+                    thread_id TEXT PRIMARY KEY,
+                    company TEXT,
+                    job_title TEXT,
+                    date_applied TEXT,
+                    response_type TEXT,
+                    subject TEXT,
+                    email TEXT,
+                    preview TEXT,
+                    updated_at TEXT
+                )
+            """)
+            # Which stage labelled the latest email: "rules", "local" or "llm" (local_classifier skips "local")
+            if "label_source" not in {c["name"] for c in self.conn.execute("PRAGMA table_info(applications)")}:
+                self.conn.execute("ALTER TABLE applications ADD COLUMN label_source TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_email ON applications(email)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_company ON applications(company)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_date ON applications(date_applied)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Application index: conversation / company+title / company+subject → application
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS application_keys (
+                    key TEXT PRIMARY KEY,
+                    thread_id TEXT NOT NULL
+                ) WITHOUT ROWID
+            """)
+            # Merging applications (rebuild_companies) moves keys by application
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_application_keys_thread ON application_keys(thread_id)")
+            # Status timeline: every email that touched an application
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS status_events (
+                    thread_id TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    date TEXT,
+                    response_type TEXT,
+                    subject TEXT,
+                    email TEXT,
+                    PRIMARY KEY (thread_id, event_id)
+                ) WITHOUT ROWID
+            """)
+            # Applications per status and day, kept current by triggers as statuses change,
+            # so summaries read a few hundred rows instead of scanning every application
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS status_daily (
+                    response_type TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    applications INTEGER NOT NULL,
+                    PRIMARY KEY (response_type, day)
+                ) WITHOUT ROWID
+            """)
+            self.conn.executescript(STATUS_TRIGGERS)
+        self.index_existing()
+        self.aggregate_existing()
+        self._companies = None
+
+    @property
+    def companies(self):
+        """The company index, loaded on first use (None when COMPANY_INDEX=off)."""
+        if self._companies is None:
+            from company_index import CompanyIndex, company_index_enabled
+
+            if not company_index_enabled():
+                return None
+            self._companies = CompanyIndex(self.conn)
+            if not self.get_meta("company_index"):
+                # Learn the companies already in the store as spelled; clustering and re-filing them is
+                # rebuild_companies(apply=True)
+                with self.conn:
+                    self._companies.rebuild(
+                        self.conn.execute("SELECT thread_id, company, email, subject FROM applications"), fuzzy=False)
+                    self.set_meta("company_index", 1)
+        return self._companies
+
+    def get_meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def version(self) -> int:
+        return int(self.get_meta("data_version", 0))
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+
+    def resolve(self, record: dict) -> str:
+        """The application an email belongs to: an indexed key lookup, O(log n) in the store size.
+
+        A known conversation wins, then the same company and job title, then
+        the same company and subject (Re:/Fwd: stripped). A status update
+        without a job title joins the company's application when there is
+        exactly one. Otherwise the email starts a new application.
+        """
+        for key in application_keys(record):
+            row = self.conn.execute("SELECT thread_id FROM application_keys WHERE key = ?", (key,)).fetchone()
+            if row:
+                return row["thread_id"]
+
+        company = _text(record.get("company"))
+        if (_key(_text(record.get("job_title"))) in UNKNOWN and company.lower() not in UNKNOWN
+                and _text(record.get("response_type")) not in ("", "Applied")):
+            rows = self.conn.execute(
+                "SELECT thread_id FROM applications WHERE company = ? LIMIT 2", (company,)
+            ).fetchall()
+            if len(rows) == 1:
+                return rows[0]["thread_id"]
+
+        return record.get("conversation_id") or f"{_key(company)}|{_text(record.get('thread_id')).lower().strip()}"
+
+    def upsert(self, records: list, resolve: bool = True) -> int:
+        """Fold emails into their applications in one transaction; returns applications touched.
+
+        Each record is resolved to its application (see resolve) and its
+        `thread_id` is set to that application's id. The newest email sets
+        the status, a known company or job title is never replaced by
+        "Unknown", and every email is added to the application's timeline.
+        With resolve=False the records' own thread_id is the application id
+        (rows imported from a workbook).
+        """
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        changed = 0
+        with self.conn:
+            # Oldest first, so the newest email of an application wins
+            for r in sorted(records, key=lambda r: _text(r.get("date_applied"))[:10]):
+                if resolve and self.companies is not None:
+                    r["company"] = self.companies.resolve(r)
+                thread_id = self.resolve(r) if resolve else _text(r.get("thread_id")).lower().strip()
+                if not thread_id:
+                    continue
+                r["thread_id"] = thread_id
+                row = (
+                    thread_id,
+                    _text(r.get("company")),
+                    _text(r.get("job_title")),
+                    _text(r.get("date_applied"))[:10],
+                    _text(r.get("response_type")),
+                    _text(r.get("subject")),
+                    _text(r.get("email")),
+                    _text(r.get("preview")),
+                    now,
+                    _text(r.get("label_source")),
+                )
+                before = self.conn.total_changes
+                # Only rewrite a row when something other than the timestamp differs
+                self.conn.execute("""
+                    INSERT INTO applications
+                        (thread_id, company, job_title, date_applied, response_type, subject, email, preview, updated_at,
+                         label_source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(thread_id) DO UPDATE SET
+                        company = CASE WHEN lower(excluded.company) IN ('', 'unknown')
+                                       THEN applications.company ELSE excluded.company END,
+                        job_title = CASE WHEN lower(excluded.job_title) IN ('', 'unknown')
+                                         THEN applications.job_title ELSE excluded.job_title END,
+                        date_applied = excluded.date_applied,
+                        response_type = excluded.response_type,
+                        subject = excluded.subject,
+                        email = excluded.email,
+                        preview = excluded.preview,
+                        updated_at = excluded.updated_at,
+                        label_source = excluded.label_source
+                    WHERE excluded.date_applied >= applications.date_applied
+                      AND (applications.response_type IS NOT excluded.response_type
+                           OR (applications.company IS NOT excluded.company
+                               AND lower(excluded.company) NOT IN ('', 'unknown'))
+                           OR (applications.job_title IS NOT excluded.job_title
+                               AND lower(excluded.job_title) NOT IN ('', 'unknown'))
+                           OR applications.date_applied IS NOT excluded.date_applied)
+                """, row)
+                changed += self.conn.total_changes - before
+                self._index(thread_id, r)
+            if changed:
+                self.set_meta("data_version", self.version + 1)
+        count("store.emails_upserted", len(records))
+        count("store.rows_changed", changed)
+        return changed
+
+    def _index(self, thread_id: str, r: dict):
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO application_keys VALUES (?, ?)",
+            [(key, thread_id) for key in application_keys(r)],
+        )
+        date = _text(r.get("date_applied"))[:10]
+        event_id = _text(r.get("message_id")) or f"{date}|{_text(r.get('email'))}|{_text(r.get('subject'))}"
+        self.conn.execute(
+            "INSERT OR IGNORE INTO status_events VALUES (?, ?, ?, ?, ?, ?)",
+            (thread_id, event_id, date, _text(r.get("response_type")), _text(r.get("subject")), _text(r.get("email"))),
+        )
+
+    def index_existing(self):
+        """One-time: index and seed the timeline of applications stored before the index existed."""
+        if self.get_meta("application_index"):
+            return
+        with self.conn:
+            for row in self.conn.execute("SELECT * FROM applications").fetchall():
+                self._index(row["thread_id"], dict(row))
+            self.set_meta("application_index", 1)
+
+    def aggregate_existing(self):
+        """One-time: seed status_daily from applications stored before the triggers existed."""
+        if self.get_meta("status_daily"):
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM status_daily")
+            self.conn.execute("""
+                INSERT INTO status_daily
+                SELECT coalesce(response_type, ''), coalesce(date_applied, ''), COUNT(*)
+                FROM applications GROUP BY 1, 2
+            """)
+            self.set_meta("status_daily", 1)
+
+    def rebuild_companies(self, apply: bool = False, backup: bool = True) -> tuple:
+        """Rebuild the company index from history and plan re-filing every application under its canonical company.
+
+        Returns (renames, merges): {thread_id: canonical company} and the
+        (keep, drop) pairs of applications to fold together. Two applications
+        are merged only if they end up with the same company and job title
+        and either had the same company before (a spelling variant such as
+        "ACME Inc" / "Acme") or came from a sender alias voted to that
+        company; a fuzzy name match alone only renames. Nothing changes
+        unless `apply`, which first backs the database up and logs every merge.
+        Without it the index is rolled back too, so later syncs never file
+        mail under a fuzzy match nobody applied.
+        """
+        from company_index import CompanyIndex, company_index_enabled
+
+        if not company_index_enabled():
+            return {}, []
+        if apply and backup:
+            log.info(f"💾 Backed up {self.path} to {self.backup()}")
+        if self._companies is None:
+            self._companies = CompanyIndex(self.conn)
+        rows = [dict(row) for row in self.conn.execute(
+            "SELECT thread_id, company, job_title, date_applied, email, subject FROM applications")]
+        try:
+            renames = self._companies.rebuild([(r["thread_id"], r["company"], r["email"], r["subject"]) for r in rows])
+            self.set_meta("company_index", 1)
+            merges = self._plan_merges(rows, renames)
+        except BaseException:
+            self._discard_rebuild()
+            raise
+        if not apply:
+            self._discard_rebuild()
+            return renames, merges
+
+        # Still the rebuild's transaction: the new index commits together with the re-filed applications
+        with self.conn:
+            self.conn.executemany("UPDATE applications SET company = ? WHERE thread_id = ?",
+                                  [(company, thread_id) for thread_id, company in renames.items()])
+            by_id = {r["thread_id"]: r for r in rows}
+            for keep, drop in merges:
+                row = by_id[drop]
+                log.info(f"🔗 Merged {row['company']} | {row['job_title']} ({drop}) into {keep}")
+                self._merge_applications(keep, drop)
+            dropped = {drop for _, drop in merges}
+            # Re-index the renamed applications under their new company + title keys
+            for row in self.fetch(set(renames) - dropped):
+                self._index(row["thread_id"], row)
+            if renames:
+                self.set_meta("data_version", self.version + 1)
+        log.info(f"🏢 Renamed {len(renames)} applications to their canonical company, "
+                 f"merged {len(merges)} duplicates")
+        return renames, merges
+
+    def _discard_rebuild(self):
+        self.conn.rollback()
+        self._companies.load()
+
+    def _plan_merges(self, rows: list, renames: dict) -> list:
+        """(keep, drop) pairs: renamed applications that duplicate another one on strong evidence."""
+        from company_index import company_key, sender_aliases
+
+        groups = defaultdict(list)
+        for r in rows:
+            company = renames.get(r["thread_id"], r["company"])
+            title = _key(_text(r["job_title"]))
+            if _key(_text(company)) not in UNKNOWN and title not in UNKNOWN:
+                groups[company, title].append(r)
+
+        merges = []
+        for (company, _), group in groups.items():
+            if len(group) < 2 or not any(r["thread_id"] in renames for r in group):
+                continue
+            company_id = self._companies.company_id(company, create=False)
+            # Rows sharing a piece of evidence are one application: union-find over the evidence
+            parent = list(range(len(group)))
+
+            def root(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            first = {}
+            for i, r in enumerate(group):
+                evidence = [f"name:{company_key(_text(r['company']))}"] + [
+                    alias for alias in sender_aliases(_text(r["email"]))[1]
+                    if company_id and self._companies.sender_company((alias,)) == company_id]
+                for token in evidence:
+                    parent[root(i)] = root(first.setdefault(token, i))
+            clusters = defaultdict(list)
+            for i, r in enumerate(group):
+                clusters[root(i)].append(r)
+            for members in clusters.values():
+                if len(members) < 2 or not any(r["thread_id"] in renames for r in members):
+                    continue
+                members.sort(key=lambda r: (_text(r["date_applied"]), r["thread_id"]))
+                merges.extend((members[0]["thread_id"], r["thread_id"]) for r in members[1:])
+        return merges
+
+    def backup(self, path: str = None) -> str:
+        """Copy the database (consistently, while open) to `path`, by default a timestamped file next to it."""
+        path = path or f"{os.path.splitext(self.path)[0]}.{datetime.utcnow():%Y%m%dT%H%M%S}.bak.db"
+        target = sqlite3.connect(path)
+        try:
+            self.conn.backup(target)
+        finally:
+            target.close()
+        return path
+
+    def _merge_applications(self, keep: str, drop: str) -> int:
+        """Fold application `drop` into `keep`: timeline, index keys and, if newer, its status."""
+        newer = self.conn.execute(
+            "SELECT * FROM applications WHERE thread_id = ? AND date_applied > "
+            "(SELECT date_applied FROM applications WHERE thread_id = ?)", (drop, keep)).fetchone()
+        if newer:
+            self.conn.execute(
+                "UPDATE applications SET date_applied = ?, response_type = ?, subject = ?, email = ?, preview = ?, "
+                "updated_at = ? WHERE thread_id = ?",
+                (newer["date_applied"], newer["response_type"], newer["subject"], newer["email"], newer["preview"],
+                 newer["updated_at"], keep))
+        self.conn.execute("INSERT OR IGNORE INTO status_events SELECT ?, event_id, date, response_type, subject, email "
+                          "FROM status_events WHERE thread_id = ?", (keep, drop))
+        self.conn.execute("DELETE FROM status_events WHERE thread_id = ?", (drop,))
+        self.conn.execute("UPDATE OR IGNORE application_keys SET thread_id = ? WHERE thread_id = ?", (keep, drop))
+        self.conn.execute("DELETE FROM application_keys WHERE thread_id = ?", (drop,))
+        self.conn.execute("DELETE FROM applications WHERE thread_id = ?", (drop,))
+        return 1
+
+    def status_summary(self, pending: tuple = PENDING_STATUSES, stale_before: str = None) -> dict:
+        """Applications per status, and how many are pending (older than `stale_before`: stale).
+
+        Read from the status_daily aggregate, never from the applications table.
+        """
+        counts = {}
+        stale = 0
+        oldest = None
+        rows = self.conn.execute("SELECT response_type, day, applications FROM status_daily WHERE applications > 0")
+        for status, day, n in rows:
+            counts[status] = counts.get(status, 0) + n
+            if status in pending:
+                oldest = day if oldest is None or day < oldest else oldest
+                stale += n if stale_before and day < stale_before else 0
+        return {
+            "counts": dict(sorted(counts.items(), key=lambda c: -c[1])),
+            "pending": sum(counts.get(status, 0) for status in pending),
+            "stale": stale,
+            "oldest_pending": oldest,
+        }
+
+    def fetch(self, thread_ids) -> list:
+        """Current rows of the given applications (primary-key lookups, not a table scan)."""
+        thread_ids = list(thread_ids)
+        rows = []
+        for i in range(0, len(thread_ids), 500):
+            chunk = thread_ids[i:i + 500]
+            rows.extend(self.conn.execute(
+                f"SELECT {', '.join(STORE_COLUMNS)} FROM applications "
+                f"WHERE thread_id IN ({', '.join('?' * len(chunk))})", chunk
+            ))
+        return [dict(row) for row in rows]
+
+    def timeline(self, thread_id: str) -> list:
+        """Every email recorded for an application, oldest first."""
+        rows = self.conn.execute(
+            "SELECT date, response_type, subject, email FROM status_events WHERE thread_id = ? ORDER BY date, event_id",
+            (thread_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def find(self, company: str) -> list:
+        """Applications at a company (indexed lookup), newest first."""
+        rows = self.conn.execute(
+            f"SELECT {', '.join(STORE_COLUMNS)} FROM applications WHERE company = ? ORDER BY date_applied DESC",
+            (company,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fetch_all(self) -> list:
+        rows = self.conn.execute(
+            f"SELECT {', '.join(STORE_COLUMNS)} FROM applications ORDER BY date_applied, thread_id"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def labelled_examples(self, labels: list, exclude_sources: tuple = ()) -> list:
+        """(subject, preview, label) of every application labelled one of `labels` by none of `exclude_sources`."""
+        return [tuple(row) for row in self.conn.execute(
+            f"SELECT subject, preview, response_type FROM applications "
+            f"WHERE response_type IN ({', '.join('?' * len(labels))}) "
+            f"AND coalesce(label_source, '') NOT IN ({', '.join('?' * len(exclude_sources))}) "
+            f"ORDER BY date_applied, thread_id", (*labels, *exclude_sources))]
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.read_sql_query(
+            f"SELECT {', '.join(STORE_COLUMNS)} FROM applications ORDER BY date_applied, thread_id", self.conn
+        )
+
+    def export_needed(self, excel_file: str) -> bool:
+        """True when data changed since the last export, the day rolled over (staleness
+        is date-based), or the workbook is missing."""
+        if not os.path.exists(excel_file):
+            return True
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        return (
+            self.get_meta("exported_version") != str(self.version)
+            or self.get_meta("exported_on") != today
+        )
+
+    def mark_exported(self):
+        with self.conn:
+            self.set_meta("exported_version", self.version)
+            self.set_meta("exported_on", datetime.utcnow().strftime("%Y-%m-%d"))
+
+    def migrate_from_excel(self, excel_file: str) -> int:
+        """One-time import of every sheet of an existing tracker workbook."""
+        if self.get_meta("migrated_from_xlsx") or not os.path.exists(excel_file):
+            return 0
+
+        import pandas as pd
+
+        sheets = pd.read_excel(excel_file, sheet_name=None)
+        records = []
+        for df in sheets.values():
+            if "thread_id" not in df.columns:
+                continue
+            records.extend(df.to_dict("records"))
+
+        # Workbook rows already are applications; keep their ids
+        imported = self.upsert(records, resolve=False)
+        with self.conn:
+            self.set_meta("migrated_from_xlsx", excel_file)
+        log.info(f"📦 Migrated {imported} rows from {excel_file} into {self.path}")
+        return imported
+
+    def close(self):
+        self.conn.close()
+
+
+def get_store(excel_file: str = None) -> ApplicationStore:
+    """Open the shared store, importing the legacy workbook on first use."""
+    global _store
+    if _store is None:
+        _store = ApplicationStore()
+        if excel_file and _store.count() == 0:
+            _store.migrate_from_excel(excel_file)
+    return _store
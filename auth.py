@@ -1,9 +1,15 @@
-from datetime import datetime
 import json
 import os
 from msal import PublicClientApplication, ConfidentialClientApplication
+from run_metrics import get_logger
+from token_cache import get_http_cache, get_token_cache
 
-TOKEN_FILE = "tokens.json"
+log = get_logger(__name__)
+
+TOKEN_FILE = "tokens.json"  # legacy single-token file, migrated into the token cache
+
+_token_cache = None
+_http_cache = None
 
 def load_config():
     scopes_raw = os.environ.get("SCOPES", "Mail.Read")
@@ -15,83 +21,99 @@ def load_config():
         "scopes": scopes,
         "output_excel": os.environ.get("OUTPUT_EXCEL", "job_applications.xlsx"),
         "report_output_folder": os.environ.get("REPORT_OUTPUT_FOLDER", "reports"),
-        "user_email": os.environ.get("USER_EMAIL", "kalany.a@hotmail.com")
+        "user_email": os.environ.get("USER_EMAIL", "kalany.a@hotmail.com"),
+        # Cohort mode: several mailboxes (comma or whitespace separated), app-only auth
+        "mailboxes": os.environ.get("MAILBOXES", "").replace(",", " ").split(),
     }
 
-def save_token(token):
-    # Add expires_on if missing (valid for 1 hour by default)
-    if "expires_on" not in token:
-        token["expires_on"] = int((datetime.utcnow() + timedelta(hours=1)).timestamp())
-    with open(TOKEN_FILE, "w") as f:
-        json.dump(token, f)
-
 def load_token():
+    """The pre-token-cache tokens.json, if an older version of this tool left one behind."""
     try:
         with open(TOKEN_FILE, "r") as f:
             return json.load(f)
-    except FileNotFoundError:
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def msal_caches():
+    """The persistent token cache and HTTP metadata cache, opened once per process."""
+    global _token_cache, _http_cache
+    if _token_cache is None:
+        _token_cache = get_token_cache()
+        _http_cache = get_http_cache()
+    return _token_cache, _http_cache
+
+
+def authenticate_app(config):
+    """App-only (client credentials) token, usable for any /users/{mailbox} the app may read."""
+    token_cache, http_cache = msal_caches()
+    app = ConfidentialClientApplication(
+        client_id=config["client_id"],
+        client_credential=config["client_secret"],
+        authority="https://login.microsoftonline.com/common",
+        token_cache=token_cache,
+        http_cache=http_cache,
+    )
+    # Served from the token cache while the last app token is still valid
+    result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
+    if "access_token" in result:
+        log.info("🔑 App token from %s", result.get("token_source", "identity provider"))
+        return result["access_token"]
+    raise Exception(f"App-only authentication failed: {result.get('error_description', result)}")
+
+
+def migrate_legacy_token(app, scopes):
+    """Trade a refresh token from an old tokens.json for a cache entry, then drop the file."""
+    legacy = load_token()
+    if not legacy or not legacy.get("refresh_token"):
         return None
-    
+    result = app.acquire_token_by_refresh_token(legacy["refresh_token"], scopes=scopes)
+    os.remove(TOKEN_FILE)
+    if "access_token" in result:
+        log.info("🔁 Moved tokens.json into the token cache.")
+        return result
+    return None
+
 
 def authenticate_graph(config):
     is_ci = os.environ.get("CI") == "true"
 
     if is_ci:
-        app = ConfidentialClientApplication(
-            client_id=config["client_id"],
-            client_credential=config["client_secret"],
-            authority="https://login.microsoftonline.com/common"
-        )
-        result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
-        if "access_token" in result:
-            return result["access_token"]
-        raise Exception(f"Authentication failed in CI: {result.get('error_description', result)}")
+        return authenticate_app(config)
 
     # Local interactive login (device code)
+    token_cache, http_cache = msal_caches()
     app = PublicClientApplication(
         config["client_id"],
-        authority="https://login.microsoftonline.com/common"  # supports personal + org accounts
+        authority="https://login.microsoftonline.com/common",  # supports personal + org accounts
+        token_cache=token_cache,
+        http_cache=http_cache,
     )
 
-    # ✅ Try token reuse first
-    # ✅ Load cached token and validate expiration
-    cached_token = load_token()
-    if cached_token and "access_token" in cached_token:
-        expires_on = cached_token.get("expires_on")
-        if expires_on:
-            expiry = int(expires_on)
-            now = int(datetime.utcnow().timestamp())
-            if now < expiry - 60:
-                return cached_token["access_token"]
-            else:
-                print("🔁 Cached token expired, re-authenticating...")
-        else:
-            print("⚠️ Cached token has no expiration. Re-authenticating...")
-
-
-            
+    # ✅ Silent first: a cached access token, or a refresh-token exchange when it expired
     accounts = app.get_accounts()
     result = app.acquire_token_silent(config["scopes"], account=accounts[0]) if accounts else None
+    if not result:
+        result = migrate_legacy_token(app, config["scopes"])
 
     if not result:
         flow = app.initiate_device_flow(scopes=config["scopes"])
         if "user_code" not in flow:
             raise Exception(f"Device flow failed. Response: {flow}")
-        print("🔐 DEVICE LOGIN REQUIRED")
-        print("Visit this URL in your browser:", flow["verification_uri"])
-        print("Enter the code:", flow["user_code"])
+        log.info("🔐 DEVICE LOGIN REQUIRED")
+        log.info("Visit this URL in your browser: %s", flow["verification_uri"])
+        log.info("Enter the code: %s", flow["user_code"])
         result = app.acquire_token_by_device_flow(flow)
 
     if "access_token" in result:
-        save_token(result)
+        log.info("🔑 Token from %s", result.get("token_source", "identity provider"))
         return result["access_token"]
     else:
-        print("❌ Authentication failed:", result.get("error_description", result))
-        # Force reset token file
-        if os.path.exists("tokens.json"):
-            os.remove("tokens.json")
-            print("🧹 Deleted corrupt token file. Please re-run to re-authenticate.")
-        raise Exception("Authentication failed and token file was reset.")
+        log.error("❌ Authentication failed: %s", result.get("error_description", result))
+        # Force a fresh device login next time
+        for account in app.get_accounts():
+            app.remove_account(account)
+        raise Exception("Authentication failed and the cached account was removed.")
 
 
 
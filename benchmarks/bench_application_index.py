@@ -0,0 +1,86 @@
+"""Cost of folding a micro-batch of emails into the application index as the store grows.
+
+    python benchmarks/bench_application_index.py [max_applications]
+
+Fills a scratch store with years of synthetic applications, then times a
+100-email micro-batch (half follow-ups to existing applications, half new)
+at each size. Per-email work is a handful of primary-key lookups, so the
+batch cost should stay flat while the store grows; the query plans are
+checked for full-table scans.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_store import ApplicationStore
+
+STATUSES = ["Applied", "Interview", "Rejected", "Offer"]
+
+
+def emails(start: int, count: int, rng: random.Random, existing: int = 0) -> list:
+    """`count` emails; with `existing`, follow-ups (a reply or a title-less status update) to earlier ones."""
+    first = date(2015, 1, 1)
+    records = []
+    for i in range(start, start + count):
+        n = rng.randrange(existing) if existing else i
+        follow_up = bool(existing)
+        records.append({
+            "company": f"Company{n % 5000}",
+            "job_title": "Unknown" if follow_up and rng.random() < 0.5 else f"Role {n}",
+            "date_applied": (first + timedelta(days=n // 30 + 14 * follow_up)).isoformat(),  # 30 applications a day
+            "response_type": rng.choice(STATUSES[1:]) if follow_up else "Applied",
+            "subject": f"{'Re: ' if follow_up else ''}Your application {n}",
+            "email": f"jobs@company{n % 5000}.com",
+            "thread_id": f"your application {n}",
+            "conversation_id": f"conv{n}" if not follow_up or rng.random() < 0.5 else f"conv-new{i}",
+            "message_id": f"m{i}",
+        })
+    return records
+
+
+def scans(store: ApplicationStore) -> list:
+    """Query plans of the per-email statements that read a whole table."""
+    statements = [
+        ("SELECT thread_id FROM application_keys WHERE key = ?", ("x",)),
+        ("SELECT thread_id FROM applications WHERE company = ? LIMIT 2", ("x",)),
+        ("SELECT date, response_type FROM status_events WHERE thread_id = ? ORDER BY date", ("x",)),
+    ]
+    found = []
+    for sql, args in statements:
+        for row in store.conn.execute(f"EXPLAIN QUERY PLAN {sql}", args):
+            if row[-1].startswith("SCAN"):
+                found.append(f"{sql}: {row[-1]}")
+    return found
+
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(3)
+    store = ApplicationStore(os.path.join(tempfile.mkdtemp(prefix="app-index-"), "store.db"))
+    print(f"{'applications':>13} {'batch ms':>9} {'per email µs':>13}")
+    size = 0
+    for target in sorted({n for n in (1_000, 10_000, 100_000) if n < limit} | {limit}):
+        while size < target:
+            chunk = min(10_000, target - size)
+            store.upsert(emails(size, chunk, rng))
+            size += chunk
+        batch = emails(size, 50, rng) + emails(size + 50, 50, rng, existing=size)
+        start = time.perf_counter()
+        store.upsert(batch)
+        elapsed = time.perf_counter() - start
+        size += 50
+        print(f"{store.count():>13,} {elapsed * 1000:>9.1f} {elapsed / len(batch) * 1e6:>13.0f}")
+
+    problems = scans(store)
+    print("🔎 Full-table scans per email:", "none" if not problems else problems)
+    sample = batch[-1]["thread_id"]  # upsert filled in the application each follow-up joined
+    print(f"🗂️ Timeline of {sample!r}:", [(e["date"], e["response_type"]) for e in store.timeline(sample)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Company index: rebuild time from history and how well it dedupes company spellings.
+
+    python benchmarks/bench_company_index.py [applications]
+
+Fills a scratch store with synthetic applications at a few thousand
+employers. Names are spelled the way normalize_company produces them:
+legal suffixes ("Acme Inc", "Acme, Ltd."), case changes, typos, the ATS
+name instead of the employer ("Greenhouse") and "Unknown". Senders mix
+company domains, ATS tenants and mailboxes, and recruiters on gmail. Some
+distinct employers have deliberately close names ("Nova Data" and
+"Nova Labs"). The benchmark then times CompanyIndex rebuild plus store
+rename/merge, and scores the result against the true employers with
+pairwise precision and recall. Finally it times resolve() on new emails.
+
+It first checks that employers mailing through one shared domain (a job
+board) stay separate applications, and that a sync files a misspelled
+company as spelled until `companies --apply` merges it; it exits non-zero
+if either fails.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_store import ApplicationStore
+from company_index import is_placeholder
+
+SYLLABLES = ["ve", "lo", "ra", "tri", "nex", "qua", "zen", "mor", "ka", "li", "dor", "sa", "pha", "gri", "on", "tel",
+             "vi", "bra", "cor", "ion", "ax", "ul", "ter", "mi"]
+WORDS = ["Data", "Labs", "Systems", "Analytics", "Health", "Robotics", "Cloud", "Security", "Bio", "Energy", "Media"]
+SUFFIXES = ["", "", "", " Inc", " Inc.", ", Inc.", " Ltd", " Ltd.", " LLC", " GmbH", " Technologies", " Corp"]
+
+
+def employers(count: int, rng: random.Random) -> list:
+    names = set()
+    while len(names) < count:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+        names.add(stem)
+        if rng.random() < 0.3 and len(names) < count:
+            # A different company with nearly the same name
+            names.add(f"{stem} {rng.choice(WORDS)}")
+    return sorted(names)
+
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(name))
+    return name[:i] + name[i] + name[i:] if rng.random() < 0.5 else name[:i] + name[i + 1:]
+
+
+def applications(count: int, names: list, rng: random.Random) -> list:
+    """(record, true employer) pairs."""
+    rows = []
+    for i in range(count):
+        name = rng.choice(names)
+        slug = name.lower().replace(" ", "")
+        roll = rng.random()
+        if roll < 0.45:
+            email, shown = f"careers@{slug}.com", name + rng.choice(SUFFIXES)
+        elif roll < 0.65:
+            email, shown = f"{slug}@myworkday.com", name + rng.choice(SUFFIXES)
+        elif roll < 0.75:
+            email, shown = f"no-reply@{slug}.comeet.co", rng.choice(["Comeet", "Unknown"])
+        elif roll < 0.9:
+            email, shown = "no-reply@us.greenhouse-mail.io", rng.choice(["Greenhouse", name])
+        else:
+            email, shown = f"recruiter{rng.randrange(500)}@gmail.com", rng.choice(["Gmail", name])
+        if shown.startswith(name) and rng.random() < 0.05:
+            shown = typo(name, rng) + shown[len(name):]
+        if rng.random() < 0.15:
+            shown = shown.upper()
+        subject = rng.choice([f"Your application to {name}", "Thank you for applying", f"{name}: next steps",
+                              "Interview invitation", f"Update from {name}"])
+        rows.append(({
+            "thread_id": f"app-{i}",
+            "company": shown,
+            "job_title": f"Role {rng.randrange(40)}",
+            "date_applied": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "response_type": rng.choice(["Applied", "Rejected", "Interview"]),
+            "subject": subject,
+            "email": email,
+        }, name))
+    return rows
+
+
+def pairwise(predicted: list, truth: list) -> tuple:
+    """Pairwise precision and recall of a clustering against the true labels."""
+    def pairs(counts):
+        return sum(n * (n - 1) // 2 for n in counts.values())
+
+    same = pairs(Counter(zip(predicted, truth)))
+    return same / max(pairs(Counter(predicted)), 1), same / max(pairs(Counter(truth)), 1)
+
+
+def check_shared_sender() -> bool:
+    """Four employers behind one job-board domain: nothing may be renamed or merged."""
+    store = ApplicationStore(os.path.join(tempfile.mkdtemp(prefix="company-index-"), "store.db"))
+    mail = [("Acme", "Backend Engineer", "Applied"), ("Globex", "Backend Engineer", "Applied"),
+            ("Initech", "Data Analyst", "Rejected"), ("Hooli", "Data Analyst", "Applied"),
+            ("Unknown", "QA Engineer", "Applied")]
+    store.upsert([{"thread_id": f"m{i}", "message_id": f"m{i}", "company": company, "job_title": title,
+                   "response_type": status, "date_applied": f"2025-01-0{i + 1}", "subject": f"Application {i}",
+                   "email": "jobs@alljobs.co.il"} for i, (company, title, status) in enumerate(mail)])
+    renames, merges = store.rebuild_companies(apply=True, backup=False)
+    rows = {tuple(row) for row in store.conn.execute("SELECT company, job_title, response_type FROM applications")}
+    ok = rows == set(mail) and not renames and not merges
+    print(f"{'✅' if ok else '❌'} Shared sender domain: {len(rows)}/{len(mail)} applications kept apart")
+    return ok
+
+
+def check_exact_upsert() -> bool:
+    """A typo is filed as spelled by every sync, also after a preview; only companies --apply merges it."""
+    store = ApplicationStore(os.path.join(tempfile.mkdtemp(prefix="company-index-"), "store.db"))
+
+    def sync(i, company):
+        store.upsert([{"thread_id": f"m{i}", "message_id": f"m{i}", "company": company, "job_title": f"Role {i}",
+                       "response_type": "Applied", "date_applied": f"2025-01-0{i + 1}", "subject": f"Application {i}",
+                       "email": f"jobs@{company.split()[0].lower()}{i}.com"}])
+        return store.conn.execute("SELECT company FROM applications WHERE job_title = ?", (f"Role {i}",)).fetchone()[0]
+
+    sync(0, "Globex Systems")
+    synced = sync(1, "Globex Sytems")
+    renames, _ = store.rebuild_companies(apply=False)
+    previewed = sync(2, "Globex Sytems")
+    store.rebuild_companies(apply=True, backup=False)
+    sync(3, "Globex Systems")
+    applied = {row[0] for row in store.conn.execute("SELECT company FROM applications")}
+    ok = synced == previewed == "Globex Sytems" and len(renames) == 1 and len(applied) == 1
+    print(f"{'✅' if ok else '❌'} Sync files a typo as spelled ({synced}, after a preview: {previewed}); "
+          f"after companies --apply every sync uses {', '.join(sorted(applied))}")
+    return ok
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    if not (check_shared_sender() and check_exact_upsert()):
+        return 1
+    rng = random.Random(5)
+    names = employers(max(size // 30, 50), rng)
+    rows = applications(size, names, rng)
+    os.environ["COMPANY_INDEX"] = "on"
+    store = ApplicationStore(os.path.join(tempfile.mkdtemp(prefix="company-index-"), "store.db"))
+    store.upsert([record for record, _ in rows], resolve=False)
+    truth = {record["thread_id"]: name for record, name in rows}
+    before = store.conn.execute("SELECT COUNT(DISTINCT company) FROM applications").fetchone()[0]
+
+    start = time.perf_counter()
+    renames, merges = store.rebuild_companies(apply=True, backup=False)
+    elapsed = time.perf_counter() - start
+
+    result = store.conn.execute("SELECT thread_id, company FROM applications").fetchall()
+    named = [(truth[t], c) for t, c in result if not is_placeholder(c)]
+    precision, recall = pairwise([c.lower() for _, c in named], [n for n, _ in named])
+    after = len({c for _, c in named})
+    print(f"🏢 {size:,} applications, {len(names):,} employers, {before:,} distinct spellings")
+    print(f"   rebuild + rename + merge: {elapsed:.2f}s ({len(renames):,} renamed, {len(merges):,} merged)")
+    print(f"   companies after: {after:,}; named rows: {len(named) / len(result):.1%}; "
+          f"pairwise precision {precision:.3f}, recall {recall:.3f}")
+
+    fresh = [dict(record, thread_id=f"new-{i}") for i, (record, _) in enumerate(applications(10_000, names, rng))]
+    start = time.perf_counter()
+    with store.conn:
+        for record in fresh:
+            store.companies.resolve(record)
+    elapsed = time.perf_counter() - start
+    print(f"   resolve(): {elapsed / len(fresh) * 1e6:.0f} µs per email ({len(fresh):,} new emails)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
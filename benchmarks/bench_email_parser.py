@@ -0,0 +1,148 @@
+"""Messages per second of the precompiled batch parser vs the original per-call parser.
+
+    python benchmarks/bench_email_parser.py [messages]
+"""
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classification_cache import normalize_subject
+from email_parser import parse_batch
+
+SENDERS = [
+    "no-reply@greenhouse.io", "jobs@comeet.co", "careers@acme.com", "talent@globex.io",
+    "notifications@smartrecruiters.com", "hr@initech.co.il", "jobs-noreply@linkedin.com",
+    "workday@myworkday.com", "friend@gmail.com",
+]
+SUBJECTS = [
+    "Thank you for applying for the Backend Engineer position at {c}",
+    "Your application for Data Analyst role",
+    "Invitation to Technical interview",
+    "Update regarding your application to {c}",
+    "מועמדות למשרת מפתח תוכנה",
+    "Position: Senior QA Engineer.",
+    "Technical exam and guidelines for DevOps Engineer",
+    "Thanks for joining our Graduate program",
+    "Weekly newsletter",
+    "Re: Application for the Product Manager position",
+]
+
+
+def synthetic_messages(count: int, seed: int = 11) -> list:
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    companies = [f"Company{i}" for i in range(300)]
+    messages = []
+    for i in range(count):
+        messages.append({
+            "id": f"m{i}",
+            "subject": rng.choice(SUBJECTS).format(c=rng.choice(companies)),
+            "bodyPreview": "We received your application and will be in touch.",
+            "receivedDateTime": (start + timedelta(minutes=rng.randrange(900_000))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from": {"emailAddress": {"address": rng.choice(SENDERS).replace("@", f"{i % 50}@", 1)
+                                      if rng.random() < 0.3 else rng.choice(SENDERS)}},
+        })
+    return messages
+
+
+# --- The original parser, kept verbatim as the baseline ---
+
+def legacy_normalize_company(email_address, subject, preview=""):
+    if not email_address or "@" not in email_address:
+        return "Unknown"
+    full_domain = email_address.split("@")[-1]
+    domain_parts = full_domain.split(".")
+    domain = domain_parts[0].lower()
+    known_platforms = ["comeet", "greenhouse", "linkedin", "workflow", "mail", "smartrecruiters", "myworkday", "canditech", "sparkhire"]
+    if any(p in full_domain for p in known_platforms):
+        combined = f"{subject} {preview}"
+        match = re.search(r"\b(?:at|from|on behalf of)\s+([A-Z][\w&\-\. ]+)", combined, re.IGNORECASE)
+        if match:
+            return match.group(1).strip(" .,-").title()
+    if domain in known_platforms:
+        if len(domain_parts) > 1:
+            return domain_parts[-2].title()
+        return "Unknown"
+    return domain.title()
+
+
+def legacy_extract_job_title(subject, preview=""):
+    combined = f"{subject} {preview}"
+    patterns = [
+        r"applying for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
+        r"application for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
+        r"for (?:the )?(.+?) position",
+        r"position[:\-] (.+?)(?:\.|$)",
+        r"role[:\-] (.+?)(?:\.|$)",
+        r"מועמדות למשרת\s*(.+?)\b",
+        r"position at\s+([A-Z][\w\- ]+)",
+        r"invitation to (.+?) interview",
+        r"technical exam and guidelines for (.+?)",
+        r"joining our (.+?) program",
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, combined, re.IGNORECASE)
+        if match:
+            job = match.group(1).strip(" .,-")
+            if len(job.split()) <= 8:
+                return job.title()
+    return "Unknown"
+
+
+def legacy_parse_emails(messages):
+    parsed_by_sender = defaultdict(list)
+    for msg in messages:
+        sender = msg.get("from", {}).get("emailAddress", {}).get("address", "").lower()
+        subject = msg.get("subject", "")
+        preview = msg.get("bodyPreview", "")
+        date_str = msg.get("receivedDateTime", "")
+        if not sender or not subject or not date_str:
+            continue
+        try:
+            received_dt = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ")
+        except ValueError:
+            continue
+        parsed_by_sender[sender].append((received_dt, {
+            "company": legacy_normalize_company(sender, subject),
+            "job_title": legacy_extract_job_title(subject),
+            "date_applied": received_dt.strftime("%Y-%m-%d"),
+            "subject": subject,
+            "email": sender,
+            "thread_id": subject.lower().strip(),
+            "preview": preview,
+        }))
+    return [sorted(emails, key=lambda x: x[0], reverse=True)[0][1] for emails in parsed_by_sender.values()]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    messages = synthetic_messages(count)
+    print(f"📨 {count} synthetic messages")
+
+    start = time.perf_counter()
+    legacy = [legacy_parse_emails([m])[0] for m in messages]  # how main.py used to call it
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = parse_batch(messages)
+    batch_s = time.perf_counter() - start
+
+    # thread_id is now the reply-normalized subject and records carry the conversationId;
+    # everything else must match the original parser exactly
+    for record in legacy:
+        record["thread_id"] = normalize_subject(record["subject"])
+        record["conversation_id"] = ""
+    assert legacy == batch, "batch parser output diverges from the original parser"
+    print(f"  legacy per-message calls {count / legacy_s:>12,.0f} msg/s ({legacy_s:.2f}s)")
+    print(f"  parse_batch              {count / batch_s:>12,.0f} msg/s ({batch_s:.2f}s)")
+    print(f"  speedup                  {legacy_s / batch_s:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
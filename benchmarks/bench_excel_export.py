@@ -0,0 +1,72 @@
+"""Peak RSS and wall time of the workbook export: in-memory openpyxl vs write-only streaming.
+
+    python benchmarks/bench_excel_export.py [rows ...]
+
+Each export runs in its own subprocess so ru_maxrss is not shared between them.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_excel_writer import synthetic_tracker
+
+
+def legacy_export(df, path):
+    """The pre-streaming export: both sheets materialized in a normal-mode workbook."""
+    from openpyxl import Workbook
+    from openpyxl.utils.dataframe import dataframe_to_rows
+    from excel_writer import apply_row_colors, split_archived
+
+    active_df, archived_df = split_archived(df)
+    wb = Workbook()
+    ws_main = wb.active
+    for row in dataframe_to_rows(active_df, index=False, header=True):
+        ws_main.append(row)
+    apply_row_colors(active_df, ws_main)
+    ws_archived = wb.create_sheet("Archived")
+    for row in dataframe_to_rows(archived_df, index=False, header=True):
+        ws_archived.append(row)
+    apply_row_colors(archived_df, ws_archived)
+    wb.save(path)
+
+
+def streaming_export(df, path):
+    from excel_writer import write_workbook
+    write_workbook(df, path=path)
+
+
+def child(mode: str, rows: int):
+    df = synthetic_tracker(rows)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        (legacy_export if mode == "legacy" else streaming_export)(df, os.path.join(tmp, "out.xlsx"))
+        elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.3f} {baseline_kb} {peak_kb}")
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 50_000, 100_000]
+    print(f"{'rows':>8} {'mode':<10} {'wall s':>8} {'data MB':>8} {'peak MB':>8} {'export MB':>9}")
+    for rows in sizes:
+        for mode in ("legacy", "streaming"):
+            out = subprocess.run(
+                [sys.executable, "-W", "ignore", __file__, "--child", mode, str(rows)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            elapsed, baseline_kb, peak_kb = float(out[0]), int(out[1]), int(out[2])
+            print(f"{rows:>8} {mode:<10} {elapsed:>8.2f} {baseline_kb / 1024:>8.1f} "
+                  f"{peak_kb / 1024:>8.1f} {(peak_kb - baseline_kb) / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], int(sys.argv[3]))
+    else:
+        main()
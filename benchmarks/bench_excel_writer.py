@@ -0,0 +1,117 @@
+"""Row tagging/archiving and coloring at 100k rows: per-row apply + cell fills vs vectorized + conditional formatting.
+
+    python benchmarks/bench_excel_writer.py [rows]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils.dataframe import dataframe_to_rows
+
+from excel_writer import ROW_FILLS, apply_row_colors, row_flags, split_archived
+
+LABELS = ["Applied", "Rejected", "Interview", "Offer", "No Reply Yet", "Other"]
+
+
+def synthetic_tracker(rows: int, seed: int = 7) -> pd.DataFrame:
+    rng = random.Random(seed)
+    today = datetime.utcnow()
+    return pd.DataFrame({
+        "company": [f"Company {rng.randrange(5000)}" for _ in range(rows)],
+        "job_title": [rng.choice(["Backend Engineer", "Data Analyst", "QA Engineer"]) for _ in range(rows)],
+        "date_applied": [(today - timedelta(days=rng.randrange(400))).strftime("%Y-%m-%d") for _ in range(rows)],
+        "response_type": [rng.choice(LABELS) for _ in range(rows)],
+        "subject": [f"Application {i}" for i in range(rows)],
+        "email": [f"hr{i % 5000}@example.com" for i in range(rows)],
+        "thread_id": [f"application {i}" for i in range(rows)],
+    })
+
+
+def legacy_tags_and_archive(df):
+    """The pre-vectorization code path: two row-wise applies for archive plus one for tags."""
+    df = df.copy()
+    df["date_applied"] = pd.to_datetime(df["date_applied"], errors="coerce")
+    today = datetime.utcnow()
+
+    def should_archive(row):
+        resp = str(row.get("response_type", "")).strip().lower()
+        if "rejected" in resp or "applied" in resp:
+            return True
+        if "no" in resp and not pd.isnull(row.get("date_applied")):
+            return (today - row["date_applied"]).days > 10
+        return False
+
+    def tag(row):
+        resp = str(row["response_type"]).strip().lower()
+        if resp in {"accepted", "interview"}:
+            return "positive"
+        elif resp == "rejected":
+            return "negative"
+        elif "no" in resp:
+            if pd.isnull(row["date_applied"]):
+                return "waiting"
+            return "stale" if (today - row["date_applied"]).days > 10 else "waiting"
+        return "unknown"
+
+    archived = df[df.apply(should_archive, axis=1)]
+    active = df[~df.apply(should_archive, axis=1)]
+    return active, archived, df.apply(tag, axis=1)
+
+
+def legacy_cell_fills(df, tags, ws):
+    for i, tag_value in enumerate(tags, start=2):
+        fill = ROW_FILLS.get(tag_value)
+        if fill:
+            for col in range(1, len(df.columns) + 1):
+                ws.cell(row=i, column=col).fill = fill
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<32} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    df = synthetic_tracker(rows)
+    print(f"📊 {rows} rows")
+
+    print("Tag + archive decisions")
+    _, _, legacy_tags = timed("legacy df.apply x3", lambda: legacy_tags_and_archive(df))
+    flags = timed("vectorized row_flags", lambda: row_flags(df))
+    timed("vectorized split_archived", lambda: split_archived(df, flags))
+    assert list(legacy_tags) == list(flags["tag"]), "vectorized tags diverge from legacy"
+
+    print("Coloring + save")
+    with tempfile.TemporaryDirectory() as tmp:
+        def legacy_save():
+            wb = Workbook()
+            for row in dataframe_to_rows(df, index=False, header=True):
+                wb.active.append(row)
+            legacy_cell_fills(df, legacy_tags, wb.active)
+            wb.save(os.path.join(tmp, "legacy.xlsx"))
+
+        def conditional_save():
+            wb = Workbook()
+            for row in dataframe_to_rows(df, index=False, header=True):
+                wb.active.append(row)
+            apply_row_colors(df, wb.active)
+            wb.save(os.path.join(tmp, "conditional.xlsx"))
+
+        timed("legacy per-cell fills", legacy_save)
+        timed("conditional formatting rules", conditional_save)
+        for name in ("legacy.xlsx", "conditional.xlsx"):
+            print(f"  {name:<32} {os.path.getsize(os.path.join(tmp, name)) / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
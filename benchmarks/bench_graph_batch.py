@@ -0,0 +1,102 @@
+"""Round trips and wall time of body enrichment: one GET per email vs Graph $batch.
+
+    python benchmarks/bench_graph_batch.py [messages]
+
+Runs against the local mock Graph server (20 ms per request, 5% of batch
+items throttled). Subjects carry no job title; the HTML bodies do, so the
+share of "Unknown" titles shows what the enrichment buys.
+"""
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_graph import MockGraph
+
+MAILBOX = "users/me@example.com"
+TITLES = ["Backend Engineer", "Data Analyst", "QA Automation Engineer", "Product Manager", "DevOps Engineer"]
+
+
+def synthetic_messages(count: int, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    messages = []
+    for i in range(count):
+        title = rng.choice(TITLES)
+        messages.append({
+            "id": f"m{i}",
+            "subject": "We received your application",
+            "bodyPreview": "Hi, thanks for your interest in joining our team. Our recruiters",
+            "receivedDateTime": (start + timedelta(minutes=rng.randrange(400_000))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from": {"emailAddress": {"address": f"jobs@company{i % 40}.com"}},
+            "conversationId": f"conv{i // 3}",
+            "body": {
+                "contentType": "html",
+                "content": (
+                    "<html><head><style>p {color: red}</style></head><body>"
+                    "<p>Hi,</p><p>Thanks for your interest in joining our team. Our recruiters will review "
+                    f"your application for the <b>{title}</b> position and get back to you.</p>"
+                    "<div>Best regards,<br>Talent team</div></body></html>"
+                ),
+            },
+        })
+    return messages
+
+
+def per_message(messages: list, headers: dict, scheduler, base_url: str, workers: int) -> int:
+    """The naive alternative: one GET per email (concurrent, through the same scheduler)."""
+    def get(msg):
+        scheduler.get(f"{base_url}/{MAILBOX}/messages/{msg['id']}", headers=headers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(get, messages))
+    return len(messages)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    messages = synthetic_messages(count)
+    mock = MockGraph({MAILBOX: messages}, latency=0.02).start()
+    os.environ["GRAPH_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GRAPH_BACKOFF_BASE", "0.1")
+
+    from email_parser import parse_batch
+    from graph_batch import BatchEnricher
+    from graph_fetcher import get_session
+    from graph_scheduler import GraphScheduler
+
+    listing = [{k: v for k, v in m.items() if k not in ("body", "conversationId")} for m in messages]
+    before = parse_batch(listing)
+    print(f"📨 {count} emails, 20 ms per Graph round trip")
+
+    scheduler = GraphScheduler(get_session())
+    headers = {"Authorization": "Bearer mock"}
+    start = time.perf_counter()
+    trips = per_message(listing, headers, scheduler, mock.base_url, workers=4)
+    single_s = time.perf_counter() - start
+    print(f"  one GET per email  {trips:>6} round trips  {single_s:6.2f}s")
+
+    mock.throttle_rate = 0.05
+    enricher = BatchEnricher("mock", MAILBOX, GraphScheduler(get_session()))
+    start = time.perf_counter()
+    enricher.enrich(listing)
+    batch_s = time.perf_counter() - start
+    print(f"  $batch (20/req)    {enricher.batches:>6} round trips  {batch_s:6.2f}s  "
+          f"({mock.stats['throttled']} items throttled and resent)")
+    enricher.report()
+
+    after = parse_batch(listing)
+    unknown = lambda records: sum(r["job_title"] == "Unknown" for r in records)
+    print(f"  Unknown job titles: {unknown(before)}/{len(before)} from bodyPreview → "
+          f"{unknown(after)}/{len(after)} with full bodies")
+    assert enricher.enriched == count, "some emails were not enriched"
+    assert all(m.get("conversationId") for m in listing)
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Completeness and cost of Graph paging under injected throttling.
+
+    python benchmarks/bench_graph_throttling.py [messages_per_mailbox] [mailboxes]
+
+Pages several mailboxes concurrently from a local mock Graph server that
+answers a share of requests with 429/503 + Retry-After and throttles any
+mailbox with more than 4 requests in flight. The original fetch loop (stop at
+the first non-200) is compared with the shared GraphScheduler, which is
+deliberately started above the mock's per-mailbox limit so its AIMD control
+has to find it.
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_graph import MockGraph
+
+SINCE = "2025-01-01T00:00:00Z"
+MOCK_MAILBOX_LIMIT = 4
+
+
+def synthetic_mailbox(name: str, count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "id": f"{name}-{i}",
+            "subject": f"Application for Engineer {i}",
+            "bodyPreview": "Thanks for applying",
+            "receivedDateTime": (start + timedelta(minutes=rng.randrange(400_000))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from": {"emailAddress": {"address": f"hr{i % 97}@company{i % 31}.com"}},
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_fetch(url: str, headers: dict, session) -> list:
+    """The loop main.py used to run: give up on the first non-200."""
+    messages = []
+    while url:
+        response = session.get(url, headers=headers)
+        if response.status_code != 200:
+            break
+        data = response.json()
+        messages.extend(data.get("value", []))
+        url = data.get("@odata.nextLink")
+    return messages
+
+
+def run(label: str, fetch, jobs: list, expected: int, mock: MockGraph):
+    mock.stats.clear()
+    mock.peak_in_flight.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool, contextlib.redirect_stdout(io.StringIO()):
+        results = list(pool.map(fetch, jobs))  # per-page/per-retry logging muted
+    elapsed = time.perf_counter() - start
+    got = len({m["id"] for messages in results for m in messages})
+    peak = max(mock.peak_in_flight.values(), default=0)
+    print(f"  {label:<18} {got:>6}/{expected} messages  {elapsed:6.2f}s  "
+          f"{mock.stats['requests']:>5} requests  {mock.stats['throttled']:>4}×429  "
+          f"{mock.stats['unavailable']:>3}×503  peak {peak} in flight/mailbox")
+    return got
+
+
+def main():
+    per_mailbox = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    mailbox_count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    names = [f"users/user{i}@example.com" for i in range(mailbox_count)]
+    mock = MockGraph(
+        {name: synthetic_mailbox(name, per_mailbox, i) for i, name in enumerate(names)},
+        throttle_rate=0.1, unavailable_rate=0.03, retry_after=0.2,
+        mailbox_concurrency=MOCK_MAILBOX_LIMIT, latency=0.01,
+    ).start()
+    os.environ["GRAPH_BASE_URL"] = mock.base_url
+    os.environ.setdefault("GRAPH_BACKOFF_BASE", "0.1")
+
+    from graph_fetcher import fetch_pages, get_session, shard_urls
+    from graph_scheduler import GraphScheduler
+
+    headers = {"Authorization": "Bearer mock"}
+    jobs = [url for name in names for url in shard_urls(name, SINCE, page_size=50, shard_days=30)]
+    expected = per_mailbox * mailbox_count
+    print(f"📨 {mailbox_count} mailboxes × {per_mailbox} messages, {len(jobs)} shards, "
+          f"mock limit {MOCK_MAILBOX_LIMIT} in flight/mailbox")
+
+    session = get_session()
+    run("stop on non-200", lambda url: legacy_fetch(url, headers, session), jobs, expected, mock)
+
+    scheduler = GraphScheduler(session, max_concurrency=16, mailbox_concurrency=2 * MOCK_MAILBOX_LIMIT)
+    got = run("GraphScheduler", lambda url: fetch_pages(url, headers, scheduler), jobs, expected, mock)
+    scheduler.report()
+    assert got == expected, "scheduler lost messages"
+
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
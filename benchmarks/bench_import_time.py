@@ -0,0 +1,66 @@
+"""Import cost of each CLI subcommand, measured with `python -X importtime`.
+
+    python benchmarks/bench_import_time.py [runs]
+
+Each command runs in a fresh interpreter inside an empty directory, and the
+imports the interpreter makes on its own (`python -c pass`) are subtracted.
+The quick commands must stay within STARTUP_BUDGET_MS of imports, so a
+stray top-level `import pandas` fails the benchmark (exit status 1).
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, "cli.py")
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "150"))
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+COMMANDS = [
+    # (label, argv, held to the budget)
+    ("cli.py status", [CLI, "status"], True),
+    ("cli.py classify --offline", [CLI, "classify", "We regret to inform you", "--offline"], True),
+    ("cli.py --help", [CLI, "--help"], True),
+    ("main.py's old top-level imports", ["-c", "import pandas, openai, msal, openpyxl, requests, pdfkit"], False),
+]
+
+
+def top_level_imports(argv: list, cwd: str) -> dict:
+    """{module: cumulative µs} for imports made directly by the program (not nested ones)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=cwd, capture_output=True, text=True,
+                          env={**os.environ, "PYTHONPATH": ROOT})
+    imports = {}
+    for match in LINE.finditer(proc.stderr):
+        if len(match.group(3)) == 1:
+            imports[match.group(4)] = int(match.group(2))
+    return imports
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    workdir = tempfile.mkdtemp(prefix="import-time-")
+    interpreter = set(top_level_imports(["-c", "pass"], workdir))
+    print(f"⏱️ Import time per command (best of {runs}, interpreter start-up excluded), "
+          f"budget {STARTUP_BUDGET_MS:.0f} ms")
+
+    over_budget = False
+    for label, argv, budgeted in COMMANDS:
+        best = None
+        for _ in range(runs):
+            imports = {m: us for m, us in top_level_imports(argv, workdir).items() if m not in interpreter}
+            if best is None or sum(imports.values()) < sum(best.values()):
+                best = imports
+        total_ms = sum(best.values()) / 1000
+        heaviest = ", ".join(f"{m} {us / 1000:.0f}ms" for m, us in sorted(best.items(), key=lambda i: -i[1])[:4])
+        verdict = ""
+        if budgeted:
+            verdict = "✅" if total_ms <= STARTUP_BUDGET_MS else "❌"
+            over_budget |= total_ms > STARTUP_BUDGET_MS
+        print(f"  {verdict or '  '} {label:<34} {total_ms:8.1f} ms  ({heaviest})")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Local nearest-neighbour classifier vs the LLM on templated job emails.
+
+    python benchmarks/bench_local_classifier.py [history] [new_emails]
+
+Builds a labelled history (the LLM's past answers, with 3% of them noisy)
+from ATS-style templates and trains the local model on it. A stream of new
+emails, including templates the history never saw, then goes through the
+rules → local model → LLM cascade in micro-batches. The stand-in LLM
+answers with the true label and counts its calls. Reports the LLM calls the
+local model avoids, its agreement with the LLM and its per-email latency.
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["LOCAL_MODEL_AUDIT_RATE"] = "0"  # every LLM label below is used for agreement instead
+
+from local_classifier import LocalClassifier
+from rule_classifier import classify_cascade
+
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Pied Piper",
+             "Soylent", "Tyrell", "Cyberdyne", "Wonka", "Vandelay", "Monsters Inc", "Oscorp", "Aperture"]
+TITLES = ["Backend Engineer", "Data Analyst", "QA Engineer", "Product Manager", "DevOps Engineer", "ML Engineer"]
+FILLER = ["Best regards, the recruiting team.", "Please do not reply to this email.",
+          "Follow us on LinkedIn for updates.", "This message was sent by our hiring platform.", ""]
+
+# label -> [(subject, preview)] templates; the last template of each label only appears in new emails
+TEMPLATES = {
+    "Applied": [
+        ("Thanks for applying to {company}", "Hi {name}, we have received your application for {title} at {company}."),
+        ("{company} | Application received", "Your application for the {title} role is now with our hiring team."),
+        ("Your candidacy for {title}", "Thank you for your interest in {company}. Our team is reviewing your profile."),
+        ("We got your application, {name}", "{company} confirms your submission for {title}. Reference {ref}."),
+    ],
+    "Rejected": [
+        ("Update on your {company} application", "Hi {name}, after careful review we will proceed with other candidates for {title}."),
+        ("Your application for {title}", "Thank you for your time. {company} has chosen applicants whose experience more closely matches."),
+        ("{company}: status update", "The {title} position has been filled. We will keep your details on file."),
+        ("Regarding the {title} role", "We appreciate your interest but we are pursuing other applicants at {company}."),
+    ],
+    "Interview": [
+        ("Let's talk - {title} at {company}", "Hi {name}, could you share your availability for a call with the {title} team?"),
+        ("{company} next steps", "We enjoyed your profile and would like to schedule a conversation about the {title} role."),
+        ("Invitation: chat with {company}", "Please pick a time slot for a video meeting with our hiring manager. Ref {ref}."),
+        ("Meet the {company} team", "We'd love to set up a technical conversation for {title} next week."),
+    ],
+    "Offer": [
+        ("Your offer from {company}", "Congratulations {name}! Attached is your employment contract for {title}."),
+        ("{company} - welcome aboard", "We are delighted to extend this package for the {title} position."),
+        ("Good news about {title}", "The team at {company} is excited to have you join. Salary details inside."),
+    ],
+    "Other": [
+        ("{ref} new jobs for you", "Jobs matching {title}: {company} and more companies are hiring near you."),
+        ("Your weekly job digest", "Top picks: {title} at {company}, remote roles and more. Unsubscribe any time."),
+        ("Complete your profile, {name}", "Profiles with a photo get more views from recruiters at companies like {company}."),
+    ],
+}
+LABELS = list(TEMPLATES)
+
+
+def synthetic_emails(count: int, seed: int, unseen: bool = False, noise: float = 0.0) -> list:
+    rng = random.Random(seed)
+    emails = []
+    for _ in range(count):
+        label = rng.choice(LABELS)
+        templates = TEMPLATES[label] if unseen else TEMPLATES[label][:-1]
+        subject, preview = rng.choice(templates)
+        slots = {"company": rng.choice(COMPANIES), "title": rng.choice(TITLES), "ref": rng.randrange(10, 99999),
+                 "name": rng.choice(["Alex", "Sam", "Dana", "Noa"])}
+        noisy = rng.random() < noise
+        emails.append({
+            "subject": subject.format(**slots),
+            "preview": f"{preview.format(**slots)} {rng.choice(FILLER)}",
+            "truth": label,
+            "label": rng.choice(LABELS) if noisy else label,
+        })
+    return emails
+
+
+class StandInLLM:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, records: list) -> list:
+        self.calls += len(records)
+        return [r["truth"] for r in records]
+
+
+def cascade(emails: list, model, batch: int = 100):
+    llm = StandInLLM()
+    labels, paths = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(0, len(emails), batch):
+            batch_labels, batch_paths = classify_cascade(emails[i:i + batch], llm_classify=llm, model=model)
+            labels.extend(batch_labels)
+            paths.extend(batch_paths)
+    return labels, paths, llm.calls
+
+
+def main():
+    history_size = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    new_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    history = synthetic_emails(history_size, seed=1, noise=0.03)
+    new = synthetic_emails(new_size, seed=2, unseen=True)
+
+    model = LocalClassifier()
+    start = time.perf_counter()
+    model.add([(e["subject"], e["preview"], e["label"]) for e in history])
+    train_s = time.perf_counter() - start
+    print(f"🧠 Trained on {len(model)} distinct emails (of {history_size}) in {train_s * 1000:.0f} ms")
+
+    model.predict(new[:1])  # IDF weights are built lazily
+    start = time.perf_counter()
+    for email in new[:200]:
+        model.predict([email])
+    single_ms = (time.perf_counter() - start) / 200 * 1000
+    start = time.perf_counter()
+    model.predict(new)
+    batch_ms = (time.perf_counter() - start) / len(new) * 1000
+    print(f"⏱️ Prediction: {single_ms:.3f} ms per email one at a time, {batch_ms:.3f} ms per email in one batch")
+
+    _, _, rules_only_calls = cascade(new, model=None)
+    labels, paths, calls = cascade(new, model=model)
+    s = model.stats
+    # The stand-in LLM is free, so ask it about every locally labelled email too
+    local = [(label, e["truth"]) for label, e, path in zip(labels, new, paths) if "local:" in path and "llm" not in path]
+    agreement = sum(label == truth for label, truth in local) / max(len(local), 1)
+    print(f"📨 {new_size} new emails (1 template per label unseen in the history)")
+    print(f"  rules → LLM                {rules_only_calls:>6} LLM calls")
+    print(f"  rules → local model → LLM  {calls:>6} LLM calls  ({1 - calls / rules_only_calls:.0%} avoided)")
+    print(f"  local labels agreeing with the LLM: {agreement:.1%} ({len(local)} emails)")
+    if s["unsure"]:
+        print(f"  low-confidence guesses the LLM confirmed: {s['unsure_agreed'] / s['unsure']:.0%} "
+              f"({s['unsure']} emails, learned incrementally)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Multi-mailbox run with one failing mailbox: the others must still finish.
+
+    python benchmarks/bench_multi_mailbox.py [--mailboxes 3] [--emails 300] [--workers 2]
+                                             [--graph-latency-ms 5] [--llm-latency-ms 50]
+
+Runs process_mailboxes in a scratch directory against MockGraph and
+MockOpenAI. Every mailbox but the last exists in MockGraph; the last one
+answers 404, so its worker raises inside the spawn pool. Prints each
+mailbox's result and exits non-zero unless the failing mailbox is reported
+with an error (also in its run.log) and every other mailbox is processed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_graph import MockGraph
+from mock_openai import MockOpenAI
+from synthetic_mailbox import generate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mailboxes", type=int, default=3, help="mailboxes in the cohort, the last one failing")
+    parser.add_argument("--emails", type=int, default=300, help="emails per working mailbox")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--graph-latency-ms", type=float, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    users = [f"bench{i}@example.com" for i in range(max(args.mailboxes, 2))]
+    working, failing = users[:-1], users[-1]
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    mailboxes = {
+        f"users/{user}": generate(args.emails, seed=args.seed + i, start=now - timedelta(days=60), days=59)
+        for i, user in enumerate(working)
+    }
+    graph = MockGraph(mailboxes, latency=args.graph_latency_ms / 1000).start()
+    llm = MockOpenAI(latency=args.llm_latency_ms / 1000).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        # Spawned workers inherit the environment, so this is how they find the mocks
+        os.environ.update(GRAPH_BASE_URL=graph.base_url, OPENAI_BASE_URL=llm.base_url, OPENAI_API_KEY="bench-key",
+                          CLASSIFICATION_CACHE=os.path.abspath("classification_cache.sqlite"))
+        from multi_mailbox import mailbox_dir, process_mailboxes
+
+        try:
+            results = process_mailboxes(users, "bench-token", workers=args.workers, root="mailboxes")
+        except Exception as e:
+            print(f"❌ process_mailboxes raised {e!r}: one failing mailbox stopped the cohort")
+            return 1
+        finally:
+            graph.stop()
+            llm.stop()
+
+        by_user = {r["mailbox"]: r for r in results}
+        problems = []
+        failed = by_user.get(failing, {})
+        if "error" not in failed:
+            problems.append(f"{failing} should have failed but returned {failed}")
+        with open(os.path.join(mailbox_dir(failing, "mailboxes"), "run.log"), encoding="utf-8") as run_log:
+            if "Mailbox failed" not in run_log.read():
+                problems.append(f"{failing}'s run.log does not record the failure")
+        for user in working:
+            result = by_user.get(user, {})
+            if "error" in result or result.get("fetched") != args.emails:
+                problems.append(f"{user} should have fetched {args.emails} emails but returned {result}")
+
+    for user in users:
+        result = by_user.get(user, {})
+        outcome = f"error {result['error']}" if "error" in result else f"{result.get('fetched', 0)} fetched"
+        print(f"  {user:<24} {outcome} in {result.get('seconds', 0):.1f}s")
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ {len(working)} mailboxes processed, {failing} reported as failed")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Startup latency of authentication: no token cache vs the persistent MSAL cache.
+
+    python benchmarks/bench_token_cache.py [latency_ms]
+
+MSAL talks to a local stand-in for login.microsoftonline.com (instance
+discovery, OpenID metadata and the token endpoint, each `latency_ms` per
+round trip). Every "run" builds a fresh application object from the cache
+files on disk, as a new process would. The device-code prompt that the old
+code fell back to once tokens.json expired needs a human, so it is only
+listed, not timed. App-only runs only gain while their token is still
+valid (about an hour), e.g. back-to-back MAILBOXES runs; the daily CI run
+keeps its token in memory (TOKEN_CACHE_FILE=""). Exits non-zero if the
+cache is written unencrypted or opens without a key or keystore.
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import msal
+
+from token_cache import TokenCacheError, get_http_cache, get_token_cache, msal_extensions, save_http_cache
+
+AUTHORITY = "https://login.microsoftonline.com/common"
+TENANT = "9188040d-6c67-4c5b-b112-36a304b66dad"
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+class Response:
+    def __init__(self, body: dict, status_code: int = 200):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.text)
+
+
+class MockIdentityProvider:
+    """Just enough of Entra ID for MSAL: discovery, metadata, client-credential and refresh grants."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = Counter()
+
+    def _round_trip(self, kind: str):
+        self.calls[kind] += 1
+        time.sleep(self.latency)
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        if "discovery/instance" in url:
+            self._round_trip("instance discovery")
+            return Response({
+                "tenant_discovery_endpoint": f"{AUTHORITY}/v2.0/.well-known/openid-configuration",
+                "metadata": [{"preferred_network": "login.microsoftonline.com",
+                              "preferred_cache": "login.windows.net",
+                              "aliases": ["login.microsoftonline.com", "login.windows.net"]}],
+            })
+        self._round_trip("openid metadata")
+        return Response({
+            "authorization_endpoint": f"{AUTHORITY}/oauth2/v2.0/authorize",
+            "token_endpoint": f"{AUTHORITY}/oauth2/v2.0/token",
+            "device_authorization_endpoint": f"{AUTHORITY}/oauth2/v2.0/devicecode",
+            "issuer": "https://login.microsoftonline.com/{tenantid}/v2.0",
+        })
+
+    def post(self, url, params=None, data=None, headers=None, **kwargs):
+        self._round_trip(data.get("grant_type", "token"))
+        now = int(time.time())
+        body = {"access_token": f"at-{now}", "token_type": "Bearer", "expires_in": 3600}
+        if data.get("grant_type") == "refresh_token":
+            # A delegated token that MSAL already treats as stale, so every run refreshes silently
+            body.update({
+                "expires_in": 60,
+                "refresh_token": f"rt-{now}",
+                "scope": data.get("scope", ""),
+                "client_info": _b64({"uid": "user", "utid": TENANT}),
+                "id_token": f"{_b64({'alg': 'none'})}.{_b64({'iss': f'https://login.microsoftonline.com/{TENANT}/v2.0', 'sub': 'user', 'aud': 'client', 'exp': now + 3600, 'iat': now, 'tid': TENANT, 'oid': 'user', 'preferred_username': 'me@example.com'})}.",
+            })
+        return Response(body)
+
+    def close(self):
+        pass
+
+
+def timed(label: str, idp: MockIdentityProvider, acquire) -> tuple:
+    idp.calls.clear()
+    start = time.perf_counter()
+    result = acquire()
+    elapsed = time.perf_counter() - start
+    assert "access_token" in result, result
+    calls = sum(idp.calls.values())
+    detail = ", ".join(f"{k} ×{v}" for k, v in idp.calls.items()) or "none"
+    print(f"  {label:<44} {calls:>2} HTTP calls {elapsed * 1000:8.1f} ms  ({detail})")
+    return calls, elapsed
+
+
+def main():
+    latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 150) / 1000
+    idp = MockIdentityProvider(latency)
+    scopes = ["Mail.Read"]
+    workdir = tempfile.mkdtemp(prefix="token-cache-")
+    token_path = os.path.join(workdir, "msal_token_cache.bin")
+    http_path = os.path.join(workdir, "msal_http_cache.bin")
+    key = base64.urlsafe_b64encode(os.urandom(32)).decode()
+    print(f"🔑 {latency * 1000:.0f} ms per identity-provider round trip")
+
+    def app_only(cached: bool):
+        kwargs = {}
+        if cached:
+            kwargs = {"token_cache": get_token_cache(token_path, key), "http_cache": get_http_cache(http_path)}
+        app = msal.ConfidentialClientApplication("client", client_credential="secret", authority=AUTHORITY,
+                                                 http_client=idp, **kwargs)
+        result = app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
+        if cached:
+            save_http_cache(kwargs["http_cache"], http_path)  # normally at process exit
+        return result
+
+    def delegated():
+        token_cache, http_cache = get_token_cache(token_path, key), get_http_cache(http_path)
+        app = msal.PublicClientApplication("client", authority=AUTHORITY, http_client=idp,
+                                           token_cache=token_cache, http_cache=http_cache)
+        accounts = app.get_accounts()
+        if accounts:
+            result = app.acquire_token_silent(scopes, account=accounts[0])
+        else:  # first run after upgrading: the refresh token from tokens.json
+            result = app.acquire_token_by_refresh_token("legacy-rt", scopes=scopes)
+        save_http_cache(http_cache, http_path)
+        return result
+
+    print("App-only (client credentials), within the token lifetime")
+    cold_calls, cold_s = timed("no cache (before: every run)", idp, lambda: app_only(False))
+    timed("persistent cache, first run", idp, lambda: app_only(True))
+    warm_calls, warm_s = timed("persistent cache, later runs", idp, lambda: app_only(True))
+
+    print("Local (delegated)")
+    timed("migrate tokens.json refresh token", idp, delegated)
+    silent_calls, silent_s = timed("expired access token, silent refresh", idp, delegated)
+    print(f"  {'no cache, tokens.json expired (before)':<44}  device-code login: a human at a browser")
+
+    with open(token_path, "rb") as f:
+        if b"access_token" in f.read().lower():
+            sys.exit("❌ token cache is not encrypted")
+    if msal_extensions is None:
+        try:
+            get_token_cache(os.path.join(workdir, "no_key.bin"), "")
+            sys.exit("❌ token cache opened without TOKEN_CACHE_KEY or an OS keystore")
+        except TokenCacheError as e:
+            print(f"🔒 No key, no keystore: {e}")
+    print(f"⏱️ App-only startup: {cold_calls} → {warm_calls} HTTP calls, {(cold_s - warm_s) * 1000:.0f} ms saved "
+          f"per run; local: {silent_calls} call(s), {silent_s * 1000:.0f} ms, no prompt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Watch daemon latency: time from a new email landing in the mailbox to its row in the store.
+
+    python benchmarks/bench_watch.py [--modes webhook,poll,faults] [--deliveries 40] [--backlog 500]
+                                     [--graph-latency-ms 20] [--llm-latency-ms 300]
+
+Each mode runs in a fresh child process with MockGraph and MockOpenAI in a
+scratch directory. WatchDaemon first catches up on a synthetic backlog, then
+the benchmark delivers new emails one at a time:
+
+    webhook   MockGraph POSTs a change notification to the daemon's receiver
+    poll      no subscription; the daemon finds mail with adaptive delta polls
+    faults    webhook, but the first workbook export raises PermissionError and
+              the first subscription renewals raise connection errors
+
+and records when on_update reports each email stored. Printed per mode:
+catch-up time, p50/p99/max delivery-to-store latency, and the warm per-email
+apply time (fetch + classify + store) from the watch.apply span. The faults
+mode exits non-zero unless the daemon survives, stores every delivery and
+later exports and renews successfully.
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_graph import MockGraph
+from mock_openai import MockOpenAI
+from synthetic_mailbox import generate
+
+MAILBOX = "users/bench@example.com"
+USER = "bench@example.com"
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def inject_faults(daemon, failures: dict):
+    """Make the daemon's first export and first renewals fail the way real ones do."""
+    import requests
+
+    export, graph = daemon.ctx.export, daemon.graph
+
+    def failing_export(*a, **kw):
+        if not failures["export"]:
+            failures["export"] += 1
+            raise PermissionError("job_applications.xlsx is open in another program")
+        return export(*a, **kw)
+
+    def failing_graph(method, *a, **kw):
+        if method == "PATCH" and failures["renew"] < 2:
+            failures["renew"] += 1
+            raise requests.ConnectionError("connection reset during renewal")
+        return graph(method, *a, **kw)
+
+    daemon.ctx.export, daemon.graph = failing_export, failing_graph
+
+
+def run_child(args) -> dict:
+    """One mode in this process: start the mocks and the daemon, deliver mail, time it."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    messages = generate(args.backlog + args.deliveries, seed=args.seed, start=now - timedelta(days=60), days=59)
+    # Only job mail is delivered live, so every delivery the prefilter keeps should end up in the store
+    from prefilter import Prefilter, prefilter_enabled
+
+    prefilter = Prefilter() if prefilter_enabled() else None
+    live = [m for m in messages[args.backlog:]
+            if m["_label"] != "Other" and (prefilter is None or prefilter.decide(m).startswith("kept"))]
+    graph = MockGraph({MAILBOX: messages[:args.backlog]}, latency=args.graph_latency_ms / 1000).start()
+    llm = MockOpenAI(latency=args.llm_latency_ms / 1000).start()
+    os.environ.update(GRAPH_BASE_URL=graph.base_url, STORE_FILE=os.path.abspath("job_applications.db"),
+                      CLASSIFICATION_CACHE=os.path.abspath("classification_cache.sqlite"), SYNC_MODE="delta")
+
+    stored = {}
+    done = threading.Event()
+
+    def on_update(records):
+        at = time.perf_counter()
+        for record in records:
+            stored.setdefault(record.message_id, at)
+        if all(m["id"] in stored for m in live):
+            done.set()
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from llm_classifier import configure_openai
+        from run_metrics import get_metrics
+        from watch_daemon import WatchDaemon
+
+        configure_openai("bench-key", base_url=llm.base_url)
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/notify" if args.mode in ("webhook", "faults") else ""
+        started = []
+        failures = {"export": 0, "renew": 0}
+
+        def watch():
+            # Built on the thread that runs it: the store's SQLite connection is per thread
+            daemon = WatchDaemon(lambda: "bench-token", USER, True, notification_url=url, port=port,
+                                 poll_min=args.poll_min, poll_max=args.poll_max, export_delay=args.export_delay,
+                                 on_update=on_update)
+            if args.mode == "faults":
+                inject_faults(daemon, failures)
+            started.append(daemon)
+            daemon.run()
+
+        start = time.perf_counter()
+        thread = threading.Thread(target=watch, daemon=True)
+        thread.start()
+        while not started or started[0].next_poll == 0.0:  # the first poll is the catch-up
+            time.sleep(0.01)
+        caught_up = time.perf_counter() - start
+        daemon = started[0]
+        if args.mode == "faults" and daemon.subscription:
+            daemon.subscription["expires"] = time.monotonic()  # renewal is due right away
+
+        sent = {}
+        for msg in live:
+            msg["receivedDateTime"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            sent[msg["id"]] = time.perf_counter()
+            graph.deliver(MAILBOX, msg)
+            time.sleep(args.interval)
+        done.wait(args.poll_max * 2 + 5)
+        if args.mode == "faults":
+            time.sleep(args.export_delay + args.poll_min + 1)  # room for the retried export and renewal
+        alive = thread.is_alive()
+        daemon.stop()
+        thread.join()
+        snapshot = get_metrics().snapshot()
+        apply = snapshot["spans"].get("watch.apply", {})
+
+    graph.stop()
+    llm.stop()
+    latencies = [stored[i] - sent[i] for i in sent if i in stored]
+    return {
+        "mode": args.mode,
+        "catch_up_s": round(caught_up, 3),
+        "delivered": len(sent),
+        "stored": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0) * 1000, 1),
+        "apply_ms": round(apply.get("total_s", 0) / max(apply.get("calls", 0), 1) * 1000, 1),
+        "graph_requests": graph.stats["requests"],
+        "notifications": graph.stats["notifications"],
+        "llm_requests": llm.stats["requests"],
+        "alive": alive,
+        "export_failed": snapshot["counters"].get("watch.export_failed", 0),
+        "renew_failed": snapshot["counters"].get("watch.renew_failed", 0),
+        "exports": snapshot["spans"].get("watch.export", {}).get("calls", 0),
+        "renewals": graph.stats["renewals"],
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="webhook,poll")
+    parser.add_argument("--backlog", type=int, default=500, help="emails already in the mailbox")
+    parser.add_argument("--deliveries", type=int, default=40, help="emails generated for live delivery")
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between deliveries")
+    parser.add_argument("--graph-latency-ms", type=float, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--poll-min", type=float, default=2)
+    parser.add_argument("--poll-max", type=float, default=16)
+    parser.add_argument("--export-delay", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return 0
+
+    print(f"👀 Watch latency: {args.backlog} backlog emails, up to {args.deliveries} delivered "
+          f"every {args.interval}s, Graph {args.graph_latency_ms:.0f}ms, LLM {args.llm_latency_ms:.0f}ms")
+    print(f"  {'mode':<8} {'catch-up':>9} {'stored':>8} {'p50':>9} {'p99':>9} {'max':>9} {'apply':>8} {'graph req':>10}")
+    for mode in args.modes.split(","):
+        scratch = tempfile.mkdtemp(prefix=f"bench-watch-{mode}-")
+        argv = [f"--{key.replace('_', '-')}={value}" for key, value in vars(args).items()
+                if key not in ("modes", "mode", "child")]
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), *argv, "--child", "--mode", mode],
+                               cwd=scratch, capture_output=True, text=True, env=dict(os.environ, PYTHONHASHSEED="0"))
+        if child.returncode != 0:
+            print(child.stderr[-4000:], file=sys.stderr)
+            return 1
+        r = json.loads(child.stdout.strip().splitlines()[-1])
+        print(f"  {mode:<8} {r['catch_up_s']:>8.2f}s {r['stored']:>3}/{r['delivered']:<4} {r['p50_ms']:>7.0f}ms "
+              f"{r['p99_ms']:>7.0f}ms {r['max_ms']:>7.0f}ms {r['apply_ms']:>6.0f}ms {r['graph_requests']:>10}")
+        if mode == "faults":
+            survived = (r["alive"] and r["stored"] == r["delivered"] and r["export_failed"] and r["renew_failed"]
+                        and r["exports"] > r["export_failed"] and r["renewals"])
+            print(f"  {'':<8} {'✅' if survived else '❌'} {r['export_failed']:.0f} failed export(s), "
+                  f"{r['renew_failed']:.0f} failed renewal(s); then {r['exports'] - r['export_failed']:.0f} "
+                  f"export(s), {r['renewals']} renewal(s), daemon {'running' if r['alive'] else 'stopped'}")
+            if not survived:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""Local stand-in for the Microsoft Graph messages endpoint, with injectable throttling.
+
+    server = MockGraph(messages_by_mailbox, throttle_rate=0.2).start()
+    os.environ["GRAPH_BASE_URL"] = server.base_url   # before importing graph_fetcher
+
+Supports what graph_fetcher sends: $filter on receivedDateTime (ge/lt),
+$top and @odata.nextLink paging, plus POST /$batch of single-message GETs
+(graph_batch), answered from each message's `body`, `conversationId` and
+`internetMessageHeaders` keys. Throttling is injected three ways:
+a random share of requests gets 429 + Retry-After, a random share gets 503,
+and a mailbox with more than `mailbox_concurrency` requests in flight gets
+429, like Graph's per-mailbox limit.
+
+It also plays Graph's change notifications for the watch daemon: a
+/messages/delta query ends with a deltaLink whose token returns only mail
+delivered afterwards, POST /subscriptions runs the validationToken
+handshake against the notificationUrl, and deliver() adds a message and
+POSTs the "created" notification to every subscriber of that mailbox,
+like Exchange does when new mail arrives.
+"""
+import bisect
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+
+MAILBOX_PATH = re.compile(r"^/(me|users/[^/]+)/")
+MESSAGE_PATH = re.compile(r"^/(me|users/[^/]+)/messages/([^/?]+)")
+DETAIL_FIELDS = ("body", "internetMessageHeaders")  # only returned for a single message
+SUBSCRIPTION_MAILBOX = re.compile(r"^/?(me|users/[^/]+)/")
+
+
+class MockGraph:
+    def __init__(self, mailboxes: dict, throttle_rate: float = 0.0, unavailable_rate: float = 0.0,
+                 retry_after: float = 0.1, mailbox_concurrency: int = 0, latency: float = 0.0, seed: int = 7):
+        # Newest first, as Graph returns them with $orderby=receivedDateTime desc
+        self.mailboxes = {
+            name: sorted(messages, key=lambda m: m["receivedDateTime"], reverse=True)
+            for name, messages in mailboxes.items()
+        }
+        self.throttle_rate = throttle_rate
+        self.unavailable_rate = unavailable_rate
+        self.retry_after = retry_after
+        self.mailbox_concurrency = mailbox_concurrency
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = Counter()
+        self.peak_in_flight = Counter()
+        self.stats = Counter()
+        # Ascending dates, so a $filter window is two binary searches instead of a scan
+        self.dates = {
+            name: [m["receivedDateTime"] for m in reversed(messages)] for name, messages in self.mailboxes.items()
+        }
+        self.by_id = {
+            (name, m["id"]): m for name, messages in self.mailboxes.items() for m in messages
+        }
+        self.delivered = {name: [] for name in self.mailboxes}  # deliver()ed messages; a deltatoken indexes this
+        self.subscriptions = {}  # id -> subscription as created by the client
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "MockGraph":
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock.handle(self)
+
+            def do_POST(self):
+                if self.path.startswith("/subscriptions"):
+                    mock.handle_subscribe(self)
+                else:
+                    mock.handle_batch(self)
+
+            def do_PATCH(self):
+                mock.handle_subscription_update(self)
+
+            def do_DELETE(self):
+                mock.handle_subscription_update(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        parsed = urlparse(request.path)
+        match = MAILBOX_PATH.match(parsed.path)
+        mailbox = match.group(1) if match else ""
+
+        with self.lock:
+            self.stats["requests"] += 1
+            self.in_flight[mailbox] += 1
+            self.peak_in_flight[mailbox] = max(self.peak_in_flight[mailbox], self.in_flight[mailbox])
+            over_limit = self.mailbox_concurrency and self.in_flight[mailbox] > self.mailbox_concurrency
+            roll = self.rng.random()
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            if over_limit or roll < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return self.send(request, 429, {"error": {"code": "ApplicationThrottled"}},
+                                 {"Retry-After": str(self.retry_after)})
+            if roll < self.throttle_rate + self.unavailable_rate:
+                self.stats["unavailable"] += 1
+                return self.send(request, 503, {"error": {"code": "ServiceUnavailable"}},
+                                 {"Retry-After": str(self.retry_after)})
+            if mailbox not in self.mailboxes:
+                return self.send(request, 404, {"error": {"code": "ErrorItemNotFound"}})
+            single = MESSAGE_PATH.match(parsed.path)
+            if single:
+                msg = self.by_id.get((mailbox, single.group(2)))
+                if msg is None:
+                    return self.send(request, 404, {"error": {"code": "ErrorItemNotFound"}})
+                return self.send(request, 200, {**msg, **self.detail(msg)})
+            if parsed.path.endswith("/delta"):
+                return self.send(request, 200, self.delta_page(mailbox, parsed, request.headers.get("Prefer", "")))
+            self.send(request, 200, self.page(mailbox, parsed))
+        finally:
+            with self.lock:
+                self.in_flight[mailbox] -= 1
+
+    def handle_batch(self, request: BaseHTTPRequestHandler):
+        payload = json.loads(request.rfile.read(int(request.headers["Content-Length"])))
+        items = payload.get("requests", [])
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["batches"] += 1
+        if len(items) > 20:
+            return self.send(request, 400, {"error": {"code": "BadRequest", "message": "Too many requests"}})
+
+        responses = []
+        for item in items:
+            match = MESSAGE_PATH.match(item["url"])
+            with self.lock:
+                self.stats["batch_items"] += 1
+                roll = self.rng.random()
+            if roll < self.throttle_rate:
+                self.stats["throttled"] += 1
+                responses.append({"id": item["id"], "status": 429,
+                                  "headers": {"Retry-After": str(self.retry_after)},
+                                  "body": {"error": {"code": "ApplicationThrottled"}}})
+                continue
+            msg = self.by_id.get((match.group(1), match.group(2))) if match else None
+            if msg is None:
+                responses.append({"id": item["id"], "status": 404, "body": {"error": {"code": "ErrorItemNotFound"}}})
+                continue
+            responses.append({"id": item["id"], "status": 200, "body": self.detail(msg)})
+        if self.latency:
+            time.sleep(self.latency)
+        self.send(request, 200, {"responses": responses})
+
+    @staticmethod
+    def detail(msg: dict) -> dict:
+        return {
+            "id": msg["id"],
+            "body": msg.get("body", {"contentType": "text", "content": msg.get("bodyPreview", "")}),
+            "conversationId": msg.get("conversationId", ""),
+            "internetMessageHeaders": msg.get("internetMessageHeaders", []),
+        }
+
+    def page(self, mailbox: str, parsed) -> dict:
+        query = parse_qs(parsed.query)
+        flt = query.get("$filter", [""])[0]
+        top = int(query.get("$top", ["10"])[0])
+        skip = int(query.get("$skip", ["0"])[0])
+        ge = re.search(r"ge (\S+)", flt)
+        lt = re.search(r"lt (\S+)", flt)
+        dates = self.dates[mailbox]
+        lo = bisect.bisect_left(dates, ge.group(1)) if ge else 0
+        hi = bisect.bisect_left(dates, lt.group(1)) if lt else len(dates)
+        messages = self.mailboxes[mailbox]
+        selected = messages[len(dates) - hi:len(dates) - lo]
+        body = {"value": [
+            {k: v for k, v in m.items() if k not in DETAIL_FIELDS} for m in selected[skip:skip + top]
+        ]}
+        if skip + top < len(selected):
+            body["@odata.nextLink"] = (
+                f"{self.base_url}{parsed.path}?$filter={quote(flt)}&$top={top}&$skip={skip + top}"
+            )
+        self.stats["pages"] += 1
+        return body
+
+    def delta_page(self, mailbox: str, parsed, prefer: str) -> dict:
+        query = parse_qs(parsed.query)
+        if "$deltatoken" in query:
+            # Everything delivered since the token was handed out, in one page
+            seen = int(query["$deltatoken"][0])
+            with self.lock:
+                changed = self.delivered[mailbox][seen:]
+                token = len(self.delivered[mailbox])
+            body = {"value": [{k: v for k, v in m.items() if k not in DETAIL_FIELDS} for m in changed]}
+        else:
+            size = re.search(r"odata.maxpagesize=(\d+)", prefer)
+            if size and "$top" not in query:
+                parsed = parsed._replace(query=f"{parsed.query}&$top={size.group(1)}")
+            body = self.page(mailbox, parsed)
+            if "@odata.nextLink" in body:
+                return body
+            token = len(self.delivered[mailbox])
+        body["@odata.deltaLink"] = f"{self.base_url}{parsed.path}?$deltatoken={token}"
+        return body
+
+    def deliver(self, mailbox: str, message: dict) -> int:
+        """Add `message` to `mailbox` and notify its subscribers; returns notifications accepted."""
+        with self.lock:
+            messages = self.mailboxes[mailbox]
+            dates = self.dates[mailbox]
+            at = bisect.bisect_right(dates, message["receivedDateTime"])
+            dates.insert(at, message["receivedDateTime"])
+            messages.insert(len(messages) - at, message)
+            self.by_id[(mailbox, message["id"])] = message
+            self.delivered[mailbox].append(message)
+            subscribers = [s for s in self.subscriptions.values() if s["mailbox"] == mailbox]
+        accepted = 0
+        for sub in subscribers:
+            notification = {"value": [{
+                "subscriptionId": sub["id"],
+                "clientState": sub.get("clientState"),
+                "changeType": "created",
+                "resource": f"{mailbox}/messages/{message['id']}",
+                "subscriptionExpirationDateTime": sub["expirationDateTime"],
+                "resourceData": {"@odata.type": "#Microsoft.Graph.Message", "id": message["id"]},
+            }]}
+            status = self.post(sub["notificationUrl"], json.dumps(notification).encode())
+            self.stats["notifications"] += 1
+            accepted += status == 202
+        return accepted
+
+    @staticmethod
+    def post(url: str, data: bytes = b"") -> int:
+        request = urllib.request.Request(url, data=data, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return 0
+
+    def handle_subscribe(self, request: BaseHTTPRequestHandler):
+        sub = json.loads(request.rfile.read(int(request.headers["Content-Length"])))
+        mailbox = SUBSCRIPTION_MAILBOX.match(sub.get("resource", ""))
+        if not mailbox or mailbox.group(1) not in self.mailboxes:
+            return self.send(request, 404, {"error": {"code": "ResourceNotFound"}})
+        # Graph only creates the subscription once the endpoint echoes the token back
+        token = uuid.uuid4().hex
+        url = sub["notificationUrl"]
+        validation = f"{url}{'&' if '?' in url else '?'}{urlencode({'validationToken': token})}"
+        try:
+            with urllib.request.urlopen(urllib.request.Request(validation, data=b"", method="POST"),
+                                        timeout=10) as response:
+                echoed = response.status == 200 and response.read().decode() == token
+        except OSError:
+            echoed = False
+        if not echoed:
+            return self.send(request, 400, {"error": {"code": "ValidationError",
+                                                      "message": "Subscription validation request failed."}})
+        sub.update(id=str(uuid.uuid4()), mailbox=mailbox.group(1))
+        with self.lock:
+            self.subscriptions[sub["id"]] = sub
+            self.stats["subscriptions"] += 1
+        self.send(request, 201, {k: v for k, v in sub.items() if k != "mailbox"})
+
+    def handle_subscription_update(self, request: BaseHTTPRequestHandler):
+        sub_id = urlparse(request.path).path.rsplit("/", 1)[-1]
+        with self.lock:
+            sub = self.subscriptions.get(sub_id)
+            if sub is None:
+                return self.send(request, 404, {"error": {"code": "ResourceNotFound"}})
+            if request.command == "DELETE":
+                del self.subscriptions[sub_id]
+                request.send_response(204)
+                request.send_header("Content-Length", "0")
+                return request.end_headers()
+            sub.update(json.loads(request.rfile.read(int(request.headers["Content-Length"]))))
+            self.stats["renewals"] += 1
+        self.send(request, 200, {k: v for k, v in sub.items() if k != "mailbox"})
+
+    @staticmethod
+    def send(request: BaseHTTPRequestHandler, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(data)
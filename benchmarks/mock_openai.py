@@ -0,0 +1,109 @@
+"""Local stand-in for the OpenAI chat completions endpoint, with configurable latency.
+
+    server = MockOpenAI(latency=0.3, throttle_rate=0.05).start()
+    configure_openai("test-key", base_url=server.base_url)
+
+Answers the prompts llm_classifier sends: a single-email prompt gets one
+label, a packed prompt gets {"labels": [...]} with one label per
+"Subject:" line. Labels come from a keyword heuristic over each email, so
+results are deterministic. A random share of requests gets 429 +
+retry-after, like the real rate limiter.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMAIL = re.compile(r'Subject: "(.*?)"\s+Preview: "(.*?)"', re.S)
+KEYWORDS = [
+    ("Offer", ("offer", "congratulations", "הצעת עבודה")),
+    ("Rejected", ("unfortunately", "regret", "other candidates", "not be moving forward", "לצערנו", "leider")),
+    ("Interview", ("interview", "schedule a call", "next steps", "ראיון", "entrevista")),
+    ("Applied", ("application", "applying", "received", "מועמדות", "bewerbung", "candidatura", "solicitud")),
+]
+
+
+def label_for(subject: str, preview: str) -> str:
+    text = f"{subject} {preview}".lower()
+    for label, words in KEYWORDS:
+        if any(word in text for word in words):
+            return label
+    return "Other"
+
+
+class MockOpenAI:
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 0.1, seed: int = 11):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def start(self) -> "MockOpenAI":
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                mock.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        payload = json.loads(request.rfile.read(int(request.headers["Content-Length"])))
+        prompt = payload["messages"][-1]["content"]
+        with self.lock:
+            self.stats["requests"] += 1
+            roll = self.rng.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.throttle_rate:
+            self.stats["throttled"] += 1
+            return self.send(request, 429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                             {"retry-after": str(self.retry_after)})
+
+        emails = EMAIL.findall(prompt)
+        if '"labels"' in prompt:
+            content = json.dumps({"labels": [label_for(s, p) for s, p in emails]})
+        else:
+            content = label_for(*emails[0]) if emails else "Other"
+        with self.lock:
+            self.stats["emails"] += max(len(emails), 1)
+        self.send(request, 200, {
+            "id": f"chatcmpl-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+    @staticmethod
+    def send(request: BaseHTTPRequestHandler, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(data)
@@ -0,0 +1,324 @@
+"""Offline end-to-end benchmark: every pipeline stage against local Graph and OpenAI stand-ins.
+
+    python benchmarks/run_benchmarks.py [--sizes 1000,10000,100000] [--graph-latency-ms 20]
+                                        [--llm-latency-ms 300] [--seed 1] [--compare results/OLD.json]
+
+For each mailbox size a seeded synthetic mailbox (synthetic_mailbox) is
+served by MockGraph and classified through MockOpenAI, then a fresh child
+process runs the stages in order in a scratch directory:
+
+    fetch      stream_pages over the whole mailbox
+    prefilter  Prefilter.filter per page
+    parse      parse_batch per page                       (was parse_emails)
+    classify   rules → local model → LLM per micro-batch  (was classify_response)
+    persist    TrackerContext.merge per micro-batch       (was save_to_excel)
+    export     archive split, coloring, workbook write    (was archive_old_no_response_entries)
+    report     follow-up CSV/PDF                          (was generate_summary_report)
+
+Per stage: items/s, p50/p99 latency per unit of work (page, micro-batch or
+call) and peak RSS while the stage ran. Results are written as JSON to
+benchmarks/results/ and --compare flags stages that got >10% slower or
+bigger than an earlier result file (exit status 1), for regression checks.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_graph import MockGraph
+from mock_openai import MockOpenAI
+from synthetic_mailbox import generate
+
+STAGES = ["fetch", "prefilter", "parse", "classify", "persist", "export", "report"]
+MAILBOX = "users/bench@example.com"
+SINCE = "2025-01-01T00:00:00Z"
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # No /proc (macOS): fall back to the peak so far, in KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class StageMeter:
+    """Per-stage wall time, unit latencies and peak RSS, sampled by a background thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.current = None
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.latencies = {stage: [] for stage in STAGES}
+        self.items = dict.fromkeys(STAGES, 0)
+        self.peak = dict.fromkeys(STAGES, 0)
+        self.stopped = threading.Event()
+        threading.Thread(target=self._sample, daemon=True).start()
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            stage = self.current
+            if stage:
+                self.peak[stage] = max(self.peak[stage], rss_bytes())
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int = 0):
+        self.current = name
+        self.peak[name] = max(self.peak[name], rss_bytes())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.peak[name] = max(self.peak[name], rss_bytes())
+            self.current = None
+            self.seconds[name] += elapsed
+            self.latencies[name].append(elapsed)
+            self.items[name] += items
+
+    def summary(self) -> dict:
+        self.stopped.set()
+        return {
+            stage: {
+                "items": self.items[stage],
+                "seconds": round(self.seconds[stage], 4),
+                "items_per_second": round(self.items[stage] / self.seconds[stage], 1) if self.seconds[stage] else None,
+                "p50_ms": round(percentile(self.latencies[stage], 0.5) * 1000, 3),
+                "p99_ms": round(percentile(self.latencies[stage], 0.99) * 1000, 3),
+                "calls": len(self.latencies[stage]),
+                "peak_rss_mb": round(self.peak[stage] / 2 ** 20, 1),
+            }
+            for stage in STAGES
+        }
+
+
+def run_child() -> dict:
+    """Run every stage once in this process; the parent has set up the servers and environment."""
+    meter = StageMeter()
+    baseline_rss = rss_bytes()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from email_parser import ApplicationRecord, parse_batch
+        from graph_fetcher import get_scheduler, stream_pages
+        from llm_classifier import configure_openai
+        from local_classifier import LocalClassifier
+        from pipeline import TrackerContext
+        from prefilter import Prefilter
+        from run_metrics import get_metrics
+        from stream_pipeline import MICRO_BATCH, classify_records
+
+        configure_openai(os.environ["OPENAI_API_KEY"])
+        ctx = TrackerContext()
+        prefilter = Prefilter()
+        model = LocalClassifier()
+
+        # Fetch on its own first, so its time is download time and not time spent waiting for the consumer
+        pages = []
+        source = stream_pages("bench-token", MAILBOX, SINCE)
+        while True:
+            with meter.stage("fetch"):
+                page = next(source, None)
+                if page is not None:
+                    meter.items["fetch"] += len(page)
+            if page is None:
+                break
+            pages.append(page)
+        received = [msg.get("receivedDateTime", "") for page in pages for msg in page]
+        ids = [msg.get("id") for page in pages for msg in page]
+        if received != sorted(received, reverse=True) or len(set(ids)) != len(ids):
+            raise RuntimeError("stream_pages did not yield the mailbox newest first without duplicates")
+
+        pending = []
+        batches = []
+        for page in pages:
+            with meter.stage("prefilter", len(page)):
+                kept = prefilter.filter(page)
+            with meter.stage("parse", len(kept)):
+                records = [ApplicationRecord.from_dict(record) for record in parse_batch(kept)]
+            pending.extend(records)
+            while len(pending) >= MICRO_BATCH:
+                batches.append(pending[:MICRO_BATCH])
+                pending = pending[MICRO_BATCH:]
+        if pending:
+            batches.append(pending)
+        pages.clear()
+
+        for batch in batches:
+            with meter.stage("classify", len(batch)):
+                classify_records(batch, model=model)
+            with meter.stage("persist", len(batch)):
+                ctx.merge([record.to_dict() for record in batch])
+
+        with meter.stage("export", len(ctx.df)):
+            active_df = ctx.export(force=True)
+        with meter.stage("report", len(active_df)):
+            ctx.report(active_df)
+
+    return {
+        "stages": meter.summary(),
+        "applications": int(len(ctx.df)),
+        "local_model": {key: int(value) for key, value in model.stats.items()},
+        "graph_scheduler": {key: int(value) for key, value in get_scheduler().metrics.items()},
+        "counters": get_metrics().snapshot()["counters"],
+        "baseline_rss_mb": round(baseline_rss / 2 ** 20, 1),
+    }
+
+
+def run_size(size: int, args) -> dict:
+    messages = generate(size, seed=args.seed)
+    graph = MockGraph({MAILBOX: messages}, latency=args.graph_latency_ms / 1000,
+                      throttle_rate=args.graph_throttle_rate).start()
+    llm = MockOpenAI(latency=args.llm_latency_ms / 1000, throttle_rate=args.llm_throttle_rate).start()
+    del messages
+    scratch = tempfile.mkdtemp(prefix=f"bench-{size}-")
+    env = dict(
+        os.environ,
+        GRAPH_BASE_URL=graph.base_url,
+        OPENAI_BASE_URL=llm.base_url,
+        OPENAI_API_KEY="bench-key",
+        CLASSIFICATION_CACHE=os.path.join(scratch, "classification_cache.sqlite"),
+        STORE_FILE=os.path.join(scratch, "job_applications.db"),
+        PYTHONHASHSEED="0",
+    )
+    start = time.perf_counter()
+    try:
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=scratch, env=env,
+                               capture_output=True, text=True)
+    finally:
+        graph.stop()
+        llm.stop()
+    if child.returncode != 0:
+        raise RuntimeError(f"{size} emails: benchmark child failed\n{child.stderr[-4000:]}")
+    result = json.loads(child.stdout.strip().splitlines()[-1])
+    result["emails"] = size
+    result["wall_seconds"] = round(time.perf_counter() - start, 3)
+    result["graph_requests"] = graph.stats["requests"]
+    result["graph_throttled"] = graph.stats["throttled"]
+    result["llm_requests"] = llm.stats["requests"]
+    result["llm_emails"] = llm.stats["emails"]
+    return result
+
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def print_table(result: dict):
+    print(f"\n📬 {result['emails']:,} emails → {result['applications']:,} applications, "
+          f"{result['graph_requests']} Graph requests ({result['graph_throttled']} throttled), "
+          f"{result['llm_requests']} LLM requests for {result['llm_emails']} emails, {result['wall_seconds']:.1f}s")
+    print(f"{'stage':<10} {'items':>8} {'seconds':>8} {'items/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'calls':>6} {'peak MB':>8}")
+    for stage, s in result["stages"].items():
+        rate = f"{s['items_per_second']:,.0f}" if s["items_per_second"] else "-"
+        print(f"{stage:<10} {s['items']:>8,} {s['seconds']:>8.2f} {rate:>10} {s['p50_ms']:>9.2f} "
+              f"{s['p99_ms']:>9.2f} {s['calls']:>6} {s['peak_rss_mb']:>8.1f}")
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_seconds: float = 0.05) -> list:
+    """Stages that got slower (wall time or p99) or bigger (peak RSS) by more than `threshold`."""
+    regressions = []
+    for size, result in current["sizes"].items():
+        old = baseline.get("sizes", {}).get(size)
+        if not old:
+            continue
+        for stage, s in result["stages"].items():
+            before = old["stages"].get(stage)
+            if not before:
+                continue
+            checks = [
+                ("seconds", s["seconds"], before["seconds"], min_seconds),
+                ("p99_ms", s["p99_ms"], before["p99_ms"], min_seconds * 1000),
+                ("peak_rss_mb", s["peak_rss_mb"], before["peak_rss_mb"], 5.0),
+            ]
+            for metric, now, then, floor in checks:
+                # Ignore changes too small to be more than noise
+                if now > then * (1 + threshold) and now - then > floor:
+                    regressions.append(f"{size} emails, {stage} {metric}: {then} → {now} (+{(now / then - 1):.0%})"
+                                       if then else f"{size} emails, {stage} {metric}: {then} → {now}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated mailbox sizes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--graph-latency-ms", type=float, default=20.0)
+    parser.add_argument("--graph-throttle-rate", type=float, default=0.02)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.02)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>-<sha>.json)")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child()))
+        return 0
+
+    sha = git_sha()
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "git": sha,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "graph_latency_ms": args.graph_latency_ms,
+            "graph_throttle_rate": args.graph_throttle_rate,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_throttle_rate": args.llm_throttle_rate,
+        },
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        result = run_size(size, args)
+        report["sizes"][str(size)] = result
+        print_table(result)
+
+    path = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{sha}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"🐢 {len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print("   ", line)
+            return 1
+        print(f"✅ No regressions over {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
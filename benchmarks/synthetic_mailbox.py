@@ -0,0 +1,131 @@
+"""Seeded synthetic job-search mailbox, shaped like Graph message listings.
+
+    messages = generate(10_000, seed=1)
+
+Mixes ATS senders (Greenhouse, Comeet, Lever, Workday, SmartRecruiters,
+LinkedIn) with company domains, English, Hebrew, German and Spanish
+templates, templated rejections, interview invitations, offers, replies
+("Re:"/"Fwd:") within a conversation and non-job noise (newsletters,
+receipts, social mail). Each message has an HTML `body` and a
+`conversationId`, plus `_label`, the label it was generated for.
+"""
+import random
+from datetime import datetime, timedelta
+
+ATS_SENDERS = [
+    "no-reply@greenhouse.io", "notifications@comeet.co", "no-reply@hire.lever.co",
+    "workday@myworkday.com", "jobs@smartrecruiters.com", "jobs-noreply@linkedin.com",
+]
+COMPANIES = [
+    "Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Pied Piper",
+    "Soylent", "Tyrell", "Cyberdyne", "Wonka", "Vandelay", "Oscorp", "Aperture", "Massive Dynamic",
+    "Monday Labs", "Wix Studio", "Check Systems", "Nova Data", "Blue Harbor", "Quantum Leap", "Orbit AI", "Delta Grid",
+]
+TITLES = [
+    "Backend Engineer", "Data Analyst", "QA Automation Engineer", "Product Manager", "DevOps Engineer",
+    "ML Engineer", "Frontend Developer", "Data Scientist", "Site Reliability Engineer", "Security Analyst",
+]
+HEBREW_TITLES = ["מפתח תוכנה", "מהנדס נתונים", "מנהל מוצר", "בודק תוכנה"]
+
+# (label, subject, body); {company}, {title}, {name} are filled in
+TEMPLATES = {
+    "en": [
+        ("Applied", "Thank you for applying for the {title} position at {company}",
+         "Hi {name}, thanks for your interest in {company}. We have received your application for the {title} "
+         "position and our recruiting team will review it shortly."),
+        ("Applied", "Your application for {title} role",
+         "Dear {name}, this confirms that your application to {company} was submitted successfully."),
+        ("Rejected", "Update regarding your application to {company}",
+         "Dear {name}, thank you for your interest in the {title} role. Unfortunately, we have decided to move "
+         "forward with other candidates whose experience more closely matches our needs."),
+        ("Rejected", "Your application to {company}",
+         "Hi {name}, we regret to inform you that we will not be moving forward with your application for {title}."),
+        ("Interview", "Invitation to Technical interview - {title}",
+         "Hi {name}, we'd like to invite you to a technical interview for the {title} position at {company}. "
+         "Please choose a slot in the scheduling link."),
+        ("Interview", "Next steps with {company}",
+         "Hi {name}, our team enjoyed reviewing your profile and would like to schedule a call to discuss the {title} role."),
+        ("Offer", "Offer letter - {title} at {company}",
+         "Congratulations {name}! We are excited to extend an offer for the {title} position. Please find the offer attached."),
+    ],
+    "he": [
+        ("Applied", "מועמדות למשרת {title}", "שלום {name}, קיבלנו את מועמדותך למשרת {title} ב-{company}. נחזור אליך בהקדם."),
+        ("Rejected", "עדכון לגבי מועמדותך ב-{company}",
+         "שלום {name}, תודה על התעניינותך. לצערנו החלטנו להתקדם עם מועמדים אחרים למשרת {title}."),
+        ("Interview", "הזמנה לראיון - {company}", "שלום {name}, נשמח לזמן אותך לראיון למשרת {title}."),
+    ],
+    "de": [
+        ("Applied", "Ihre Bewerbung als {title} bei {company}",
+         "Hallo {name}, vielen Dank für Ihre Bewerbung. Wir haben Ihre Unterlagen erhalten."),
+        ("Rejected", "Ihre Bewerbung bei {company}",
+         "Hallo {name}, leider müssen wir Ihnen mitteilen, dass wir uns für andere Kandidaten entschieden haben."),
+    ],
+    "es": [
+        ("Applied", "Gracias por tu candidatura a {company}",
+         "Hola {name}, hemos recibido tu solicitud para el puesto de {title}."),
+        ("Interview", "Entrevista para {title} en {company}",
+         "Hola {name}, nos gustaría invitarte a una entrevista para el puesto de {title}."),
+    ],
+}
+LANGUAGE_WEIGHTS = {"en": 0.7, "he": 0.15, "de": 0.08, "es": 0.07}
+
+NOISE = [
+    ("newsletter@medium.com", "Your weekly digest: 10 stories on Python", "Top stories picked for you this week."),
+    ("orders@shop.example.com", "Your order has shipped", "Your package is on its way and will arrive Tuesday."),
+    ("friend@gmail.com", "Dinner on Friday?", "Are you free on Friday evening? Let me know!"),
+    ("no-reply@bank.example.com", "Your monthly statement is ready", "Log in to view your statement."),
+    ("jobs-noreply@linkedin.com", "15 new jobs for Backend Engineer", "Jobs you may be interested in, based on your profile."),
+    ("events@meetup.com", "New event: PyData meetup", "Join us next week for talks and networking."),
+]
+NAMES = ["Alex", "Sam", "Dana", "Noa", "Yael", "Omer", "Lena", "Diego"]
+
+
+def _html(text: str) -> str:
+    return (f"<html><head><style>p {{margin:0}}</style></head><body><p>{text}</p>"
+            "<div>Best regards,<br>Talent Acquisition</div></body></html>")
+
+
+def generate(count: int, seed: int = 1, start: datetime = datetime(2025, 1, 1), days: int = 365,
+             job_share: float = 0.6, reply_share: float = 0.1) -> list:
+    """`count` messages, newest last, reproducible for a given seed."""
+    rng = random.Random(seed)
+    languages = list(LANGUAGE_WEIGHTS)
+    weights = list(LANGUAGE_WEIGHTS.values())
+    messages = []
+    threads = []  # (conversationId, subject, sender, label) of job emails, for replies
+    for i in range(count):
+        received = start + timedelta(seconds=rng.randrange(days * 86400))
+        if threads and rng.random() < reply_share:
+            conversation, subject, sender, label = rng.choice(threads)
+            subject = f"{rng.choice(['Re: ', 'RE: ', 'Fwd: '])}{subject}"
+            body = "Thanks for getting back to me. Looking forward to hearing from you."
+        elif rng.random() < job_share:
+            language = rng.choices(languages, weights)[0]
+            label, subject, body = rng.choice(TEMPLATES[language])
+            company = rng.choice(COMPANIES)
+            slots = {
+                "company": company,
+                "title": rng.choice(HEBREW_TITLES if language == "he" else TITLES),
+                "name": rng.choice(NAMES),
+            }
+            subject, body = subject.format(**slots), body.format(**slots)
+            if rng.random() < 0.6:
+                sender = rng.choice(ATS_SENDERS)
+            else:
+                sender = f"careers@{company.lower().replace(' ', '')}.com"
+            conversation = f"conv-{i}"
+            threads.append((conversation, subject, sender, label))
+        else:
+            sender, subject, body = rng.choice(NOISE)
+            label, conversation = "Other", f"conv-{i}"
+        messages.append({
+            "id": f"msg-{seed}-{i}",
+            "subject": subject,
+            "bodyPreview": body[:255],
+            "receivedDateTime": received.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "from": {"emailAddress": {"address": sender}},
+            "conversationId": conversation,
+            "body": {"contentType": "html", "content": _html(body)},
+            "_label": label,
+        })
+    return messages
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+CACHE_FILE = os.environ.get("CLASSIFICATION_CACHE", "classification_cache.sqlite")
+MAX_ENTRIES = int(os.environ.get("CLASSIFICATION_CACHE_MAX_ENTRIES", "50000"))
+MAX_AGE_DAYS = int(os.environ.get("CLASSIFICATION_CACHE_MAX_AGE_DAYS", "180"))
+# Every label a classifier may produce (llm_classifier re-exports it; here so importing it skips openai)
+LABELS = ["Applied", "Rejected", "Interview", "Offer", "No Reply Yet", "Other"]
+
+_REPLY_PREFIX = re.compile(r"^\s*((re|fw|fwd|aw|wg)\s*:\s*)+", re.IGNORECASE)
+
+
+def normalize_text(text: str) -> str:
+    # Same result as collapsing \s+ with a regex (str.split uses str.isspace, as re's \s does), 5x faster
+    return " ".join(str(text or "").split()).lower()
+
+
+def normalize_subject(subject: str) -> str:
+    return normalize_text(_REPLY_PREFIX.sub("", str(subject or "")))
+
+
+def cache_key(subject: str, preview: str, model: str, prompt_version: str) -> str:
+    raw = "\x1f".join([normalize_subject(subject), normalize_text(preview), model, prompt_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """SQLite-backed label cache keyed by content, model and prompt version."""
+
+    def __init__(self, model: str, prompt_version: str, path: str = CACHE_FILE,
+                 max_entries: int = MAX_ENTRIES, max_age_days: int = MAX_AGE_DAYS):
+        self.model = model
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications(last_used)")
+        self.conn.commit()
+        self.evict()
+
+    def key(self, subject: str, preview: str) -> str:
+        return cache_key(subject, preview, self.model, self.prompt_version)
+
+    def get(self, subject: str, preview: str):
+        return self.get_many([(subject, preview)])[0]
+
+    def get_many(self, items: list) -> list:
+        """Return a label (or None on a miss) for each (subject, preview) pair."""
+        keys = [self.key(subject, preview) for subject, preview in items]
+        found = {}
+        unique = list(set(keys))
+        for i in range(0, len(unique), 500):  # stay under SQLite's bound-parameter limit
+            chunk = unique[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, label FROM classifications WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(rows)
+
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE classifications SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            self.conn.commit()
+
+        labels = [found.get(k) for k in keys]
+        hit_count = sum(label is not None for label in labels)
+        self.hits += hit_count
+        self.misses += len(labels) - hit_count
+        return labels
+
+    def put(self, subject: str, preview: str, label: str):
+        self.put_many([(subject, preview, label)])
+
+    def put_many(self, items: list):
+        now = time.time()
+        rows = [
+            (self.key(subject, preview), label, self.model, self.prompt_version, now, now)
+            for subject, preview, label in items
+            if label and label != "Error"  # never pin a transient failure
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+
+    def evict(self):
+        """Drop entries from other prompt versions, past max age, or beyond max size (LRU)."""
+        cutoff = time.time() - self.max_age_days * 86400
+        self.conn.execute(
+            "DELETE FROM classifications WHERE prompt_version != ? OR last_used < ?",
+            (self.prompt_version, cutoff),
+        )
+        self.conn.execute(
+            """DELETE FROM classifications WHERE key IN (
+                   SELECT key FROM classifications ORDER BY last_used DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_entries,),
+        )
+        self.conn.commit()
+
+    def stats(self) -> dict:
+        size = self.conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+    def close(self):
+        self.conn.close()
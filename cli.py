@@ -0,0 +1,261 @@
+"""Job mail tracker command line.
+
+    python cli.py sync                 fetch, classify, store, export and report (what main.py does)
+    python cli.py watch [--port N]     keep running and apply new mail as it arrives (see watch_daemon)
+    python cli.py classify SUBJECT [PREVIEW] [--offline]
+    python cli.py export [--force] [--format xlsx|csv|parquet] [--output PATH]
+                                       rewrite the workbook (or a flat table) from the store
+    python cli.py report [--force]     write the follow-up report from the store (skipped if unchanged)
+    python cli.py status               last run, store, journal and cache state
+    python cli.py history COMPANY      status timeline of each application at a company
+    python cli.py companies [--apply]  show (or, after a backup, apply) re-filing under canonical company names
+
+Each subcommand imports only what it needs: `status` never loads pandas,
+openai, msal or requests, `classify --offline` never loads openai.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+
+def cmd_sync(args) -> int:
+    from main import run_sync
+
+    return run_sync()
+
+
+def cmd_watch(args) -> int:
+    import signal
+
+    from auth import authenticate_graph, load_config
+    from llm_classifier import configure_openai
+    from watch_daemon import WatchDaemon
+
+    config = load_config()
+    if config["mailboxes"]:
+        print("❌ watch follows one mailbox (USER_EMAIL); unset MAILBOXES or run one watcher per mailbox.")
+        return 1
+    configure_openai(os.environ["OPENAI_API_KEY"])
+    # Flags left unset fall back to WatchDaemon's WATCH_* defaults
+    options = {name: getattr(args, name) for name in ("notification_url", "poll_min", "poll_max", "port")
+               if getattr(args, name) is not None}
+    daemon = WatchDaemon(lambda: authenticate_graph(config), config["user_email"], os.environ.get("CI") == "true",
+                         **options)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: daemon.stop())
+    daemon.run()
+    return 0
+
+
+def cmd_classify(args) -> int:
+    from app_store import STORE_FILE
+    from rule_classifier import RuleClassifier
+
+    label, path = RuleClassifier().classify(args.subject, args.preview)
+    if label is None and os.path.exists(STORE_FILE) and os.environ.get("LOCAL_MODEL", "on").lower() != "off":
+        from local_classifier import get_local_model
+
+        model = get_local_model()
+        guess, confidence = model.predict([{"subject": args.subject, "preview": args.preview}])[0]
+        if guess is not None:
+            path += f" -> local:{guess}({confidence:.2f})"
+            if model.confident(confidence):
+                label = guess
+    if label is None and not args.offline:
+        from llm_classifier import classify_many, configure_openai
+
+        configure_openai(os.environ["OPENAI_API_KEY"])
+        label = classify_many([{"subject": args.subject, "preview": args.preview}])[0]
+        path += " -> llm"
+    print(f"{label or 'Unknown'}\t{path}")
+    return 0
+
+
+def cmd_export(args) -> int:
+    from pipeline import TrackerContext
+
+    ctx = TrackerContext()
+    if args.format != "xlsx":
+        from excel_writer import write_table
+
+        path = args.output or f"job_applications.{args.format}"
+        try:
+            size = write_table(ctx.df, path)
+        except ImportError:
+            print("❌ Parquet export needs pyarrow (or fastparquet): pip install pyarrow")
+            return 1
+        print(f"📦 Wrote {len(ctx.df)} applications to {path} ({size / 1024:.1f} KB)")
+        return 0
+    ctx.export(force=args.force)
+    ctx.print_io_summary()
+    return 0
+
+
+def cmd_report(args) -> int:
+    from excel_writer import split_archived
+    from pipeline import TrackerContext
+    from report_generator import generate_summary_report
+
+    ctx = TrackerContext()
+    active_df, _ = split_archived(ctx.df)
+    if args.force:
+        generate_summary_report(active_df, store=ctx.store, force=True)
+    else:
+        ctx.report(active_df)
+    return 0
+
+
+def cmd_history(args) -> int:
+    from app_store import STORE_FILE, ApplicationStore
+
+    if not os.path.exists(STORE_FILE):
+        print(f"❌ {STORE_FILE} not found.")
+        return 1
+    store = ApplicationStore(STORE_FILE)
+    applications = store.find(args.company.strip().title())
+    if not applications:
+        print(f"No applications at {args.company}.")
+    for app in applications:
+        print(f"📌 {app['company']} | {app['job_title']} | {app['response_type']} ({app['thread_id']})")
+        for event in store.timeline(app["thread_id"]):
+            print(f"    {event['date']}  {event['response_type'] or '?':<13} {event['subject']}")
+    return 0
+
+
+def cmd_companies(args) -> int:
+    from app_store import STORE_FILE, ApplicationStore
+
+    if not os.path.exists(STORE_FILE):
+        print(f"❌ {STORE_FILE} not found.")
+        return 1
+    store = ApplicationStore(STORE_FILE)
+    if store.companies is None:
+        print("❌ The company index is off (COMPANY_INDEX=off).")
+        return 1
+    renames, merges = store.rebuild_companies(apply=args.apply)
+    if args.apply:
+        return 0
+    rows = {row["thread_id"]: row for row in store.fetch(set(renames) | {t for pair in merges for t in pair})}
+    for thread_id, company in list(renames.items())[:args.limit]:
+        print(f"✏️  {rows[thread_id]['company']} → {company} | {rows[thread_id]['job_title']}")
+    for keep, drop in merges[:args.limit]:
+        print(f"🔗 {rows[drop]['company']} | {rows[drop]['job_title']} ({drop}) into {keep}")
+    print(f"🏢 {len(renames)} applications would be renamed and {len(merges)} merged; "
+          f"--apply does it after backing up {STORE_FILE}")
+    return 0
+
+
+def _count(path: str, sql: str):
+    # Read-only, so a status check never creates a missing database
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute(sql).fetchall()
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def cmd_status(args) -> int:
+    from app_store import STORE_FILE
+    from classification_cache import CACHE_FILE
+    from main import LAST_RUN_FILE
+    from run_journal import JOURNAL_FILE
+
+    mailboxes = os.environ.get("MAILBOXES", "").replace(",", " ").split()
+    print("📬 Mailbox:", ", ".join(mailboxes) or os.environ.get("USER_EMAIL", "(USER_EMAIL not set)"))
+
+    last_run = None
+    if os.path.exists(LAST_RUN_FILE):
+        with open(LAST_RUN_FILE, "r") as f:
+            last_run = json.load(f).get("last_run")
+    print("📅 Last run:", last_run or "never")
+
+    # status_daily is kept current by triggers; older stores without it fall back to a full scan
+    counts = _count(STORE_FILE, "SELECT response_type, SUM(applications) FROM status_daily "
+                                "GROUP BY response_type HAVING SUM(applications) > 0") \
+        or _count(STORE_FILE, "SELECT response_type, COUNT(*) FROM applications GROUP BY response_type")
+    if counts is None:
+        print(f"🗄️ Store: {STORE_FILE} not found")
+    else:
+        total = sum(n for _, n in counts)
+        detail = ", ".join(f"{label or '?'} {n}" for label, n in sorted(counts, key=lambda c: -c[1]))
+        print(f"🗄️ Store: {total} applications ({detail})")
+        meta = dict(_count(STORE_FILE, "SELECT key, value FROM meta") or [])
+        exported = meta.get("exported_version") == meta.get("data_version", "0")
+        print(f"📂 Workbook: {'up to date' if exported else 'export pending'} (exported {meta.get('exported_on', 'never')})")
+
+    run = dict(_count(JOURNAL_FILE, "SELECT key, value FROM run") or [])
+    if run.get("status") == "in_progress":
+        pages = _count(JOURNAL_FILE, "SELECT COUNT(*), SUM(done) FROM pages")[0]
+        print(f"⏯️ Interrupted run from {run.get('started')}: {pages[1] or 0}/{pages[0]} pages done, next sync resumes it")
+    else:
+        print("⏯️ No interrupted run")
+
+    if os.path.exists("delta_state.json"):
+        with open("delta_state.json", "r") as f:
+            print("🔄 Delta links:", ", ".join(json.load(f)) or "none")
+
+    entries = _count(CACHE_FILE, "SELECT COUNT(*) FROM classifications") if CACHE_FILE else None
+    print("🗃️ Classification cache:", f"{entries[0][0]} entries" if entries else "empty")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Track job applications from a mailbox.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("sync", help="fetch, classify, store, export and report").set_defaults(func=cmd_sync)
+
+    watch = commands.add_parser("watch", help="keep running and apply new mail as it arrives")
+    watch.add_argument("--notification-url", help="public HTTPS URL forwarding to --port; enables Graph change "
+                                                  "notifications (default: WATCH_NOTIFICATION_URL, else poll only)")
+    watch.add_argument("--port", type=int, help="port of the notification webhook (default: WATCH_PORT or 8765)")
+    watch.add_argument("--poll-min", type=float,
+                       help="seconds between polls while mail arrives (default: WATCH_POLL_MIN or 30)")
+    watch.add_argument("--poll-max", type=float, help="seconds between polls when quiet (default: WATCH_POLL_MAX or 600)")
+    watch.set_defaults(func=cmd_watch)
+
+    classify = commands.add_parser("classify", help="label one email with the rules, the local model, then the LLM")
+    classify.add_argument("subject")
+    classify.add_argument("preview", nargs="?", default="")
+    classify.add_argument("--offline", action="store_true", help="rules and local model only, never the LLM")
+    classify.set_defaults(func=cmd_classify)
+
+    export = commands.add_parser("export", help="write the workbook from the store")
+    export.add_argument("--force", action="store_true", help="write even if nothing changed")
+    export.add_argument("--format", choices=["xlsx", "csv", "parquet"], default="xlsx",
+                        help="csv/parquet write one flat table with an archived column instead of the workbook")
+    export.add_argument("--output", help="path for --format csv/parquet (default job_applications.<format>)")
+    export.set_defaults(func=cmd_export)
+
+    report = commands.add_parser("report", help="write the follow-up report from the store")
+    report.add_argument("--force", action="store_true", help="render even if nothing changed since the last report")
+    report.set_defaults(func=cmd_report)
+    commands.add_parser("status", help="show last run, store, journal and cache state").set_defaults(func=cmd_status)
+
+    history = commands.add_parser("history", help="status timeline of each application at a company")
+    history.add_argument("company")
+    history.set_defaults(func=cmd_history)
+
+    companies = commands.add_parser("companies", help="re-file applications under canonical company names")
+    companies.add_argument("--apply", action="store_true", help="back up the store, then rename and merge")
+    companies.add_argument("--limit", type=int, default=20, help="planned changes to list without --apply")
+    companies.set_defaults(func=cmd_companies)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""Company resolution index: one canonical company per employer, however its mail was sent.
+
+    index = CompanyIndex(store.conn)
+    record["company"] = index.resolve(record)
+
+email_parser.normalize_company guesses from a single email (the sender
+domain's first label, or a loose "at/from X" in the subject), so one
+employer shows up as "Acme Inc", "ACME" and "Greenhouse". The index keeps,
+in the store's database:
+
+    companies         company_id -> canonical name
+    company_aliases   alias -> company_id, with how often it was seen
+
+Aliases are `name:<key>` for every spelling (see company_key), plus what
+identifies a sender: `domain:acme.com` for a company's own domain and
+`ats:acme.greenhouse.io` / `ats:myworkday.com/acme` for ATS subdomains and
+mailboxes. Every email that names its company is a vote for what its
+sender aliases stand for; once most of a sender's votes agree (see
+ALIAS_MIN_VOTES), its later mail that only says "Unknown" or "Greenhouse"
+is filed under that company. A company the email names itself is never
+overridden. resolve() only uses exact matches: a spelling never seen before
+becomes its own company.
+
+rebuild() recomputes everything from history in one pass and takes majority
+votes for sender aliases. With fuzzy=True (the `cli.py companies` command)
+it also clusters all distinct names at once by cosine similarity of hashed
+character-trigram vectors (NumPy, each compared only with names of as many
+words sharing its prefix), which takes a few seconds at 100k rows. Lookups
+are served from memory.
+"""
+import os
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from email_parser import KNOWN_PLATFORMS
+from run_metrics import count, get_logger
+
+log = get_logger(__name__)
+
+# Cosine similarity of character-trigram vectors at which two names are one company
+MATCH_THRESHOLD = float(os.environ.get("COMPANY_MATCH_THRESHOLD", "0.8"))
+NGRAM_DIM = 1024
+BLOCK_CHARS = 2  # names are only compared with names of as many words sharing this many leading characters
+MAX_LENGTH_GAP = 2  # a typo adds or drops a character or two; "Ionion" vs "Ionionion" is another company
+CHUNK_ROWS = 2048  # rows of a block's similarity matrix computed at once
+# A sender alias (domain, ATS mailbox) names a company only after this many emails filed under
+# one company, at least this share of all it sent: job boards and agencies send for many employers
+ALIAS_MIN_VOTES = int(os.environ.get("COMPANY_ALIAS_MIN_VOTES", "2"))
+ALIAS_MIN_SHARE = 0.6
+
+ATS_NAMES = {p for p in KNOWN_PLATFORMS if p != "mail"} | {
+    "lever", "workable", "greenhouse-mail", "icims", "jobvite", "ashbyhq", "bamboohr", "teamtailor",
+    "recruitee", "personio", "taleo", "successfactors", "myworkdayjobs", "breezy", "hibob",
+}
+FREEMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "outlook.com", "hotmail.com", "live.com", "msn.com", "yahoo.com",
+    "icloud.com", "me.com", "aol.com", "protonmail.com", "proton.me", "walla.co.il", "gmx.de", "gmx.net",
+}
+SECOND_LEVEL = {"co", "com", "org", "net", "ac", "gov", "edu"}  # co.il, com.au, ...
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "ltd", "limited", "llc", "llp", "plc", "gmbh", "ag", "sa", "sas", "srl", "sl",
+    "bv", "nv", "corp", "corporation", "co", "company", "group", "holdings", "technologies", "com", "io", "בעמ",
+}
+# Words in ATS mailboxes and sender names that say nothing about the employer
+SENDER_WORDS = {
+    "no", "reply", "noreply", "donotreply", "do", "not", "notifications", "notification", "notify", "team",
+    "talent", "acquisition", "recruiting", "recruitment", "recruiter", "careers", "career", "jobs", "job",
+    "hiring", "hr", "people", "mail", "email", "info", "us", "eu", "app", "www", "hire", "apply", "mg", "em",
+}
+# Subject words that are never company names, for mentions of a known company in a subject
+SUBJECT_WORDS = {
+    "application", "applying", "applied", "interview", "position", "role", "offer", "update", "thank", "thanks",
+    "your", "our", "the", "for", "and", "with", "from", "team", "job", "jobs", "career", "careers", "next", "steps",
+}
+PLACEHOLDERS = {"", "unknown"} | ATS_NAMES | {d.split(".")[0] for d in FREEMAIL_DOMAINS}
+
+_PUNCT = re.compile(r"[^\w\s]")
+_VIA = re.compile(r"\s+(?:via|through)\s+.*$", re.IGNORECASE)
+
+
+def company_index_enabled() -> bool:
+    return os.environ.get("COMPANY_INDEX", "on").lower() != "off"
+
+
+@lru_cache(maxsize=65536)
+def company_key(name: str) -> str:
+    """Comparable form of a company name: lowercase words, no punctuation, no "Inc"/"Ltd"/leading "The"."""
+    words = _PUNCT.sub(" ", name.lower().replace('בע"מ', " ").replace("&", " and ")).split()
+    while len(words) > 1 and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    if len(words) > 1 and words[0] == "the":
+        words = words[1:]
+    return " ".join(words)
+
+
+def is_placeholder(name: str) -> bool:
+    """True for "Unknown" and the ATS/freemail names normalize_company falls back to."""
+    return company_key(name or "") in PLACEHOLDERS
+
+
+@lru_cache(maxsize=16384)
+def registrable_domain(domain: str) -> str:
+    parts = domain.lower().strip(".").split(".")
+    if len(parts) >= 3 and parts[-2] in SECOND_LEVEL and len(parts[-1]) == 2:
+        return ".".join(parts[-3:])
+    return ".".join(parts[-2:])
+
+
+@lru_cache(maxsize=16384)
+def sender_aliases(email: str) -> tuple:
+    """("own" | "ats" | "free" | "", alias keys) identifying who sent `email`."""
+    if "@" not in (email or ""):
+        return "", ()
+    local, domain = email.lower().rsplit("@", 1)
+    base = registrable_domain(domain)
+    if base in FREEMAIL_DOMAINS:
+        return "free", ()
+    if not any(name in base for name in ATS_NAMES):
+        return "own", (f"domain:{base}",)
+    aliases = []
+    # acme.greenhouse.io / acme.wd5.myworkdayjobs.com: the employer's tenant on the ATS
+    tenant = [label for label in domain[:-len(base)].strip(".").split(".") if label and label not in SENDER_WORDS
+              and not label[-1].isdigit()]
+    if tenant:
+        aliases.append(f"ats:{tenant[0]}.{base}")
+    words = [w for w in re.split(r"[^a-z0-9]+", local) if w]
+    if words and not all(w in SENDER_WORDS for w in words):
+        aliases.append(f"ats:{base}/{local}")
+    return "ats", tuple(aliases)
+
+
+def display_company(display_name: str) -> str:
+    """The employer in an ATS sender name ("Acme via Greenhouse", "Acme Talent Team"), else ""."""
+    name = (display_name or "").strip().strip('"')
+    stripped = _VIA.sub("", name)
+    words = stripped.split()
+    kept = [w for w in words if _PUNCT.sub("", w.lower()) not in SENDER_WORDS]
+    # A person's name has neither "via" nor recruiting words; only trust names that look like a team
+    if not kept or (stripped == name and len(kept) == len(words)) or is_placeholder(" ".join(kept)):
+        return ""
+    return " ".join(kept)
+
+
+def block_of(key: str) -> str:
+    # "Acme" and "Acme Bio" are as trigram-similar as "Acme" and a typo of it; a word more is another company
+    return f"{key.count(' ')}:{key[:BLOCK_CHARS]}"
+
+
+def trigrams(key: str) -> list:
+    padded = f" {key} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def vectorize(keys: list, dim: int = NGRAM_DIM):
+    """L2-normalised hashed character-trigram counts, one row per key."""
+    import numpy as np
+
+    rows, cols = [], []
+    for i, key in enumerate(keys):
+        for gram in trigrams(key):
+            rows.append(i)
+            cols.append(zlib.crc32(gram.encode("utf-8")) % dim)
+    matrix = np.zeros((len(keys), dim), dtype=np.float32)
+    np.add.at(matrix, (rows, cols), 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cluster_keys(keys: list, threshold: float = MATCH_THRESHOLD) -> list:
+    """Cluster label per key: union-find over close-length pairs at least `threshold` similar, within blocks."""
+    import numpy as np
+
+    parent = list(range(len(keys)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    blocks = defaultdict(list)
+    for i, key in enumerate(keys):
+        blocks[block_of(key)].append(i)
+    vectors = vectorize(keys)
+    lengths = np.array([len(key) for key in keys])
+    for members in blocks.values():
+        if len(members) < 2:
+            continue
+        members = np.array(members)
+        block, size = vectors[members], lengths[members]
+        for start in range(0, len(members), CHUNK_ROWS):
+            sims = block[start:start + CHUNK_ROWS] @ block.T
+            close = np.abs(size[start:start + CHUNK_ROWS, None] - size[None, :]) <= MAX_LENGTH_GAP
+            rows, cols = np.nonzero((sims >= threshold) & close)
+            for a, b in zip(rows + start, cols):
+                if a < b:
+                    ra, rb = root(members[a]), root(members[b])
+                    if ra != rb:
+                        parent[max(ra, rb)] = min(ra, rb)
+    return [root(i) for i in range(len(keys))]
+
+
+class CompanyIndex:
+    """Canonical companies and learned aliases, persisted next to the applications they name."""
+
+    def __init__(self, conn, threshold: float = MATCH_THRESHOLD):
+        self.conn = conn
+        self.threshold = threshold
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS companies (company_id TEXT PRIMARY KEY, name TEXT NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS company_aliases (
+                    alias TEXT NOT NULL,
+                    company_id TEXT NOT NULL,
+                    hits INTEGER NOT NULL,
+                    PRIMARY KEY (alias, company_id)
+                ) WITHOUT ROWID
+            """)
+        self.load()
+
+    def load(self):
+        self.names = dict(self.conn.execute("SELECT company_id, name FROM companies"))
+        self.aliases = {}  # alias -> (company_id, hits) of its most frequent company
+        self.votes = Counter()  # alias -> hits over all its companies
+        for alias, company_id, hits in self.conn.execute("SELECT alias, company_id, hits FROM company_aliases"):
+            self.votes[alias] += hits
+            if hits > self.aliases.get(alias, (None, 0))[1]:
+                self.aliases[alias] = (company_id, hits)
+        self._blocks = {}  # block_of(name key) -> [(company id, key length), trigram matrix, rows used], built lazily
+        self._mentions = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # -- lookups -----------------------------------------------------------------
+
+    def company_id(self, name: str, create: bool = True, fuzzy: bool = True):
+        """The company `name` belongs to: known spelling, else (if `fuzzy`) the most similar known name, else a new company."""
+        key = company_key(name)
+        if key in PLACEHOLDERS:
+            return None
+        hit = self.aliases.get(f"name:{key}")
+        if hit:
+            return hit[0]
+        company_id = self._similar(key) if fuzzy else None
+        if company_id:
+            count("company.fuzzy_matched")
+        elif create:
+            company_id = self._new_company(name.strip(), key)
+        else:
+            return None
+        self.learn(f"name:{key}", company_id)
+        return company_id
+
+    def canonical(self, name: str) -> str:
+        """The canonical spelling of `name`, or `name` itself for a company the index does not know."""
+        company_id = self.company_id(name, create=False) if name else None
+        return self.names[company_id] if company_id else name
+
+    def _similar(self, key: str):
+        import numpy as np
+
+        block = block_of(key)
+        if block not in self._blocks:
+            keys = [alias[5:] for alias in self.aliases
+                    if alias.startswith(f"name:{key[:BLOCK_CHARS]}") and block_of(alias[5:]) == block]
+            self._blocks[block] = [[(self.aliases[f"name:{k}"][0], len(k)) for k in keys], vectorize(keys), len(keys)]
+        entries, matrix, rows = self._blocks[block]
+        if not rows:
+            return None
+        # Only the query's own trigrams can contribute: a few columns instead of the whole matrix
+        query = vectorize([key])[0]
+        cols = query.nonzero()[0]
+        sims = matrix[:rows, cols] @ query[cols]
+        matches = np.flatnonzero(sims >= self.threshold)
+        for i in matches[np.argsort(-sims[matches])]:
+            if abs(entries[i][1] - len(key)) <= MAX_LENGTH_GAP:
+                return entries[i][0]
+        return None
+
+    def _add_name(self, key: str, company_id: str):
+        """Append a new spelling to its cached block (capacity doubles), instead of re-vectorizing the block."""
+        import numpy as np
+
+        block = self._blocks.get(block_of(key))
+        if block is not None:
+            entries, matrix, rows = block
+            if rows == len(matrix):
+                matrix = np.concatenate([matrix, np.zeros((max(rows, 16), NGRAM_DIM), dtype=np.float32)])
+            matrix[rows] = vectorize([key])[0]
+            entries.append((company_id, len(key)))
+            self._blocks[block_of(key)] = [entries, matrix, rows + 1]
+        if self._mentions is not None and len(key) >= 3 and key not in SUBJECT_WORDS:
+            self._mentions[key] = company_id
+
+    def mentioned(self, text: str):
+        """The one known company named in `text` (e.g. a subject), or None if none or several are."""
+        if self._mentions is None:
+            self._mentions = {}
+            for alias, (company_id, _) in self.aliases.items():
+                key = alias[5:]
+                if alias.startswith("name:") and len(key) >= 3 and key not in SUBJECT_WORDS:
+                    self._mentions[key] = company_id
+        words = company_key(text or "").split()
+        found = set()
+        for size in (3, 2, 1):
+            for i in range(len(words) - size + 1):
+                company_id = self._mentions.get(" ".join(words[i:i + size]))
+                if company_id:
+                    found.add(company_id)
+        return found.pop() if len(found) == 1 else None
+
+    def resolve(self, record: dict) -> str:
+        """Canonical company of a parsed email record; learns its sender aliases on the way.
+
+        A company named by the email itself always wins. The subject and the
+        sender's learned aliases only fill in for a placeholder ("Unknown",
+        "Greenhouse"), so a job board's domain never re-files named mail.
+        Names are matched exactly (see company_key), never by similarity:
+        that re-files user data, which only rebuild(fuzzy=True) does.
+        """
+        guess = record.get("company") or ""
+        kind, aliases = sender_aliases(record.get("email") or "")
+        candidates = [display_company(record.get("sender_name"))] if kind == "ats" else []
+        if not is_placeholder(guess):
+            candidates.append(self._known_prefix(guess) or guess)
+        company_id = next((found for found in (c and self.company_id(c, fuzzy=False) for c in candidates) if found),
+                          None)
+        if company_id:
+            # Only mail that names its company votes for what its sender stands for
+            for alias in aliases:
+                self.learn(alias, company_id)
+        else:
+            company_id = self.mentioned(record.get("subject"))
+            if not company_id:
+                company_id = self.sender_company(aliases)
+                count("company.alias_hits", company_id is not None)
+        if not company_id:
+            return "Unknown" if is_placeholder(guess) else guess
+        return self.names[company_id]
+
+    def sender_company(self, aliases: tuple):
+        """The company one of a sender's aliases was voted to (see ALIAS_MIN_VOTES), else None."""
+        for alias in aliases:
+            company_id, hits = self.aliases.get(alias, (None, 0))
+            if hits >= ALIAS_MIN_VOTES and hits >= ALIAS_MIN_SHARE * self.votes[alias]:
+                return company_id
+        return None
+
+    def _known_prefix(self, name: str):
+        # "at X" hints run on ("Acme For The Backend Role"); prefer the longest known leading name
+        words = name.split()
+        for size in range(min(len(words), 4), 0, -1):
+            if f"name:{company_key(' '.join(words[:size]))}" in self.aliases:
+                return " ".join(words[:size])
+        return None
+
+    # -- learning ----------------------------------------------------------------
+
+    def learn(self, alias: str, company_id: str, hits: int = 1):
+        self.conn.execute("""
+            INSERT INTO company_aliases VALUES (?, ?, ?)
+            ON CONFLICT (alias, company_id) DO UPDATE SET hits = hits + excluded.hits
+        """, (alias, company_id, hits))
+        self.votes[alias] += hits
+        best_id, best_hits = self.aliases.get(alias, (None, 0))
+        if best_id == company_id:
+            self.aliases[alias] = (company_id, best_hits + hits)
+            return
+        total = self.conn.execute("SELECT hits FROM company_aliases WHERE alias = ? AND company_id = ?",
+                                  (alias, company_id)).fetchone()[0]
+        if total > best_hits:
+            self.aliases[alias] = (company_id, total)
+            if alias.startswith("name:") and best_id is None:
+                self._add_name(alias[5:], company_id)
+            elif alias.startswith("name:"):
+                # A spelling moved to another company: its row in the block is stale
+                self._blocks.pop(block_of(alias[5:]), None)
+                self._mentions = None
+
+    def _new_company(self, name: str, key: str) -> str:
+        company_id = base = "co-" + "-".join(key.split())[:48]
+        n = 1
+        while company_id in self.names:
+            n += 1
+            company_id = f"{base}-{n}"
+        self.conn.execute("INSERT INTO companies VALUES (?, ?)", (company_id, name))
+        self.names[company_id] = name
+        count("company.created")
+        return company_id
+
+    def rebuild(self, rows, fuzzy: bool = True) -> dict:
+        """Recompute companies and aliases from history rows of (thread_id, company, email, subject).
+
+        Returns {thread_id: canonical company} for the rows whose company
+        should change. Without `fuzzy`, only spellings with the same
+        company_key are one company. The caller owns the transaction.
+        """
+        start = time.perf_counter()
+        rows = [(thread_id, company or "", (email or "").lower(), subject or "")
+                for thread_id, company, email, subject in rows]
+        spellings = defaultdict(Counter)  # name key -> spellings seen
+        for _, company, _, _ in rows:
+            if not is_placeholder(company):
+                spellings[company_key(company)][company.strip()] += 1
+
+        keys = list(spellings)
+        clusters = defaultdict(list)
+        labels = cluster_keys(keys, self.threshold) if keys and fuzzy else range(len(keys))
+        for key, label in zip(keys, labels):
+            clusters[label].append(key)
+
+        self.conn.execute("DELETE FROM companies")
+        self.conn.execute("DELETE FROM company_aliases")
+        self.names, self.aliases = {}, {}
+        key_ids = {}
+        for members in clusters.values():
+            names = sum((spellings[key] for key in members), Counter())
+            name = names.most_common(1)[0][0]
+            company_id = self._new_company(name, company_key(name))
+            for key in members:
+                key_ids[key] = company_id
+        self.conn.executemany("INSERT INTO company_aliases VALUES (?, ?, ?)",
+                              [(f"name:{key}", key_ids[key], sum(spellings[key].values())) for key in keys])
+
+        # Sender aliases: every company named in mail from that domain / ATS mailbox gets a vote
+        votes = Counter()
+        for _, company, email, _ in rows:
+            company_id = None if is_placeholder(company) else key_ids.get(company_key(company))
+            if company_id:
+                for alias in sender_aliases(email)[1]:
+                    votes[alias, company_id] += 1
+        self.conn.executemany("INSERT INTO company_aliases VALUES (?, ?, ?)",
+                              [(alias, company_id, hits) for (alias, company_id), hits in votes.items()])
+        self.load()
+        trusted = sum(self.sender_company((alias,)) is not None for alias in {alias for alias, _ in votes})
+
+        changes = {}
+        for thread_id, company, email, subject in rows:
+            if is_placeholder(company):
+                company_id = self.mentioned(subject) or self.sender_company(sender_aliases(email)[1])
+            else:
+                company_id = key_ids[company_key(company)]
+            if company_id and self.names[company_id] != company:
+                changes[thread_id] = self.names[company_id]
+        log.info(f"🏢 Company index: {len(keys)} spellings → {len(self.names)} companies, "
+                 f"{trusted} sender aliases from {len(rows)} applications "
+                 f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return changes
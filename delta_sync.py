@@ -0,0 +1,158 @@
+import json
+import os
+
+from graph_fetcher import GRAPH_BASE_URL, PAGE_SIZE, SELECT_FIELDS, get_scheduler, stream_pages
+from graph_scheduler import GraphRequestError
+from run_journal import Page
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+DELTA_STATE_FILE = "delta_state.json"
+
+_pending = {}  # state key -> deltaLink, committed once the run has persisted its results
+
+
+class DeltaTokenExpired(Exception):
+    pass
+
+
+class DeltaSyncError(Exception):
+    pass
+
+
+def state_key(mailbox: str, folder: str) -> str:
+    return f"{mailbox}/{folder}"
+
+
+def load_delta_state() -> dict:
+    if not os.path.exists(DELTA_STATE_FILE):
+        return {}
+    try:
+        with open(DELTA_STATE_FILE, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        log.warning("⚠️ Failed to read delta_state.json: %s", e)
+        return {}
+
+
+def save_delta_state(state: dict):
+    with open(DELTA_STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def initial_delta_url(mailbox: str, since: str, folder: str = "inbox") -> str:
+    # Delta only supports filtering/ordering on receivedDateTime, which is all we need
+    return (
+        f"{GRAPH_BASE_URL}/{mailbox}/mailFolders/{folder}/messages/delta"
+        f"?$filter=receivedDateTime ge {since}&$orderby=receivedDateTime desc"
+        f"&$select={SELECT_FIELDS}"
+    )
+
+
+def iter_delta_round(url: str, access_token: str, key: str, scheduler=None):
+    """Yield one page of changed messages at a time through a delta round.
+
+    The round's final deltaLink is held as pending for `key` until
+    commit_delta_links is called, and also travels on the last Page so a
+    run journal can keep it across an interruption.
+    """
+    scheduler = scheduler or get_scheduler()
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Prefer": f"odata.maxpagesize={PAGE_SIZE}",
+    }
+    while url:
+        try:
+            response = scheduler.get(url, headers=headers)
+        except GraphRequestError as e:
+            raise DeltaSyncError(str(e)) from e
+        log.info("Delta: %s", url)
+        if response.status_code == 410:
+            raise DeltaTokenExpired(response.text)
+        if response.status_code != 200:
+            raise DeltaSyncError(f"{response.status_code} {response.text}")
+
+        data = response.json()
+        delta_link = data.get("@odata.deltaLink")
+        next_url = data.get("@odata.nextLink")
+        if delta_link:
+            _pending[key] = delta_link
+        # Deleted/moved messages come back as tombstones; there is nothing to classify
+        yield Page([m for m in data.get("value", []) if "@removed" not in m], key, url, next_url, delta_link)
+
+        if delta_link:
+            return
+        url = next_url
+
+    raise DeltaSyncError("Delta round ended without a deltaLink")
+
+
+def hold_delta_link(key: str, link: str):
+    """Queue a deltaLink for commit_delta_links, e.g. one restored from a run journal."""
+    _pending[key] = link
+
+
+def stream_sync_pages(access_token: str, mailbox: str, since: str, folder: str = "inbox", resume: dict = None):
+    """Yield pages of messages added or changed since the last committed sync.
+
+    Without a stored deltaLink (first run, or the token expired) a new delta
+    round is started from the `since` watermark. If the delta endpoint fails
+    altogether the date-filtered fetch is used instead. A failure after pages
+    were already yielded is re-raised: the link stays uncommitted, so the next
+    run replays the round.
+
+    `resume` (RunJournal.resume_urls) continues an interrupted round from its
+    last unfinished page; a round the journal saw finish is not fetched again.
+    """
+    key = state_key(mailbox, folder)
+    delta_link = load_delta_state().get(key, {}).get("delta_link")
+    if resume and key in resume:
+        if resume[key] is None:
+            return
+        delta_link = resume[key]
+
+    if delta_link:
+        yielded = False
+        try:
+            for page in iter_delta_round(delta_link, access_token, key):
+                yielded = True
+                yield page
+            return
+        except DeltaTokenExpired:
+            if yielded:
+                raise
+            log.info("🔁 Delta token expired, resyncing from: %s", since)
+        except DeltaSyncError as e:
+            if yielded:
+                raise
+            log.warning("⚠️ Delta sync failed, resyncing from: %s %s", since, e)
+
+    yielded = False
+    try:
+        for page in iter_delta_round(initial_delta_url(mailbox, since, folder), access_token, key):
+            yielded = True
+            yield page
+        return
+    except (DeltaTokenExpired, DeltaSyncError) as e:
+        if yielded:
+            raise
+        log.warning("⚠️ Delta query unavailable, falling back to date filter: %s", e)
+
+    yield from stream_pages(access_token, mailbox, since, resume=resume)
+
+
+def sync_messages(access_token: str, mailbox: str, since: str, folder: str = "inbox") -> list:
+    """Return messages added or changed since the last committed sync."""
+    return [msg for page in stream_sync_pages(access_token, mailbox, since, folder) for msg in page]
+
+
+def commit_delta_links():
+    """Persist deltaLinks collected this run; call only after results are saved."""
+    if not _pending:
+        return
+    state = load_delta_state()
+    for key, link in _pending.items():
+        state[key] = {"delta_link": link}
+    save_delta_state(state)
+    _pending.clear()
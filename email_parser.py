@@ -1,95 +1,196 @@
 import re
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from collections import defaultdict
+from functools import lru_cache
 
+from classification_cache import normalize_subject
 
-def normalize_company(email_address: str, subject: str, preview: str = "") -> str:
-    if not email_address or "@" not in email_address:
-        return "Unknown"
+KNOWN_PLATFORMS = ["comeet", "greenhouse", "linkedin", "workflow", "mail", "smartrecruiters", "myworkday", "canditech", "sparkhire"]
+
+COMPANY_HINT = re.compile(r"\b(?:at|from|on behalf of)\s+([A-Z][\w&\-\. ]+)", re.IGNORECASE)
+
+# Tried in order; the first pattern that matches (with a short enough title) wins
+TITLE_PATTERNS = [
+    r"applying for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
+    r"application for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
+    r"for (?:the )?(.+?) position",
+    r"position[:\-] (.+?)(?:\.|$)",
+    r"role[:\-] (.+?)(?:\.|$)",
+    r"מועמדות למשרת\s*(.+?)\b",
+    r"position at\s+([A-Z][\w\- ]+)",  # for cases like "Software Engineer Position at X"
+    r"invitation to (.+?) interview",
+    r"technical exam and guidelines for (.+?)",
+    r"joining our (.+?) program",
+]
+
+MAX_TITLE_WORDS = 8  # avoid overly long matches
+BODY_PREVIEW_CHARS = 1000  # of an enriched body, used as preview and for title fallback
+
+_TITLE_REGEXES = [re.compile(p, re.IGNORECASE) for p in TITLE_PATTERNS]
+
+
+def _fold_title_patterns(patterns: list) -> re.Pattern:
+    """One regex equivalent to trying `patterns` in order with re.search.
 
-    full_domain = email_address.split("@")[-1]
+    Alternative i is `[\\s\\S]*?(pattern i)` anchored at the start, so the engine
+    only moves on to pattern i+1 once pattern i has no match anywhere, and a
+    lazy prefix finds pattern i's leftmost match, exactly like re.search.
+    """
+    branches = []
+    for i, pattern in enumerate(patterns):
+        named = re.sub(r"\((?!\?)", f"(?P<t{i}>", pattern, count=1)
+        branches.append(r"[\s\S]*?" + named)
+    return re.compile(r"\A(?:" + "|".join(branches) + ")", re.IGNORECASE)
+
+
+TITLE_MATCHER = _fold_title_patterns(TITLE_PATTERNS)
+
+RECEIVED_FORMAT = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z\Z")
+
+
+def is_platform_domain(full_domain: str, platforms=KNOWN_PLATFORMS) -> bool:
+    """True if a sender domain belongs to an ATS platform (substring match: myworkdayjobs.com is myworkday)."""
+    return any(p in full_domain for p in platforms)
+
+
+@lru_cache(maxsize=4096)
+def _domain_company(full_domain: str):
+    """(is_platform, fallback company) for a sender domain; memoized since senders repeat."""
     domain_parts = full_domain.split(".")
     domain = domain_parts[0].lower()
+    is_platform = is_platform_domain(full_domain)
+
+    if domain in KNOWN_PLATFORMS:
+        if len(domain_parts) > 1:
+            return is_platform, domain_parts[-2].title()
+        return is_platform, "Unknown"
+    return is_platform, domain.title()
 
-    known_platforms = ["comeet", "greenhouse", "linkedin", "workflow", "mail", "smartrecruiters", "myworkday", "canditech", "sparkhire"]
+
+def normalize_company(email_address: str, subject: str, preview: str = "") -> str:
+    if not email_address or "@" not in email_address:
+        return "Unknown"
+
+    is_platform, fallback = _domain_company(email_address.split("@")[-1])
 
     # If it's a known hiring platform, try to extract from subject or preview
-    if any(p in full_domain for p in known_platforms):
+    if is_platform:
         # Match from "at Company", "from Company", etc.
-        combined = f"{subject} {preview}"
-        match = re.search(r"\b(?:at|from|on behalf of)\s+([A-Z][\w&\-\. ]+)", combined, re.IGNORECASE)
+        match = COMPANY_HINT.search(f"{subject} {preview}")
         if match:
             return match.group(1).strip(" .,-").title()
 
     # Otherwise fallback to domain name
-    if domain in known_platforms:
-        if len(domain_parts) > 1:
-            company_guess = domain_parts[-2]
-            return company_guess.title()
-        return "Unknown"
-
-    return domain.title()
+    return fallback
 
 
 def extract_job_title(subject: str, preview: str = "") -> str:
     combined = f"{subject} {preview}"
 
-    patterns = [
-        r"applying for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
-        r"application for (?:the )?(.+?)(?: position| role| job| at|\.|$)",
-        r"for (?:the )?(.+?) position",
-        r"position[:\-] (.+?)(?:\.|$)",
-        r"role[:\-] (.+?)(?:\.|$)",
-        r"מועמדות למשרת\s*(.+?)\b",
-        r"position at\s+([A-Z][\w\- ]+)",  # for cases like "Software Engineer Position at X"
-        r"invitation to (.+?) interview",
-        r"technical exam and guidelines for (.+?)",
-        r"joining our (.+?) program",
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, combined, re.IGNORECASE)
+    match = TITLE_MATCHER.match(combined)
+    if not match:
+        return "Unknown"
+
+    index = int(match.lastgroup[1:])
+    job = match.group(match.lastgroup).strip(" .,-")
+    if len(job.split()) <= MAX_TITLE_WORDS:
+        return job.title()
+
+    # Rare: the winning match was too long, so keep trying the later patterns one by one
+    for regex in _TITLE_REGEXES[index + 1:]:
+        match = regex.search(combined)
         if match:
             job = match.group(1).strip(" .,-")
-            if len(job.split()) <= 8:  # avoid overly long matches
+            if len(job.split()) <= MAX_TITLE_WORDS:
                 return job.title()
 
     return "Unknown"
 
 
-
-
-
-def parse_emails(messages: list) -> list:
-    parsed_by_sender = defaultdict(list)
-
+@dataclass(slots=True)
+class ApplicationRecord:
+    """Compact tracker row used by the streaming pipeline instead of a dict per email."""
+    company: str
+    job_title: str
+    date_applied: str
+    subject: str
+    email: str
+    thread_id: str  # normalized subject; the store replaces it with the application's id
+    preview: str = ""
+    response_type: str = ""
+    label_source: str = ""  # "rules", "local" or "llm": the classifier stage that chose response_type
+    conversation_id: str = ""  # Graph conversationId
+    message_id: str = ""  # Graph message id, for the run journal
+    sender_name: str = ""  # display name, e.g. "Acme via Greenhouse"; company_index learns from it
+    page_key: tuple = None  # (stream, seq) of the journaled page it came from
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "ApplicationRecord":
+        return cls(**{k: record.get(k, "") for k in cls.__slots__})
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_message(msg: dict):
+    """Parse one Graph message into a tracker record, or None if it lacks sender/subject/date."""
+    sender = msg.get("from", {}).get("emailAddress", {}).get("address", "").lower()
+    subject = msg.get("subject", "")
+    preview = msg.get("bodyPreview", "")
+    date_str = msg.get("receivedDateTime", "")
+    if not sender or not subject or not date_str:
+        return None
+
+    if not RECEIVED_FORMAT.match(date_str):
+        return None
+    try:
+        datetime.fromisoformat(date_str[:19])  # rejects impossible dates like 2025-02-30
+    except ValueError:
+        return None
+
+    job_title = extract_job_title(subject)
+    body = msg.get("body_text")  # present when graph_batch enrichment ran
+    if body:
+        preview = body[:BODY_PREVIEW_CHARS]
+        if job_title == "Unknown":
+            job_title = extract_job_title(subject, preview)
+
+    return {
+        "company": normalize_company(sender, subject),
+        "job_title": job_title,
+        "date_applied": date_str[:10],
+        "subject": subject,
+        "email": sender,
+        "thread_id": normalize_subject(subject),  # "Re:"/"Fwd:" replies share their original's subject
+        "preview": preview,
+        "conversation_id": msg.get("conversationId", ""),
+        "sender_name": msg.get("from", {}).get("emailAddress", {}).get("name", ""),
+    }
+
+
+def parse_batch(messages: list, latest_per_thread: bool = False) -> list:
+    """Parse a whole fetched batch in one call, skipping unparseable messages.
+
+    With latest_per_thread only the newest email of each conversation (or,
+    without a conversationId, of each sender and subject) is kept.
+    """
+    if not latest_per_thread:
+        return [record for record in map(parse_message, messages) if record is not None]
+
+    newest = {}
     for msg in messages:
-        sender = msg.get("from", {}).get("emailAddress", {}).get("address", "").lower()
-        subject = msg.get("subject", "")
-        preview = msg.get("bodyPreview", "")
-        date_str = msg.get("receivedDateTime", "")
-        if not sender or not subject or not date_str:
+        record = parse_message(msg)
+        if record is None:
             continue
+        # Graph timestamps share one fixed-width format, so they order correctly as strings
+        received = msg["receivedDateTime"]
+        thread = record["conversation_id"] or (record["email"], record["thread_id"])
+        current = newest.get(thread)
+        if current is None or received > current[0]:
+            newest[thread] = (received, record)
+    return [record for _, record in newest.values()]
 
-        try:
-            received_dt = datetime.strptime(date_str, "%Y-%m-%dT%H:%M:%SZ")
-        except ValueError:
-            continue
 
-        parsed_by_sender[sender].append((received_dt, {
-            "company": normalize_company(sender, subject),
-            "job_title": extract_job_title(subject),
-            "date_applied": received_dt.strftime("%Y-%m-%d"),
-            "subject": subject,
-            "email": sender,
-            "thread_id": subject.lower().strip(),
-            "preview": preview,
-        }))
-
-    # Keep only the latest email from each sender
-    latest_per_sender = [
-        sorted(emails, key=lambda x: x[0], reverse=True)[0][1]  # take newest
-        for emails in parsed_by_sender.values()
-    ]
-
-    return latest_per_sender
\ No newline at end of file
+def parse_emails(messages: list) -> list:
+    # Keep only the latest email of each thread; the store links threads into applications
+    return parse_batch(messages, latest_per_thread=True)
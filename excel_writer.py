@@ -1,139 +1,188 @@
+import numpy as np
 import pandas as pd
 import os
-from openpyxl import load_workbook
+import tempfile
+from openpyxl import Workbook
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill
 from datetime import datetime
+from app_store import get_store
+from run_metrics import count, get_logger
 
-EXCEL_FILE = "job_applications.xlsx"
+log = get_logger(__name__)
 
-COLUMNS = [
-    "company",
-    "job_title",
-    "date_applied",
-    "response_type",
-    "subject",
-    "email",
-    "thread_id"
-]
+EXCEL_FILE = "job_applications.xlsx"
 
 def save_to_excel(records):
-    if os.path.exists(EXCEL_FILE):
-        df_existing = pd.read_excel(EXCEL_FILE)
+    """Upsert parsed records into the application store; the workbook is exported from it."""
+    store = get_store(EXCEL_FILE)
+    changed = store.upsert(records)
+    if changed:
+        log.info(f"✔️ Saved {changed} new/updated records to {store.path}")
     else:
-        df_existing = pd.DataFrame(columns=COLUMNS)
+        log.info("No new records to write.")
 
-    if "thread_id" not in df_existing.columns:
-        print("⚠️ Excel file missing 'thread_id' column. Recreating file.")
-        df_existing = pd.DataFrame(columns=COLUMNS)
 
-    new_records = []
-    existing_ids = set(df_existing["thread_id"].astype(str).str.lower())
+ROW_FILLS = {
+    "positive": PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),  # green
+    "negative": PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),  # red
+    "stale":    PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"),  # yellow
+    "waiting":  PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"),  # gray
+}
 
-    for r in records:
-        if r["thread_id"].lower() not in existing_ids:
-            new_records.append(r)
+STALE_AFTER_DAYS = 10
 
-    df_all = df_existing.copy()
 
-    if new_records:
-        df_new = pd.DataFrame(new_records)
-        df_all = pd.concat([df_existing, df_new], ignore_index=True)
-        df_all.to_excel(EXCEL_FILE, index=False)
-        print(f"✔️ Saved {len(new_records)} new records to {EXCEL_FILE}")
-    else:
-        print("No new records to write.")
+def row_flags(df, today=None) -> pd.DataFrame:
+    """Vectorized color tag and archive decision for every row, computed in one pass."""
+    today = today or datetime.utcnow()
+    resp = df["response_type"].astype(str).str.strip().str.lower()
+    dates = pd.to_datetime(df["date_applied"], errors="coerce")
+    overdue = (pd.Timestamp(today) - dates).dt.days.gt(STALE_AFTER_DAYS)  # NaT compares False
 
-    # ✅ Always apply coloring to the current file
+    no_reply = resp.str.contains("no", regex=False)
+    tag = np.select(
+        [resp.isin(["accepted", "interview"]), resp.eq("rejected"), no_reply & overdue, no_reply],
+        ["positive", "negative", "stale", "waiting"],
+        default="unknown",
+    )
+    archive = (
+        resp.str.contains("rejected", regex=False)
+        | resp.str.contains("applied", regex=False)
+        | (no_reply & overdue)
+    )
+    return pd.DataFrame({"tag": tag, "archive": archive.to_numpy()}, index=df.index)
 
 
 def apply_row_colors(df, ws):
-    from openpyxl.styles import PatternFill
-    from datetime import datetime
+    """Color rows with one conditional-formatting rule per tag instead of per-cell fills.
 
+    The rules mirror row_flags in Excel formulas, so "stale" keeps tracking
+    TODAY() after the file is written.
+    """
     if df.empty or "response_type" not in df.columns or "date_applied" not in df.columns:
-        print("⚠️ Missing required columns.")
+        log.warning("⚠️ Missing required columns.")
         return
+    add_color_rules(ws, list(df.columns), len(df))
 
+
+def add_color_rules(ws, columns, row_count):
+    # Works on write-only sheets too: rules are emitted after sheetData when the sheet closes
+    if not row_count:
+        return
+    resp_col = get_column_letter(columns.index("response_type") + 1)
+    date_col = get_column_letter(columns.index("date_applied") + 1)
+    resp = f'LOWER(TRIM(${resp_col}2))'
+    no_reply = f'ISNUMBER(SEARCH("no",${resp_col}2))'
+    overdue = f'AND(ISNUMBER(${date_col}2),TODAY()-${date_col}2>{STALE_AFTER_DAYS})'
+    cell_range = f"A2:{get_column_letter(len(columns))}{row_count + 1}"
+
+    rules = [
+        ("positive", f'OR({resp}="accepted",{resp}="interview")'),
+        ("negative", f'{resp}="rejected"'),
+        ("stale", f"AND({no_reply},{overdue})"),
+        ("waiting", no_reply),
+    ]
+    for tag, formula in rules:
+        ws.conditional_formatting.add(
+            cell_range, FormulaRule(formula=[formula], fill=ROW_FILLS[tag], stopIfTrue=True)
+        )
+
+
+def split_archived(df, flags=None):
+    """Return (active_df, archived_df) using the archive rules."""
+    if df.empty:
+        return df.copy(), df.copy()
+    if flags is None:
+        flags = row_flags(df)
+    df = df.copy()
     df["date_applied"] = pd.to_datetime(df["date_applied"], errors="coerce")
-    today = datetime.utcnow()
-
-    def tag(row):
-        resp = str(row["response_type"]).strip().lower()
-        if resp in {"accepted", "interview"}:
-            return "positive"
-        elif resp == "rejected":
-            return "negative"
-        elif "no" in resp:
-            if pd.isnull(row["date_applied"]):
-                return "waiting"
-            days = (today - row["date_applied"]).days
-            return "stale" if days > 10 else "waiting"
-        return "unknown"
-
-    tags = df.apply(tag, axis=1)
-
-    color_map = {
-        "positive": PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid"),  # green
-        "negative": PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid"),  # red
-        "stale":    PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid"),  # yellow
-        "waiting":  PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid"),  # gray
-    }
-
-    for i, tag_value in enumerate(tags, start=2):  # skip header row
-        fill = color_map.get(tag_value)
-        if fill:
-            for col in range(1, len(df.columns) + 1):
-                ws.cell(row=i, column=col).fill = fill
+    archived_mask = flags["archive"]
+    return df[~archived_mask].copy(), df[archived_mask].copy()
 
 
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill
-from datetime import datetime
+def _cell_value(value):
+    # openpyxl cannot serialize NaN/NaT; leave those cells empty
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return None
+    return value
 
-EXCEL_FILE = "job_applications.xlsx"
 
-def archive_old_no_response_entries():
+def write_workbook(df, flags=None, path=EXCEL_FILE) -> int:
+    """Stream active and Archived rows into a write-only workbook in a single pass.
 
-    df = pd.read_excel(EXCEL_FILE)
-    if "date_applied" not in df.columns or "response_type" not in df.columns:
-        print("⚠️ Required columns missing.")
-        return
+    Rows go straight to openpyxl's per-sheet temp files, so writer memory does
+    not grow with row count. The file is written via temp file + rename so a
+    crash never leaves a half-written tracker behind. Returns bytes written.
+    """
+    if flags is None:
+        flags = row_flags(df) if not df.empty else pd.DataFrame({"archive": []}, dtype=bool)
+    columns = list(df.columns)
+    archived_count = int(flags["archive"].sum())
 
-    df["date_applied"] = pd.to_datetime(df["date_applied"], errors="coerce")
-    today = datetime.utcnow()
-
-    def should_archive(row):
-        resp = str(row.get("response_type", "")).strip().lower()
-        if "rejected" in resp:
-            return True
-        if "applied" in resp:
-            return True
-        if "no" in resp and not pd.isnull(row.get("date_applied")):
-            return (today - row["date_applied"]).days > 10
-        return False
-
-    archived_df = df[df.apply(should_archive, axis=1)]
-    active_df = df[~df.apply(should_archive, axis=1)]
-
-    # Save active to Excel
-    active_df.to_excel(EXCEL_FILE, index=False)
-
-    # Load workbook again
-    wb = load_workbook(EXCEL_FILE)
-    ws_main = wb.active
-    apply_row_colors(active_df, ws_main)
-
-    # Write Archived Sheet
-    if "Archived" in wb.sheetnames:
-        del wb["Archived"]
+    wb = Workbook(write_only=True)
+    ws_main = wb.create_sheet("Sheet1")
     ws_archived = wb.create_sheet("Archived")
+    if "response_type" in columns and "date_applied" in columns:
+        # Conditional formats only need the final row counts, which the flags already give us
+        add_color_rules(ws_main, columns, len(df) - archived_count)
+        add_color_rules(ws_archived, columns, archived_count)
+    ws_main.append(columns)
+    ws_archived.append(columns)
+
+    dates = pd.to_datetime(df["date_applied"], errors="coerce") if "date_applied" in columns else None
+    date_pos = columns.index("date_applied") if dates is not None else -1
+    for values, date, archived in zip(
+        df.itertuples(index=False, name=None),
+        dates if dates is not None else [None] * len(df),
+        flags["archive"].to_numpy(),
+    ):
+        row = [_cell_value(v) for v in values]
+        if date_pos >= 0:
+            row[date_pos] = _cell_value(date)
+        (ws_archived if archived else ws_main).append(row)
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+    os.close(fd)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    count("workbook.rows_written", len(df))
+    count("workbook.bytes_written", os.path.getsize(path))
+    return os.path.getsize(path)
+
+
+def write_table(df, path: str) -> int:
+    """Write every row as .csv or .parquet (pyarrow or fastparquet) for downstream tools. Returns bytes written."""
+    df = df.assign(archived=row_flags(df)["archive"].to_numpy()) if not df.empty else df
+    tmp_path = f"{path}.tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    count("table.rows_written", len(df))
+    return os.path.getsize(path)
 
-    for row in dataframe_to_rows(archived_df, index=False, header=True):
-        ws_archived.append(row)
 
-    apply_row_colors(archived_df, ws_archived)
+def archive_old_no_response_entries(force=False):
+    """Export the store to the workbook (active + Archived sheets) when anything changed."""
+    store = get_store(EXCEL_FILE)
+    if not force and not store.export_needed(EXCEL_FILE):
+        log.info(f"📂 {EXCEL_FILE} is up to date, skipping export.")
+        return
+
+    df = store.to_dataframe()
+    if "date_applied" not in df.columns or "response_type" not in df.columns:
+        log.warning("⚠️ Required columns missing.")
+        return
 
-    wb.save(EXCEL_FILE)
-    print(f"📂 Archived {len(archived_df)} entries → 'Archived' sheet with colored rows.")
+    flags = row_flags(df)
+    write_workbook(df, flags, EXCEL_FILE)
+    store.mark_exported()
+    log.info(f"📂 Archived {int(flags['archive'].sum())} entries → 'Archived' sheet with colored rows.")
@@ -0,0 +1,161 @@
+import os
+import re
+import time
+from html import unescape
+from html.parser import HTMLParser
+
+from graph_fetcher import GRAPH_BASE_URL, get_scheduler
+from graph_scheduler import MAX_RETRIES, THROTTLE_STATUSES, UNAVAILABLE_STATUSES, backoff_seconds, mailbox_of
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+BATCH_SIZE = 20  # Graph's hard limit per $batch request
+ENRICH_FIELDS = "body,conversationId,internetMessageHeaders"
+BODY_CHARS = int(os.environ.get("GRAPH_ENRICH_BODY_CHARS", "4000"))  # text kept per message
+
+
+def enrichment_enabled() -> bool:
+    return os.environ.get("GRAPH_ENRICH", "false").lower() == "true"
+
+
+class _TextExtractor(HTMLParser):
+    BLOCK_TAGS = {"br", "p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol"}
+    CELL_TAGS = {"td", "th"}
+    SKIP_TAGS = {"script", "style", "head", "title"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skipping += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in self.CELL_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]+")
+_BLANK_LINES = re.compile(r"\s*\n\s*")
+
+
+def html_to_text(html: str) -> str:
+    """Plain text of an HTML mail body: tags, scripts and styles dropped, whitespace collapsed."""
+    extractor = _TextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+        text = "".join(extractor.parts)
+    except Exception:
+        text = unescape(re.sub(r"<[^>]+>", " ", html))  # malformed markup: strip tags bluntly
+    return _BLANK_LINES.sub("\n", _SPACES.sub(" ", text)).strip()
+
+
+def body_text(body: dict) -> str:
+    content = (body or {}).get("content") or ""
+    if (body or {}).get("contentType", "").lower() == "html":
+        content = html_to_text(content)
+    return content[:BODY_CHARS]
+
+
+class BatchEnricher:
+    """Adds full bodies and metadata to messages through Graph JSON batching.
+
+    Up to 20 GETs travel in one POST to /$batch. Each message gains
+    `body_text` (HTML converted to text), `conversationId` and
+    `internetMessageHeaders`. Sub-requests that come back throttled are
+    resent in a later batch; messages that still fail keep just their
+    bodyPreview.
+    """
+
+    def __init__(self, access_token: str, mailbox: str, scheduler=None, max_retries: int = MAX_RETRIES):
+        self.mailbox = mailbox
+        self.headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+        self.scheduler = scheduler or get_scheduler()
+        self.max_retries = max_retries
+        self.bucket = mailbox_of(f"/{mailbox}/")
+        self.requested = 0
+        self.enriched = 0
+        self.failed = 0
+        self.batches = 0
+
+    def item_url(self, message_id: str) -> str:
+        return f"/{self.mailbox}/messages/{message_id}?$select={ENRICH_FIELDS}"
+
+    def enrich(self, messages: list) -> list:
+        """Enrich `messages` in place (only those with an id); returns the same list."""
+        todo = [msg for msg in messages if msg.get("id")]
+        self.requested += len(todo)
+        for attempt in range(self.max_retries + 1):
+            if not todo:
+                break
+            retry, wait = [], 0.0
+            for i in range(0, len(todo), BATCH_SIZE):
+                chunk_retry, chunk_wait = self._send(todo[i:i + BATCH_SIZE])
+                retry.extend(chunk_retry)
+                wait = max(wait, chunk_wait)
+            todo = retry
+            if todo and attempt < self.max_retries:
+                time.sleep(wait or backoff_seconds(attempt))
+        self.failed += len(todo)
+        return messages
+
+    def _send(self, chunk: list):
+        """POST one batch; returns (messages to retry, longest Retry-After among them)."""
+        payload = {
+            "requests": [
+                {"id": str(i), "method": "GET", "url": self.item_url(msg["id"])}
+                for i, msg in enumerate(chunk)
+            ]
+        }
+        response = self.scheduler.request(
+            "POST", f"{GRAPH_BASE_URL}/$batch", mailbox=self.bucket, json=payload, headers=self.headers
+        )
+        self.batches += 1
+        if response.status_code != 200:
+            log.warning("⚠️ Graph $batch failed: %s %s", response.status_code, response.text[:200])
+            self.failed += len(chunk)
+            return [], 0.0
+
+        retry, wait = [], 0.0
+        for item in response.json().get("responses", []):
+            msg = chunk[int(item["id"])]
+            status = item.get("status")
+            if status == 200:
+                body = item.get("body") or {}
+                msg["body_text"] = body_text(body.get("body"))
+                msg["conversationId"] = body.get("conversationId", "")
+                msg["internetMessageHeaders"] = body.get("internetMessageHeaders", [])
+                self.enriched += 1
+            elif status in THROTTLE_STATUSES or status in UNAVAILABLE_STATUSES:
+                retry.append(msg)
+                headers = {k.lower(): v for k, v in (item.get("headers") or {}).items()}
+                try:
+                    wait = max(wait, float(headers.get("retry-after", 0)))
+                except ValueError:
+                    pass
+            else:
+                self.failed += 1
+        return retry, wait
+
+    def report(self):
+        if not self.batches:
+            return
+        saved = self.requested - self.batches
+        log.info(
+            f"📦 Enriched {self.enriched} emails in {self.batches} $batch requests "
+            f"({saved} round trips saved vs one GET per email, {self.failed} kept bodyPreview only)"
+        )
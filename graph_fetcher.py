@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from graph_scheduler import MAX_CONCURRENCY, GraphRequestError, GraphScheduler
+from run_journal import Page
+from run_metrics import count, get_logger
+
+log = get_logger(__name__)
+
+GRAPH_BASE_URL = os.environ.get("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+PAGE_SIZE = int(os.environ.get("GRAPH_PAGE_SIZE", "250"))  # Graph allows up to 1000 per page
+MAX_WORKERS = int(os.environ.get("GRAPH_FETCH_WORKERS", "4"))
+SHARD_DAYS = int(os.environ.get("GRAPH_SHARD_DAYS", "7"))
+QUEUE_PAGES = int(os.environ.get("GRAPH_QUEUE_PAGES", "4"))  # downloaded pages allowed to wait for the consumer
+SELECT_FIELDS = "id,subject,bodyPreview,receivedDateTime,from,conversationId"
+
+GRAPH_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+_session = None
+_scheduler = None
+
+
+def get_session() -> requests.Session:
+    """Return the shared keep-alive session used for every Graph call."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(MAX_WORKERS, MAX_CONCURRENCY, 1))
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def get_scheduler() -> GraphScheduler:
+    """Return the shared scheduler (concurrency limits, throttling, retries) for Graph calls."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = GraphScheduler(get_session())
+    return _scheduler
+
+
+def mailbox_path(user_email: str, is_ci: bool) -> str:
+    # App-only auth (client credentials) has no /me, so target the user explicitly
+    return f"users/{user_email}" if is_ci else "me"
+
+
+def parse_graph_time(value: str) -> datetime:
+    return datetime.strptime(value, GRAPH_TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def shard_window(since: str, until: datetime = None, shard_days: int = SHARD_DAYS) -> list:
+    """Split [since, until) into (start, end) string pairs, newest shard first."""
+    start = parse_graph_time(since)
+    until = until or datetime.now(timezone.utc)
+    step = max(shard_days, 1) * 86400
+
+    bounds = []
+    lo = start.timestamp()
+    hi = until.timestamp()
+    while lo < hi:
+        bounds.append((lo, min(lo + step, hi)))
+        lo += step
+
+    shards = [
+        (
+            datetime.fromtimestamp(a, timezone.utc).strftime(GRAPH_TIME_FORMAT),
+            datetime.fromtimestamp(b, timezone.utc).strftime(GRAPH_TIME_FORMAT),
+        )
+        for a, b in bounds
+    ]
+    shards.reverse()
+    if shards:
+        # Leave the newest shard open-ended so mail arriving mid-fetch is not lost
+        shards[0] = (shards[0][0], None)
+    else:
+        shards = [(since, None)]
+    return shards
+
+
+def build_messages_url(mailbox: str, start: str, end: str = None, page_size: int = PAGE_SIZE,
+                       folder: str = "inbox", search: str = None) -> str:
+    if search:
+        # $search cannot be combined with $filter/$orderby, so the window goes into the KQL
+        return (
+            f"{GRAPH_BASE_URL}/{mailbox}/mailFolders/{folder}/messages"
+            f'?$search="{search}"&$top={page_size}&$select={SELECT_FIELDS}'
+        )
+
+    flt = f"receivedDateTime ge {start}"
+    if end:
+        flt += f" and receivedDateTime lt {end}"
+    return (
+        f"{GRAPH_BASE_URL}/{mailbox}/mailFolders/{folder}/messages"
+        f"?$filter={flt}&$orderby=receivedDateTime desc&$top={page_size}"
+        f"&$select={SELECT_FIELDS}"
+    )
+
+
+def iter_pages(url: str, headers: dict, scheduler: GraphScheduler = None, stream: str = None):
+    """Yield one Page of messages per page, following @odata.nextLink until exhausted.
+
+    `stream` names the paging chain (defaults to the first URL) so a resumed
+    chain keeps the key it was journaled under. Throttling and transient
+    errors are retried by the scheduler; anything else raises
+    GraphRequestError rather than returning a partial mailbox.
+    """
+    scheduler = scheduler or get_scheduler()
+    stream = stream or url
+    while url:
+        response = scheduler.get(url, headers=headers)
+        log.info("Fetching: %s", url)
+        if response.status_code != 200:
+            log.error("❌ Failed to fetch emails: %s %s", response.status_code, response.text)
+            raise GraphRequestError(f"{response.status_code} {response.text}", response)
+
+        data = response.json()
+        count("graph.pages")
+        next_url = data.get("@odata.nextLink")  # next page if exists
+        yield Page(data.get("value", []), stream, url, next_url)
+        url = next_url
+
+
+def fetch_pages(url: str, headers: dict, scheduler: GraphScheduler = None) -> list:
+    """Follow @odata.nextLink from url until exhausted and return all messages."""
+    return [msg for page in iter_pages(url, headers, scheduler) for msg in page]
+
+
+def shard_urls(mailbox: str, since: str, page_size: int = PAGE_SIZE, shard_days: int = SHARD_DAYS,
+               search_query=None) -> list:
+    return [
+        build_messages_url(mailbox, start, end, page_size, search=search_query(start, end) if search_query else None)
+        for start, end in shard_window(since, shard_days=shard_days)
+    ]
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # Poll so a worker blocked on a full queue notices when the consumer has gone away
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def stream_pages(access_token: str, mailbox: str, since: str, page_size: int = PAGE_SIZE,
+                 max_workers: int = MAX_WORKERS, shard_days: int = SHARD_DAYS, search_query=None,
+                 queue_pages: int = QUEUE_PAGES, resume: dict = None):
+    """Yield pages newest first as shard workers download them, without collecting the whole mailbox.
+
+    Shards are downloaded concurrently but yielded in shard order, each newest
+    page first, so the stream keeps the old merged order. Each shard buffers at
+    most `queue_pages` downloaded pages; its worker blocks until the consumer
+    reaches it. Messages repeated across shards are dropped.
+    `resume` maps shard URLs to the page to restart from (None: shard finished),
+    as returned by RunJournal.resume_urls.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    scheduler = get_scheduler()
+    urls = shard_urls(mailbox, since, page_size, shard_days, search_query)
+    if resume:
+        urls = [url for url in urls if resume.get(url, url) is not None]
+    if not urls:
+        return
+    buffers = {url: queue.Queue(maxsize=max(queue_pages, 1)) for url in urls}
+    stop = threading.Event()
+    done = object()
+
+    def worker(url):
+        try:
+            start = resume.get(url, url) if resume else url
+            for page in iter_pages(start, headers, scheduler, stream=url):
+                if not _put(buffers[url], page, stop):
+                    return
+        finally:
+            _put(buffers[url], done, stop)
+
+    seen = set()
+    # Shards start in submission order, so the shard being consumed is always running or done
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls))))
+    futures = [pool.submit(worker, url) for url in urls]
+    try:
+        for url, future in zip(urls, futures):
+            while True:
+                item = buffers[url].get()
+                if item is done:
+                    break
+                page = Page([], item.stream, item.url, item.next_url)
+                for msg in item:
+                    key = msg.get("id") or (msg.get("receivedDateTime"), msg.get("subject"))
+                    if key not in seen:
+                        seen.add(key)
+                        page.append(msg)
+                # Empty pages are still yielded so a journal can record the chain's progress
+                yield page
+            future.result()  # surface the shard's exception before moving on
+    finally:
+        stop.set()
+        pool.shutdown(wait=True)
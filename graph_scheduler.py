@@ -0,0 +1,211 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from run_metrics import count, get_logger, span
+
+log = get_logger(__name__)
+
+MAX_CONCURRENCY = int(os.environ.get("GRAPH_MAX_CONCURRENCY", "8"))  # all mailboxes together
+MAILBOX_CONCURRENCY = int(os.environ.get("GRAPH_MAILBOX_CONCURRENCY", "4"))  # Graph allows 4 per mailbox
+MAX_RETRIES = int(os.environ.get("GRAPH_MAX_RETRIES", "6"))
+BACKOFF_BASE = float(os.environ.get("GRAPH_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.environ.get("GRAPH_BACKOFF_MAX", "60"))
+
+THROTTLE_STATUSES = {429}  # the mailbox is over its budget
+UNAVAILABLE_STATUSES = {502, 503, 504}  # the service as a whole is struggling
+
+
+class GraphRequestError(Exception):
+    """A Graph request failed for good (non-retryable status or retries exhausted)."""
+
+    def __init__(self, message: str, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit.
+
+    Every success grows the limit by 1/limit (about one slot per round of
+    requests), a throttling response halves it and pauses new requests for
+    the Retry-After period. Cuts within one cooldown count once, so a burst
+    of 429s from requests already in flight does not collapse the limit to 1.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(max_limit, 1)
+        self.min_limit = max(min(min_limit, self.max_limit), 1)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a slot is free and no pause is active; returns seconds waited."""
+        start = time.monotonic()
+        with self.cond:
+            while True:
+                pause = self.resume_at - time.monotonic()
+                if pause > 0:
+                    self.cond.wait(pause)
+                elif self.in_flight < int(self.limit):
+                    break
+                else:
+                    self.cond.wait()
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def on_success(self):
+        with self.cond:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+    def on_throttle(self, pause: float):
+        with self.cond:
+            now = time.monotonic()
+            if now >= self.resume_at:
+                self.limit = max(self.min_limit, self.limit / 2)
+            self.resume_at = max(self.resume_at, now + pause)
+
+
+def retry_after_seconds(response) -> float:
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(float(value), 0.0) if value else 0.0
+    except ValueError:
+        return 0.0  # HTTP-date form; Graph sends seconds, so just back off normally
+
+
+def backoff_seconds(attempt: int) -> float:
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * (0.5 + random.random())
+
+
+def mailbox_of(url: str) -> str:
+    """Throttling bucket of a Graph URL: "me" or "users/<id>" (everything else shares one)."""
+    path = url.split("://", 1)[-1].split("?", 1)[0].split("/")
+    for i, part in enumerate(path):
+        if part == "me":
+            return "me"
+        if part == "users" and i + 1 < len(path):
+            return f"users/{path[i + 1].lower()}"
+    return ""
+
+
+class GraphScheduler:
+    """Shared gate for every Graph call.
+
+    Requests pass a global and a per-mailbox AdaptiveLimit. 429s shrink and
+    pause the mailbox's limit, 5xx the global one, both honouring Retry-After
+    or falling back to jittered exponential backoff. Counters and time spent
+    waiting are kept in `metrics`.
+    """
+
+    def __init__(self, session: requests.Session = None, max_concurrency: int = MAX_CONCURRENCY,
+                 mailbox_concurrency: int = MAILBOX_CONCURRENCY, max_retries: int = MAX_RETRIES,
+                 shared_slots=None):
+        self.session = session
+        self.shared_slots = shared_slots  # cross-process semaphore (multi_mailbox), held per request
+        self.max_retries = max_retries
+        self.mailbox_concurrency = mailbox_concurrency
+        self.global_limit = AdaptiveLimit(max_concurrency)
+        self.mailboxes = {}
+        self.lock = threading.Lock()
+        self.metrics = Counter()
+
+    def _mailbox_limit(self, mailbox: str) -> AdaptiveLimit:
+        with self.lock:
+            limit = self.mailboxes.get(mailbox)
+            if limit is None:
+                limit = self.mailboxes[mailbox] = AdaptiveLimit(self.mailbox_concurrency)
+            return limit
+
+    def _count(self, key: str, amount=1):
+        with self.lock:
+            self.metrics[key] += amount
+        count(f"graph.{key}", amount)
+
+    def request(self, method: str, url: str, mailbox: str = None, ok_statuses=(200,), **kwargs):
+        """Send one Graph request, retrying throttling, 5xx and connection errors.
+
+        Returns the response once its status is in `ok_statuses`, or
+        immediately for any other non-retryable status (callers decide what
+        e.g. a 410 means). Raises GraphRequestError when retries run out.
+        """
+        session = self.session or requests
+        mailbox_limit = self._mailbox_limit(mailbox_of(url) if mailbox is None else mailbox)
+
+        for attempt in range(self.max_retries + 1):
+            waited = mailbox_limit.acquire()
+            waited += self.global_limit.acquire()
+            if self.shared_slots is not None:
+                start = time.monotonic()
+                self.shared_slots.acquire()
+                waited += time.monotonic() - start
+            self._count("queue_wait_s", waited)
+            self._count("requests")
+            response = None
+            try:
+                with span("graph.request"):
+                    response = session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            else:
+                error = None
+            finally:
+                if self.shared_slots is not None:
+                    self.shared_slots.release()
+                self.global_limit.release()
+                mailbox_limit.release()
+
+            if response is not None:
+                status = response.status_code
+                if status in ok_statuses:
+                    mailbox_limit.on_success()
+                    self.global_limit.on_success()
+                    return response
+                if status not in THROTTLE_STATUSES and status not in UNAVAILABLE_STATUSES:
+                    return response
+                error = f"{status} {response.text[:200]}"
+
+            if attempt == self.max_retries:
+                self._count("failures")
+                raise GraphRequestError(f"Graph request failed after {attempt + 1} attempts: {error}", response)
+
+            delay = retry_after_seconds(response) or backoff_seconds(attempt)
+            if response is not None and response.status_code in THROTTLE_STATUSES:
+                self._count("throttled")
+                mailbox_limit.on_throttle(delay)
+            else:
+                self._count("unavailable")
+                self.global_limit.on_throttle(delay)
+            self._count("retries")
+            self._count("backoff_s", delay)
+            log.warning(f"⏳ Graph retry {attempt + 1}/{self.max_retries} in {delay:.1f}s: {error}")
+            # The limit's pause holds back every other request to this mailbox too
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def report(self):
+        m = self.metrics
+        if not m["retries"] and not m["failures"]:
+            return
+        limits = ", ".join(f"{name or 'other'}={limit.limit:.1f}" for name, limit in self.mailboxes.items())
+        log.info(
+            f"🚦 Graph: {m['requests']} requests, {m['retries']} retries "
+            f"({m['throttled']} throttled, {m['unavailable']} unavailable), {m['failures']} failed; "
+            f"waited {m['backoff_s']:.1f}s backing off + {m['queue_wait_s']:.1f}s queued; "
+            f"limits {limits}, global={self.global_limit.limit:.1f}"
+        )
+
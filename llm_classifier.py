@@ -1,21 +1,28 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, APIConnectionError, APIStatusError
 from openai.types.chat.chat_completion import ChatCompletion
+from classification_cache import LABELS, ClassificationCache
+from run_metrics import count, get_logger, span
+import asyncio
+import hashlib
+import json
+import os
+import random
 import time
 
+log = get_logger(__name__)
+
 client: OpenAI = None  # Global OpenAI client instance
+async_client: AsyncOpenAI = None  # Used by classify_many
+_shared_slots = None  # cross-process semaphore capping in-flight calls (multi_mailbox)
 
-# Load your key once
-def configure_openai(api_key: str):
-    global client
-    client = OpenAI(api_key=api_key)
+MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
 
-def classify_response(email_subject: str, email_preview: str) -> str:
-    prompt = f"""
+PROMPT_TEMPLATE = """
 You are an assistant helping someone track job applications.
 
 Given the following email:
-Subject: "{email_subject}"
-Preview: "{email_preview}"
+Subject: "{subject}"
+Preview: "{preview}"
 
 What type of response is this? Choose only one of:
 - Applied
@@ -28,16 +35,266 @@ What type of response is this? Choose only one of:
 Respond with only the label, nothing else.
 """
 
+PACKED_PROMPT_TEMPLATE = """
+You are an assistant helping someone track job applications.
+
+Classify each of the following {count} emails. For each one choose only one of:
+Applied, Rejected, Interview, Offer, No Reply Yet, Other
+
+{emails}
+
+Respond with only a JSON object of the form {{"labels": ["<label for 1>", "<label for 2>", ...]}}
+with exactly {count} labels in the same order.
+"""
+
+# Any edit to the prompts changes this, so cached labels from older prompts stop matching
+PROMPT_VERSION = hashlib.sha256((PROMPT_TEMPLATE + PACKED_PROMPT_TEMPLATE).encode("utf-8")).hexdigest()[:12]
+
+_cache: ClassificationCache = None
+
+def get_cache() -> ClassificationCache:
+    """Open the on-disk label cache once; CLASSIFICATION_CACHE="" disables it."""
+    global _cache
+    if _cache is None and os.environ.get("CLASSIFICATION_CACHE", "classification_cache.sqlite"):
+        _cache = ClassificationCache(MODEL, PROMPT_VERSION)
+    return _cache
+
+# Load your key once
+def configure_openai(api_key: str, base_url: str = None):
+    global client, async_client
+    # OPENAI_BASE_URL lets runs point at a local stand-in server instead of the real API
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    client = OpenAI(api_key=api_key, base_url=base_url)
+    async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+def share_call_slots(slots):
+    """Make every OpenAI call also hold one of `slots` (a multiprocessing semaphore)."""
+    global _shared_slots
+    _shared_slots = slots
+
+def build_prompt(email_subject: str, email_preview: str) -> str:
+    return PROMPT_TEMPLATE.format(subject=email_subject, preview=email_preview)
+
+def classify_response(email_subject: str, email_preview: str) -> str:
+    cache = get_cache()
+    if cache:
+        cached = cache.get(email_subject, email_preview)
+        if cached:
+            return normalize_label(cached)  # entries cached before labels were normalized
+
+    prompt = build_prompt(email_subject, email_preview)
+
     try:
-        response: ChatCompletion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=5,
-            temperature=0,
-        )
-        classification = response.choices[0].message.content.strip()
+        with span("openai.call"):
+            response: ChatCompletion = client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=5,
+                temperature=0,
+            )
+        count_usage(response)
+        # Raw text like "Interview." must never reach the cache or the store
+        classification = normalize_label(response.choices[0].message.content)
+        if cache:
+            cache.put(email_subject, email_preview, classification)
         return classification
     except Exception as e:
-        print("OpenAI API error:", e)
+        log.error("OpenAI API error: %s", e)
         time.sleep(2)
         return "Error"
+
+
+def normalize_label(text: str) -> str:
+    cleaned = str(text).strip().strip('."\'').lower()
+    for label in LABELS:
+        if cleaned == label.lower():
+            return label
+    return "Other" if cleaned else "Error"
+
+
+class RateLimiter:
+    """Sliding one-minute budget for requests and (estimated) tokens per minute."""
+
+    def __init__(self, requests_per_minute: int = 500, tokens_per_minute: int = 90000):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.window = []  # (timestamp, tokens) for calls in the last 60s
+        self.lock = asyncio.Lock()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float):
+        # A Retry-After from the server applies to every in-flight worker, not just the caller
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: int):
+        while True:
+            async with self.lock:
+                now = time.monotonic()
+                self.window = [(t, n) for t, n in self.window if now - t < 60]
+                used_tokens = sum(n for _, n in self.window)
+                wait = self.paused_until - now
+                if wait <= 0 and len(self.window) < self.rpm and (not self.window or used_tokens + tokens <= self.tpm):
+                    self.window.append((now, tokens))
+                    return
+                if wait <= 0:
+                    # Wait for the oldest call to leave the window
+                    wait = 60 - (now - self.window[0][0]) if self.window else 0.05
+            await asyncio.sleep(max(wait, 0.05))
+
+
+def count_usage(response: ChatCompletion):
+    count("openai.calls")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        count("openai.prompt_tokens", usage.prompt_tokens or 0)
+        count("openai.completion_tokens", usage.completion_tokens or 0)
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    return len(prompt) // 4 + max_tokens
+
+
+def retry_after_seconds(error: Exception) -> float:
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+async def _create(prompt: str, max_tokens: int) -> ChatCompletion:
+    if _shared_slots is not None:
+        # Poll rather than block: a blocked thread per waiting call would starve the loop's executor
+        while not _shared_slots.acquire(block=False):
+            await asyncio.sleep(0.02)
+    try:
+        with span("openai.call"):
+            response = await async_client.chat.completions.create(
+                model=MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0,
+            )
+        count_usage(response)
+        return response
+    finally:
+        if _shared_slots is not None:
+            _shared_slots.release()
+
+
+async def _complete(prompt: str, max_tokens: int, limiter: RateLimiter, max_retries: int) -> str:
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(estimate_tokens(prompt, max_tokens))
+        try:
+            response = await _create(prompt, max_tokens)
+            return response.choices[0].message.content.strip()
+        except (APIStatusError, APIConnectionError) as e:
+            status = getattr(e, "status_code", None)
+            if status is not None and status != 429 and status < 500:
+                raise
+            if attempt == max_retries:
+                raise
+            count("openai.retries")
+            count("openai.throttled", status == 429)
+            delay = retry_after_seconds(e)
+            if delay:
+                limiter.pause(delay)
+            else:
+                delay = min(2 ** attempt, 30) * (0.5 + random.random())
+            log.warning(f"⏳ OpenAI retry {attempt + 1}/{max_retries} in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+async def _classify_one(record: dict, limiter: RateLimiter, max_retries: int) -> str:
+    try:
+        prompt = build_prompt(record.get("subject", ""), record.get("preview", ""))
+        return normalize_label(await _complete(prompt, 5, limiter, max_retries))
+    except Exception as e:
+        log.error("OpenAI API error: %s", e)
+        return "Error"
+
+
+async def _classify_packed(records: list, limiter: RateLimiter, max_retries: int) -> list:
+    emails = "\n".join(
+        f'{i}. Subject: "{r.get("subject", "")}"\n   Preview: "{r.get("preview", "")}"'
+        for i, r in enumerate(records, start=1)
+    )
+    prompt = PACKED_PROMPT_TEMPLATE.format(count=len(records), emails=emails)
+    try:
+        content = await _complete(prompt, 12 * len(records) + 20, limiter, max_retries)
+        labels = json.loads(content[content.index("{"):content.rindex("}") + 1])["labels"]
+        if len(labels) == len(records):
+            return [normalize_label(label) for label in labels]
+        log.warning(f"⚠️ Packed response had {len(labels)} labels for {len(records)} emails, retrying singly.")
+    except Exception as e:
+        log.warning("⚠️ Packed classification failed, retrying singly: %s", e)
+    return [await _classify_one(r, limiter, max_retries) for r in records]
+
+
+async def classify_many_async(records: list, concurrency: int = 8, requests_per_minute: int = 500,
+                              tokens_per_minute: int = 90000, pack_size: int = 1, max_retries: int = 5) -> list:
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    pack_size = max(pack_size, 1)
+    chunks = [records[i:i + pack_size] for i in range(0, len(records), pack_size)]
+
+    async def run(chunk):
+        async with semaphore:
+            if len(chunk) == 1:
+                return [await _classify_one(chunk[0], limiter, max_retries)]
+            return await _classify_packed(chunk, limiter, max_retries)
+
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+    return [label for chunk_labels in results for label in chunk_labels]
+
+
+def classify_many(records: list, concurrency: int = None, requests_per_minute: int = None,
+                  tokens_per_minute: int = None, pack_size: int = None, max_retries: int = 5) -> list:
+    """Classify records (dicts with subject/preview) concurrently; labels come back in input order."""
+    if not records:
+        return []
+
+    cache = get_cache()
+    labels = [None] * len(records)
+    if cache:
+        labels = [label and normalize_label(label)
+                  for label in cache.get_many([(r.get("subject", ""), r.get("preview", "")) for r in records])]
+    missing = [i for i, label in enumerate(labels) if label is None]
+    count("cache.hits", len(records) - len(missing))
+    count("cache.misses", len(missing))
+    if not missing:
+        log.info(f"🗃️ Classification cache: {len(records)} hits, 0 misses")
+        return labels
+
+    # Identical templated emails in the same batch only need one call
+    unique = {}
+    for i in missing:
+        key = cache.key(records[i].get("subject", ""), records[i].get("preview", "")) if cache else i
+        unique.setdefault(key, []).append(i)
+    leaders = [indexes[0] for indexes in unique.values()]
+
+    fresh = asyncio.run(classify_many_async(
+        [records[i] for i in leaders],
+        concurrency=concurrency or int(os.environ.get("OPENAI_CONCURRENCY", "8")),
+        requests_per_minute=requests_per_minute or int(os.environ.get("OPENAI_RPM", "500")),
+        tokens_per_minute=tokens_per_minute or int(os.environ.get("OPENAI_TPM", "90000")),
+        pack_size=pack_size or int(os.environ.get("OPENAI_PACK_SIZE", "1")),
+        max_retries=max_retries,
+    ))
+    for indexes, label in zip(unique.values(), fresh):
+        for i in indexes:
+            labels[i] = label
+
+    if cache:
+        cache.put_many([(records[i].get("subject", ""), records[i].get("preview", ""), labels[i]) for i in leaders])
+        log.info(f"🗃️ Classification cache: {len(records) - len(missing)} hits, {len(missing)} misses")
+    return labels
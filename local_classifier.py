@@ -0,0 +1,190 @@
+import os
+import random
+import re
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from classification_cache import LABELS, normalize_subject, normalize_text
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+DIM = int(os.environ.get("LOCAL_MODEL_DIM", "1024"))
+NEIGHBORS = int(os.environ.get("LOCAL_MODEL_NEIGHBORS", "5"))
+# Below this the email goes to the LLM; see predict() for what confidence means
+MIN_CONFIDENCE = float(os.environ.get("LOCAL_MODEL_MIN_CONFIDENCE", "0.6"))
+MIN_EXAMPLES = int(os.environ.get("LOCAL_MODEL_MIN_EXAMPLES", "20"))
+# Share of confident local labels still sent to the LLM, to measure agreement
+AUDIT_RATE = float(os.environ.get("LOCAL_MODEL_AUDIT_RATE", "0.05"))
+# The store only keeps this much of each preview, so training and prediction look at the same text
+PREVIEW_CHARS = int(os.environ.get("PIPELINE_PREVIEW_CHARS", "100"))
+
+_WORD = re.compile(r"\w+")
+_DIGITS = re.compile(r"\d+")
+
+_model = None
+
+
+def local_model_enabled() -> bool:
+    return os.environ.get("LOCAL_MODEL", "on").lower() != "off"
+
+
+def features(subject: str, preview: str) -> list:
+    """Word unigrams and bigrams, tagged by field, with numbers collapsed."""
+    feats = []
+    for field, text in (("s", normalize_subject(subject)), ("p", normalize_text(preview)[:PREVIEW_CHARS])):
+        words = _WORD.findall(_DIGITS.sub("0", text))
+        feats.extend(f"{field}:{w}" for w in words)
+        feats.extend(f"{field}:{a} {b}" for a, b in zip(words, words[1:]))
+    return feats
+
+
+def hash_features(feats: list, dim: int = DIM) -> np.ndarray:
+    """Signed feature hashing (stable across processes, unlike hash()) into a dense vector."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for feat in feats:
+        h = zlib.crc32(feat.encode("utf-8"))
+        vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    return vec
+
+
+class LocalClassifier:
+    """Nearest-neighbour classifier over hashed n-gram TF-IDF vectors of past labels.
+
+    Every labelled email is one row of a NumPy matrix; identical texts share
+    a row (the newest label wins). A prediction is the similarity-weighted
+    vote of the `neighbors` most cosine-similar rows. New labels are appended
+    with add(), so retraining is incremental: only IDF weights are recomputed.
+    """
+
+    def __init__(self, dim: int = DIM, neighbors: int = NEIGHBORS, min_confidence: float = MIN_CONFIDENCE,
+                 min_examples: int = MIN_EXAMPLES, audit_rate: float = AUDIT_RATE):
+        self.dim = dim
+        self.neighbors = neighbors
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.audit_rate = audit_rate
+        self.tf = np.zeros((64, dim), dtype=np.float32)
+        self.df = np.zeros(dim, dtype=np.float32)
+        self.labels = []
+        self.rows = {}  # normalized text -> row
+        self._columns = None  # L2-normalized TF-IDF rows, transposed; rebuilt after add()
+        self._idf = None
+        self.stats = Counter()
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add(self, items: list) -> int:
+        """Learn from (subject, preview, label) triples; returns how many new rows were added.
+
+        Anything but a real label (e.g. "Error" from a failed LLM call) is skipped.
+        """
+        added = 0
+        for subject, preview, label in items:
+            if label not in LABELS:
+                continue
+            key = (normalize_subject(subject), normalize_text(preview)[:PREVIEW_CHARS])
+            row = self.rows.get(key)
+            if row is not None:
+                self.labels[row] = label
+                continue
+            vec = hash_features(features(subject, preview), self.dim)
+            if len(self.labels) == len(self.tf):
+                self.tf = np.concatenate([self.tf, np.zeros_like(self.tf)])
+            self.rows[key] = len(self.labels)
+            self.tf[len(self.labels)] = vec
+            self.df += vec != 0
+            self.labels.append(label)
+            added += 1
+        if added:
+            self._columns = None
+        return added
+
+    def _weights(self):
+        if self._columns is None:
+            n = len(self.labels)
+            self._idf = np.log((1 + n) / (1 + self.df)) + 1
+            matrix = self.tf[:n] * self._idf
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+            # Stored feature-major: a query only touches the rows of its few non-zero features
+            self._columns = np.ascontiguousarray(matrix.T)
+        return self._columns, self._idf
+
+    def predict(self, records: list) -> list:
+        """(label, confidence) per record (dicts with subject/preview), label None without history.
+
+        Confidence is the summed cosine similarity of the neighbours that voted
+        for the winning label divided by the number of neighbours, so it is
+        only high when several close matches agree.
+        """
+        if len(self.labels) < self.min_examples or not records:
+            return [(None, 0.0)] * len(records)
+        columns, idf = self._weights()
+        k = min(self.neighbors, len(self.labels))
+        results = []
+        for record in records:
+            query = hash_features(features(record.get("subject", ""), record.get("preview", "")), self.dim) * idf
+            nonzero = np.flatnonzero(query)
+            if not len(nonzero):
+                results.append((None, 0.0))
+                continue
+            weights = query[nonzero] / np.linalg.norm(query[nonzero])
+            sims = weights @ columns[nonzero]
+            votes = Counter()
+            for i in np.argpartition(-sims, k - 1)[:k]:
+                votes[self.labels[i]] += max(float(sims[i]), 0.0)
+            label, score = votes.most_common(1)[0]
+            results.append((label, score / k))
+        return results
+
+    def confident(self, confidence: float) -> bool:
+        return confidence >= self.min_confidence
+
+    def audit(self) -> bool:
+        """Whether to send a confident local label to the LLM anyway, as a spot check."""
+        return random.random() < self.audit_rate
+
+    def learn(self, records: list, llm_labels: list, guesses: list):
+        """Fold fresh LLM labels in, scoring the model's guesses for the same emails."""
+        for (guess, confidence), label in zip(guesses, llm_labels):
+            if guess is None or label not in LABELS:
+                continue
+            kind = "audited" if self.confident(confidence) else "unsure"
+            self.stats[kind] += 1
+            self.stats[f"{kind}_agreed"] += guess == label
+        self.add([(r.get("subject", ""), r.get("preview", ""), label) for r, label in zip(records, llm_labels)])
+
+    def report(self):
+        s = self.stats
+        decided = s["local"] + s["llm"]
+        if not decided:
+            return
+        log.info(f"🧠 Local model: {s['local']}/{decided} escalated emails labelled offline "
+                 f"({s['local'] / decided:.0%} of LLM calls avoided), {len(self)} examples")
+        if s["audited"]:
+            log.info(f"🧠 Agreement with the LLM: {s['audited_agreed'] / s['audited']:.0%} on {s['audited']} "
+                     f"audited confident labels")
+        if s["unsure"]:
+            log.info(f"🧠 Low-confidence guesses matched the LLM {s['unsure_agreed'] / s['unsure']:.0%} "
+                     f"of the time ({s['unsure']} emails)")
+
+
+def get_local_model():
+    """The local model trained on the store's labels, built on first use; None when LOCAL_MODEL=off.
+
+    Rows the model labelled itself are left out, so it never learns from its own guesses.
+    """
+    global _model
+    if _model is None and local_model_enabled():
+        from app_store import get_store
+
+        start = time.perf_counter()
+        _model = LocalClassifier()
+        _model.add(get_store().labelled_examples(LABELS, exclude_sources=("local",)))
+        log.info(f"🧠 Local model trained on {len(_model)} labelled emails in "
+                 f"{(time.perf_counter() - start) * 1000:.0f} ms")
+    return _model
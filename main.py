@@ -1,70 +1,52 @@
 import json
 import os
 import sys
-import pandas as pd
-import requests
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from llm_classifier import configure_openai, classify_response
-from email_parser import parse_emails
-from excel_writer import  archive_old_no_response_entries, save_to_excel
-from report_generator import generate_summary_report
-from auth import authenticate_graph, load_config
+
+from run_metrics import count, get_logger, get_metrics, profiled, span, write_reports
+
+log = get_logger("main")
+
+# Heavy dependencies (pandas, openai, msal, requests, openpyxl) are imported
+# inside the functions that use them, so `cli.py status` starts instantly.
 
 load_dotenv()
 
-def fetch_job_emails(access_token, user_email, is_ci):
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
+SYNC_MODE = os.environ.get("SYNC_MODE", "delta")  # "delta" or "date"
 
+def stream_job_emails(access_token, user_email, is_ci, since=None, resume=None):
+    """Yield fetched pages of messages as they arrive.
+
+    `resume` holds an interrupted run's paging cursors (RunJournal.resume_urls).
+    """
     #since = (datetime.now(timezone.utc) - timedelta(days=12)).strftime("%Y-%m-%dT%H:%M:%SZ")
-    since = get_last_run()
-    print("📅 Fetching emails since:", since)
-
-    if is_ci:
-        # App-only auth (client credentials)
-        url = (
-            f"https://graph.microsoft.com/v1.0/users/{user_email}/mailFolders/inbox/messages"
-            f"?$filter=receivedDateTime ge {since}&$top=50"
-            "&$select=subject,bodyPreview,receivedDateTime,from"
-        )
-    else:
-        # Delegated auth (device code flow)
-        url = (
-            f"https://graph.microsoft.com/v1.0/me/mailFolders/inbox/messages"
-            f"?$filter=receivedDateTime ge {since}&$top=50"
-            "&$select=subject,bodyPreview,receivedDateTime,from"
-        )
-    all_emails = []
-    while url:
-        response = requests.get(url, headers=headers)
-        print("Fetching:", url)
-        if response.status_code != 200:
-            print("❌ Failed to fetch emails:", response.status_code, response.text)
-            break
-
-        data = response.json()
-        all_emails.extend(data.get("value", []))
-        url = data.get("@odata.nextLink")  # next page if exists
-
-    return all_emails
-    
-
-    # response = requests.get(url, headers=headers)
-    # print("Fetching from URL:", url)
-    # print("Response:", response.status_code, response.text)
-    # if response.status_code != 200:
-    #     print("❌ Failed to fetch emails:", response.status_code, response.text)
-    #     return []
-
-    # return response.json().get("value", [])
+    from graph_fetcher import mailbox_path, stream_pages
+    from delta_sync import stream_sync_pages
+    from prefilter import build_search_query, server_search_enabled
+
+    since = since or get_last_run()
+    mailbox = mailbox_path(user_email, is_ci)
+
+    if SYNC_MODE == "delta":
+        # Only pulls what changed since the stored deltaLink; `since` is the fallback
+        log.info("🔄 Delta sync (fallback watermark: %s)", since)
+        return stream_sync_pages(access_token, mailbox, since, resume=resume)
+
+    log.info("📅 Fetching emails since: %s", since)
+    # Time-sharded, concurrent paging over one pooled session (see graph_fetcher)
+    search_query = build_search_query if server_search_enabled() else None
+    return stream_pages(access_token, mailbox, since, search_query=search_query, resume=resume)
+
+
 LAST_RUN_FILE = "last_run.json"
 def get_last_processed_date(excel_file="job_applications.xlsx") -> str:
     """Get the most recent date_applied from Excel, or fallback to 12 days ago."""
     if not os.path.exists(excel_file):
         return (datetime.now(timezone.utc) - timedelta(days=200)).strftime("%Y-%m-%dT00:00:00Z")
 
+    import pandas as pd
+
     df = pd.read_excel(excel_file)
     if "date_applied" not in df.columns or df.empty:
         return (datetime.now(timezone.utc) - timedelta(days=200)).strftime("%Y-%m-%dT00:00:00Z")
@@ -84,13 +66,13 @@ def get_last_run() -> str:
                 if last_run:
                     return last_run
         except Exception as e:
-            print("⚠️ Failed to read last_run.json:", e)
+            log.warning("⚠️ Failed to read last_run.json: %s", e)
 
     # Fallback to Excel
     try:
         return get_last_processed_date()
     except Exception as e:
-        print("⚠️ Failed to read from Excel:", e)
+        log.warning("⚠️ Failed to read from Excel: %s", e)
 
     # Final fallback
     return (datetime.now(timezone.utc) - timedelta(days=12)).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -100,7 +82,58 @@ def save_last_run(date_str):
     with open(LAST_RUN_FILE, "w") as f:
         json.dump({"last_run": date_str}, f)
 
-if __name__ == "__main__":
+def process_mailbox(access_token, user_email, is_ci) -> dict:
+    """Run fetch → classify → store → export → report for one mailbox in the current directory."""
+    from delta_sync import commit_delta_links, hold_delta_link
+    from graph_batch import BatchEnricher, enrichment_enabled
+    from graph_fetcher import get_scheduler, mailbox_path
+    from pipeline import TrackerContext
+    from run_journal import RunJournal
+    from stream_pipeline import run_pipeline
+
+    # A run that died midway left its progress here; pick it up instead of starting over
+    journal = RunJournal()
+    since = journal.start(get_last_run())
+    for key, link in journal.delta_links().items():
+        hold_delta_link(key, link)
+
+    # fetch → prefilter → parse → classify → persist, overlapping downloads with classification
+    pages = stream_job_emails(access_token, user_email, is_ci, since, journal.resume_urls())
+    # Optional: full bodies via Graph $batch for emails that pass the prefilter
+    enricher = BatchEnricher(access_token, mailbox_path(user_email, is_ci)) if enrichment_enabled() else None
+    get_metrics().labels["mailbox"] = user_email
+    try:
+        with profiled(), span("run.pipeline"):
+            ctx = TrackerContext()
+            committed = run_pipeline(pages, ctx, journal=journal, enricher=enricher)
+    except Exception:
+        count("run.failed")
+        raise
+    finally:
+        get_scheduler().report()  # retries/throttling, also when the run fails
+        write_reports()  # run_metrics.json / .prom, so a failed CI run still shows where time went
+
+    if committed or journal.resumed:
+        save_last_run(datetime.utcnow().strftime("%Y-%m-%dT00:00:00Z"))
+
+    else:
+        log.info("No job-related emails found.")
+
+    commit_delta_links()
+    journal.complete()
+    return {
+        "mailbox": user_email,
+        "fetched": ctx.fetched,
+        "committed": committed,
+        "graph_requests": get_scheduler().metrics["requests"],
+    }
+
+
+def run_sync() -> int:
+    """The full run: authenticate, then process USER_EMAIL, or every mailbox in MAILBOXES."""
+    from auth import authenticate_app, authenticate_graph, load_config
+    from llm_classifier import configure_openai
+
     openai_key = os.environ["OPENAI_API_KEY"]
     configure_openai(openai_key)
 
@@ -108,29 +141,28 @@ if __name__ == "__main__":
     config = load_config()
     is_ci = os.environ.get("CI") == "true"
 
-    print("Loaded config keys:", config.keys())
+    log.info("Loaded config keys: %s", config.keys())
+    if config["mailboxes"]:
+        from multi_mailbox import process_mailboxes
+
+        # Cohort mode: app-only token shared by one worker process per mailbox
+        if not config.get("client_secret"):
+            log.error("❌ CLIENT_SECRET is required to process MAILBOXES (app-only auth).")
+            return 1
+        results = process_mailboxes(config["mailboxes"], authenticate_app(config))
+        return 1 if any("error" in r for r in results) else 0
+
     if is_ci and not config.get("client_secret"):
-        print("❌ CLIENT_SECRET is missing in CI environment.")
-        sys.exit(1)
+        log.error("❌ CLIENT_SECRET is missing in CI environment.")
+        return 1
 
-    access_token = authenticate_graph(config)
+    with span("auth"):
+        access_token = authenticate_graph(config)
     #print("🔑 Partial access token:", access_token, "")  # Do NOT log full token
 
-    emails = fetch_job_emails(access_token, config["user_email"], is_ci)
-    print(f"Fetched {len(emails)} emails.")
-
-    parsed = []
-    for email in emails:
-        metadata = parse_emails([email])[0]
-        metadata["response_type"] = classify_response(metadata["subject"], email.get("bodyPreview", ""))
-        parsed.append(metadata)
-        print(metadata)
+    process_mailbox(access_token, config["user_email"], is_ci)
+    return 0
 
-    if parsed:
-        save_to_excel(parsed)
-        archive_old_no_response_entries()
-        generate_summary_report()
-        save_last_run(datetime.utcnow().strftime("%Y-%m-%dT00:00:00Z"))
 
-    else:
-        print("No job-related emails found.")
+if __name__ == "__main__":
+    sys.exit(run_sync())
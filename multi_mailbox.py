@@ -0,0 +1,90 @@
+import contextlib
+import multiprocessing
+import os
+import re
+import time
+
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+MAILBOX_ROOT = os.environ.get("MAILBOX_ROOT", "mailboxes")
+MAILBOX_WORKERS = int(os.environ.get("MAILBOX_WORKERS", "4"))
+# Caps shared by all worker processes together
+GLOBAL_GRAPH_CONCURRENCY = int(os.environ.get("GLOBAL_GRAPH_CONCURRENCY", "8"))
+GLOBAL_LLM_CONCURRENCY = int(os.environ.get("GLOBAL_LLM_CONCURRENCY", "8"))
+
+
+def mailbox_dir(user_email: str, root: str = MAILBOX_ROOT) -> str:
+    """Directory holding one mailbox's store, watermark, delta state, journal, workbook and reports."""
+    return os.path.join(root, re.sub(r"[^\w.@-]", "_", user_email.lower()))
+
+
+def _init_worker(graph_slots, llm_slots):
+    from dotenv import load_dotenv
+
+    from graph_fetcher import get_scheduler
+    from llm_classifier import configure_openai, share_call_slots
+
+    load_dotenv()
+    configure_openai(os.environ["OPENAI_API_KEY"])
+    get_scheduler().shared_slots = graph_slots
+    share_call_slots(llm_slots)
+
+
+def _run_mailbox(user_email: str, access_token: str, root: str) -> dict:
+    """Process one mailbox inside its own directory; output goes to its run.log."""
+    path = os.path.abspath(mailbox_dir(user_email, root))
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)  # every state file and output is relative, so this partitions them
+    start = time.perf_counter()
+    with open("run.log", "w", encoding="utf-8") as run_log, contextlib.redirect_stdout(run_log):
+        try:
+            from main import process_mailbox
+
+            result = process_mailbox(access_token, user_email, is_ci=True)
+        except Exception as e:
+            log.error("❌ Mailbox failed: %s", repr(e))
+            result = {"mailbox": user_email, "error": repr(e)}
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def process_mailboxes(mailboxes: list, access_token: str, workers: int = MAILBOX_WORKERS,
+                      root: str = MAILBOX_ROOT) -> list:
+    """Process several mailboxes concurrently, one worker process per mailbox.
+
+    All workers use the same app-only token, and their Graph and OpenAI
+    calls share global semaphores. Each mailbox gets a separate store,
+    watermark and workbook under `root`. Returns per-mailbox results with
+    timing and prints a throughput summary.
+    """
+    # Spawn (the Windows default) everywhere, so workers never inherit sockets or SQLite handles
+    ctx = multiprocessing.get_context("spawn")
+    graph_slots = ctx.BoundedSemaphore(GLOBAL_GRAPH_CONCURRENCY)
+    llm_slots = ctx.BoundedSemaphore(GLOBAL_LLM_CONCURRENCY)
+    # One label cache for the cohort: ATS templates repeat across candidates
+    if os.environ.get("CLASSIFICATION_CACHE", "classification_cache.sqlite"):
+        os.environ["CLASSIFICATION_CACHE"] = os.path.abspath(
+            os.environ.get("CLASSIFICATION_CACHE", "classification_cache.sqlite"))
+    root = os.path.abspath(root)
+
+    log.info(f"👥 Processing {len(mailboxes)} mailboxes with {min(workers, len(mailboxes))} workers "
+             f"(global limits: {GLOBAL_GRAPH_CONCURRENCY} Graph / {GLOBAL_LLM_CONCURRENCY} LLM calls)")
+    start = time.perf_counter()
+    # maxtasksperchild=1: module-level singletons (store, caches, scheduler) never leak between mailboxes
+    with ctx.Pool(processes=max(1, min(workers, len(mailboxes))), initializer=_init_worker,
+                  initargs=(graph_slots, llm_slots), maxtasksperchild=1) as pool:
+        results = pool.starmap(_run_mailbox, [(mailbox, access_token, root) for mailbox in mailboxes])
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        if "error" in r:
+            log.error(f"  ❌ {r['mailbox']:<32} failed after {r['seconds']:.1f}s: {r['error']}")
+            continue
+        rate = r["fetched"] / r["seconds"] if r["seconds"] else 0
+        log.info(f"  📬 {r['mailbox']:<32} {r['fetched']:>6} fetched {r['committed']:>6} committed "
+                 f"{r['graph_requests']:>5} Graph calls {r['seconds']:6.1f}s ({rate:,.0f} emails/s)")
+    total = sum(r.get("fetched", 0) for r in results)
+    log.info(f"👥 {total} emails from {len(mailboxes)} mailboxes in {elapsed:.1f}s ({total / elapsed:,.0f} emails/s)")
+    return results
@@ -0,0 +1,107 @@
+import os
+import time
+
+import pandas as pd
+
+from app_store import STORE_COLUMNS, get_store
+from excel_writer import EXCEL_FILE, row_flags, split_archived, write_workbook
+from report_generator import generate_summary_report
+from run_metrics import get_logger, get_metrics
+
+log = get_logger(__name__)
+
+# What the old save → archive → report sequence did to the workbook on every run:
+# read+write in save_to_excel, read+write+load_workbook+save in archive, read in report.
+LEGACY_WORKBOOK_READS = 4
+LEGACY_WORKBOOK_WRITES = 3
+
+
+class TrackerContext:
+    """Loads the tracker once and carries the same DataFrame through every stage.
+
+    merge → archive split → coloring → workbook export → report all reuse
+    `self.df`; the workbook is written exactly once, atomically, at the end.
+    """
+
+    def __init__(self, excel_file: str = EXCEL_FILE):
+        self.excel_file = excel_file
+        self.timings = {}
+        self.fetched = 0  # emails the streaming pipeline pulled from Graph
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+        start = time.perf_counter()
+        self.store = get_store(excel_file)
+        self.df = self.store.to_dataframe()
+        self.bytes_read += os.path.getsize(self.store.path) if os.path.exists(self.store.path) else 0
+        self._timed("load", start)
+        self.changed = 0
+        self.unsorted = False  # merge appends; export restores date order once
+        self.flags = None
+
+    def _timed(self, stage: str, start: float):
+        # Streaming runs merge once per micro-batch, so accumulate
+        elapsed = time.perf_counter() - start
+        self.timings[stage] = self.timings.get(stage, 0) + elapsed
+        get_metrics().observe(f"pipeline.{stage}", elapsed)
+
+    def merge(self, records: list):
+        """Persist records to the store and fold the applications they touched into the frame."""
+        start = time.perf_counter()
+        self.changed = self.store.upsert(records)
+        if self.changed:
+            # The store resolved each email to its application (thread_id) and merged
+            # status, title and company; reload just those rows instead of redoing that here
+            touched = {r["thread_id"] for r in records}
+            fresh = pd.DataFrame(self.store.fetch(touched), columns=STORE_COLUMNS)
+            kept = self.df[~self.df["thread_id"].isin(touched)]
+            self.df = pd.concat([kept, fresh], ignore_index=True)
+            self.unsorted = True
+        self._timed("merge", start)
+        return self.changed
+
+    def export(self, force: bool = False):
+        """Split, color and write the workbook once; returns the active rows."""
+        start = time.perf_counter()
+        if self.unsorted:
+            self.df = self.df.sort_values(["date_applied", "thread_id"]).reset_index(drop=True)
+            self.unsorted = False
+        self.flags = row_flags(self.df) if not self.df.empty else None
+        active_df, archived_df = split_archived(self.df, self.flags)
+        self._timed("archive", start)
+
+        if force or self.store.export_needed(self.excel_file):
+            start = time.perf_counter()
+            self.bytes_written += write_workbook(self.df, self.flags, self.excel_file)
+            self.store.mark_exported()
+            self._timed("write", start)
+            log.info(f"📂 Archived {len(archived_df)} entries → 'Archived' sheet with colored rows.")
+        else:
+            log.info(f"📂 {self.excel_file} is up to date, skipping export.")
+        return active_df
+
+    def report(self, active_df):
+        start = time.perf_counter()
+        paths = generate_summary_report(active_df, store=self.store) or []
+        self.bytes_written += sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+        self._timed("report", start)
+
+    def run(self, records: list):
+        self.merge(records)
+        active_df = self.export()
+        self.report(active_df)
+        self.print_io_summary()
+
+    def print_io_summary(self):
+        stages = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+        log.info(f"⏱️ Pipeline: {stages}")
+        log.info(f"💾 I/O: read {self.bytes_read / 1024:.1f} KB, wrote {self.bytes_written / 1024:.1f} KB")
+
+        workbook_size = os.path.getsize(self.excel_file) if os.path.exists(self.excel_file) else 0
+        if workbook_size and "write" in self.timings:
+            # Counts and sizes only: the time those reads and writes would have taken is not measured
+            avoided_reads = LEGACY_WORKBOOK_READS
+            avoided_writes = LEGACY_WORKBOOK_WRITES - 1
+            avoided_bytes = workbook_size * (avoided_reads + avoided_writes)
+            log.info(f"💾 Avoided {avoided_reads} workbook reads + {avoided_writes} writes "
+                     f"of the {workbook_size / 1024:.1f} KB workbook ({avoided_bytes / 1024:.1f} KB)")
@@ -0,0 +1,144 @@
+import os
+import re
+from collections import Counter
+
+from email_parser import KNOWN_PLATFORMS, is_platform_domain
+from run_metrics import count, get_logger
+
+log = get_logger(__name__)
+
+# Platform labels that also send plenty of non-application mail still have to pass the keyword tier
+BROAD_PLATFORMS = {"mail", "linkedin"}
+
+DEFAULT_DENY_DOMAINS = [
+    "substack.com", "medium.com", "facebookmail.com", "instagram.com", "youtube.com",
+    "mailchimp.com", "amazon.com", "paypal.com", "uber.com", "wolt.com", "spotify.com",
+]
+
+JOB_KEYWORDS = [
+    "application", "applied", "applying", "apply", "candidate", "candidacy", "position", "role",
+    "interview", "recruit", "recruiter", "hiring", "hire", "job", "offer", "opening", "vacancy",
+    "resume", "cv", "assessment", "assignment", "technical exam", "home assignment", "talent",
+    "unfortunately", "not to move forward", "next steps", "thank you for your interest",
+    "מועמדות", "משרה", "משרת", "ראיון", "גיוס", "קורות חיים",
+]
+
+NOISE_KEYWORDS = [
+    "unsubscribe", "newsletter", "webinar", "% off", "sale", "discount", "receipt", "your order",
+    "invoice", "shipping", "delivery", "promo", "digest",
+]
+
+# Subset of JOB_KEYWORDS that is distinctive enough to send to Graph's $search
+SERVER_SEARCH_TERMS = ["application", "interview", "position", "candidate", "recruiter", "offer", "מועמדות", "משרה"]
+
+
+def _env_list(name: str, default: list) -> list:
+    raw = os.environ.get(name)
+    if raw is None:
+        return list(default)
+    return [item.strip().lower() for item in raw.split(",") if item.strip()]
+
+
+def _compile_keywords(keywords: list) -> re.Pattern:
+    # Longest first so multi-word phrases win over their prefixes. Latin keywords must start a
+    # word ("role" but not "control"); Hebrew ones may carry a prefix letter (למשרה).
+    ordered = sorted(set(keywords), key=len, reverse=True)
+    alternatives = [re.escape(k) if not k.isascii() else r"(?<!\w)" + re.escape(k) for k in ordered]
+    return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def sender_domain(msg: dict) -> str:
+    address = msg.get("from", {}).get("emailAddress", {}).get("address", "").lower()
+    return address.split("@")[-1] if "@" in address else ""
+
+
+def domain_matches(domain: str, entries: set) -> bool:
+    """True if domain or any parent domain (a.b.c → b.c → c) is in entries."""
+    parts = domain.split(".")
+    return any(".".join(parts[i:]) in entries for i in range(len(parts)))
+
+
+class Prefilter:
+    """Cheap local relevance check run between fetch and parse/classify.
+
+    Tiers, in order: sender deny list, sender allow list (ATS platforms from
+    email_parser.KNOWN_PLATFORMS plus PREFILTER_ALLOW_DOMAINS), then a keyword
+    score over subject/preview. `min_score` trades recall for precision:
+    0 keeps anything not denied, higher values need more job keywords.
+    """
+
+    def __init__(self, allow_domains: list = None, deny_domains: list = None, min_score: int = None,
+                 job_keywords: list = None, noise_keywords: list = None):
+        self.allow_domains = set(allow_domains if allow_domains is not None else _env_list("PREFILTER_ALLOW_DOMAINS", []))
+        self.deny_domains = set(deny_domains if deny_domains is not None else _env_list("PREFILTER_DENY_DOMAINS", DEFAULT_DENY_DOMAINS))
+        self.platforms = [p for p in KNOWN_PLATFORMS if p not in BROAD_PLATFORMS]
+        self.min_score = min_score if min_score is not None else int(os.environ.get("PREFILTER_MIN_SCORE", "1"))
+        self.job_pattern = _compile_keywords(job_keywords or JOB_KEYWORDS)
+        self.noise_pattern = _compile_keywords(noise_keywords or NOISE_KEYWORDS)
+        self.counts = Counter()
+
+    def score(self, subject: str, preview: str) -> int:
+        # Subject hits are worth double: templated job mail nearly always says so up front
+        return (
+            2 * len(self.job_pattern.findall(subject))
+            + len(self.job_pattern.findall(preview))
+            - len(self.noise_pattern.findall(subject))
+            - len(self.noise_pattern.findall(preview))
+        )
+
+    def decide(self, msg: dict) -> str:
+        """Return the tier that decided this message; tiers starting with "kept" pass."""
+        domain = sender_domain(msg)
+        if domain and domain_matches(domain, self.deny_domains):
+            return "dropped_deny_domain"
+        if domain and (domain_matches(domain, self.allow_domains) or is_platform_domain(domain, self.platforms)):
+            return "kept_allow_domain"
+        if self.score(msg.get("subject", "") or "", msg.get("bodyPreview", "") or "") >= self.min_score:
+            return "kept_keywords"
+        return "dropped_keywords"
+
+    def filter(self, messages: list) -> list:
+        kept = []
+        for msg in messages:
+            tier = self.decide(msg)
+            self.counts[tier] += 1
+            if tier.startswith("kept"):
+                kept.append(msg)
+        count("prefilter.kept", len(kept))
+        count("prefilter.dropped", len(messages) - len(kept))
+        return kept
+
+    def report(self):
+        total = sum(self.counts.values())
+        dropped = sum(n for tier, n in self.counts.items() if tier.startswith("dropped"))
+        log.info(f"🧹 Prefilter: kept {total - dropped}/{total} emails")
+        for tier, n in sorted(self.counts.items()):
+            log.info(f"   {tier}: {n}")
+
+
+def build_search_query(start: str, end: str = None, terms: list = None) -> str:
+    """KQL for Graph $search covering [start, end) and the job terms or ATS senders."""
+    clauses = [f"subject:{t}" for t in (terms or SERVER_SEARCH_TERMS)]
+    clauses += [f"from:{p}" for p in KNOWN_PLATFORMS if p not in BROAD_PLATFORMS]
+    window = f"received>={start[:10]}"
+    if end:
+        window += f" AND received<{end[:10]}"
+    return f"{window} AND ({' OR '.join(clauses)})"
+
+
+def server_search_enabled() -> bool:
+    return os.environ.get("PREFILTER_SERVER_SEARCH", "false").lower() == "true"
+
+
+def prefilter_enabled() -> bool:
+    return os.environ.get("PREFILTER", "on").lower() != "off"
+
+
+def prefilter_messages(messages: list) -> list:
+    """Run the default prefilter unless PREFILTER=off, printing per-tier counts."""
+    if not prefilter_enabled():
+        return messages
+    prefilter = Prefilter()
+    kept = prefilter.filter(messages)
+    prefilter.report()
+    return kept
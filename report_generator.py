@@ -1,48 +1,232 @@
-import pandas as pd
-from datetime import datetime
+import hashlib
+import html
+import json
 import os
-import pdfkit
+from datetime import datetime
+
+import pandas as pd
+
+from excel_writer import STALE_AFTER_DAYS
+from run_metrics import count, get_logger, span
+
+log = get_logger(__name__)
 
 EXCEL_FILE = "job_applications.xlsx"
-REPORTS_DIR = "reports"
+REPORTS_DIR = os.environ.get("REPORT_OUTPUT_FOLDER", "reports")
+# Any of csv, pdf, html, parquet (parquet needs pyarrow or fastparquet)
+REPORT_FORMATS = [f.strip().lower() for f in os.environ.get("REPORT_FORMATS", "csv,pdf").split(",") if f.strip()]
+REPORT_STATE_FILE = "report_state.json"  # inside REPORTS_DIR: hash and paths of the last report
+REPORT_VERSION = 4  # bump when the layout changes, so unchanged data is still re-rendered once
+PENDING = ["Applied", "No Reply Yet"]
 
+# TrueType font for the PDF (fpdf2), so Hebrew company names and titles render; else the first of FONT_CANDIDATES
+REPORT_FONT = os.environ.get("REPORT_FONT", "")
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    r"C:\Windows\Fonts\arial.ttf",
+]
 
-path_wkhtmltopdf = r"C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe"
-config = pdfkit.configuration(wkhtmltopdf=path_wkhtmltopdf)
+# Columns shown in the PDF/HTML table, with relative widths; the CSV keeps every column
+REPORT_COLUMNS = [
+    ("company", "Company", 3),
+    ("job_title", "Job title", 4),
+    ("date_applied", "Applied", 2),
+    ("response_type", "Status", 2),
+    ("follow_up", "Follow up from", 2),
+    ("email", "Contact", 4),
+    ("subject", "Subject", 6),
+]
 
 
+def pending_rows(df) -> pd.DataFrame:
+    """Applied / No Reply Yet rows, oldest first per status, with the date a follow-up is due."""
+    pending = df[df["response_type"].isin(PENDING)].sort_values(by=["response_type", "date_applied"])
+    dates = pd.to_datetime(pending["date_applied"], errors="coerce")
+    pending = pending.assign(
+        date_applied=dates.dt.strftime("%Y-%m-%d").fillna(""),
+        follow_up=(dates + pd.Timedelta(days=STALE_AFTER_DAYS)).dt.strftime("%Y-%m-%d").fillna(""),
+    )
+    return pending.reset_index(drop=True)
 
-def generate_summary_report():
-    if not os.path.exists(EXCEL_FILE):
-        print("❌ Excel file not found.")
-        return
 
-    df = pd.read_excel(EXCEL_FILE)
+def pending_summary(pending: pd.DataFrame, stale_before: str) -> dict:
+    """Pending, stale and oldest-pending figures of the rows the report lists, so the header matches its table."""
+    dates = pending["date_applied"][pending["date_applied"] != ""]
+    return {
+        "pending": len(pending),
+        "stale": int((dates < stale_before).sum()),
+        "oldest_pending": dates.min() if len(dates) else None,
+    }
 
-    # Ensure required column exists
-    if "response_type" not in df.columns:
-        print("❌ Missing 'response_type' column.")
-        return
 
-    # Filter: only show Applied / No Reply Yet
-    df_pending = df[df["response_type"].isin(["Applied", "No Reply Yet"])]
-    df_pending = df_pending.sort_values(by=["response_type", "date_applied"])
+def summary_lines(summary: dict) -> list:
+    if not summary:
+        return []
+    total = sum(summary["counts"].values())
+    detail = ", ".join(f"{status or '?'} {n}" for status, n in summary["counts"].items())
+    lines = [f"Applications (archived included): {total} ({detail})" if total else "Applications: 0"]
+    if summary["pending"]:
+        lines.append(f"Waiting for a reply: {summary['pending']}, {summary['stale']} of them for more than "
+                     f"{STALE_AFTER_DAYS} days (oldest from {summary['oldest_pending']})")
+    return lines
 
-    # Format date
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    os.makedirs(REPORTS_DIR, exist_ok=True)
 
-    # CSV Export
-    csv_path = os.path.join(REPORTS_DIR, f"job_followup_{today_str}.csv")
-    df_pending.to_csv(csv_path, index=False)
+def content_hash(pending: pd.DataFrame, summary: dict, formats: list) -> str:
+    """Hash of everything a report shows, so an identical report is never rendered twice."""
+    digest = hashlib.sha256(json.dumps([REPORT_VERSION, formats, list(pending.columns), summary],
+                                       sort_keys=True, default=str).encode())
+    digest.update(pd.util.hash_pandas_object(pending.astype(str), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _state_path() -> str:
+    return os.path.join(REPORTS_DIR, REPORT_STATE_FILE)
+
+
+def load_state() -> dict:
+    try:
+        with open(_state_path(), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict):
+    with open(_state_path(), "w") as f:
+        json.dump(state, f, indent=2)
+
 
-    # Optional: PDF Export via HTML
+def render_pdf(pending: pd.DataFrame, path: str, title: str, lines: list) -> bool:
     try:
-        import pdfkit
-        html = df_pending.to_html(index=False)
-        pdf_path = os.path.join(REPORTS_DIR, f"job_followup_{today_str}.pdf")
-        #pdfkit.from_string(html, pdf_path, configuration=config)
-        pdfkit.from_string(html, pdf_path, configuration=config)
-        print(f"📄 Report saved as: {csv_path} and {pdf_path}")
+        from fpdf import FPDF
+        from fpdf.errors import FPDFException
+        from fpdf.fonts import FontFace
     except ImportError:
-        print(f"✅ CSV report saved: {csv_path} (PDF skipped - install `pdfkit` for PDF output)")
+        log.warning("⚠️ PDF report skipped - install fpdf2")
+        return False
+
+    pdf = FPDF(orientation="landscape", format="A4")
+    pdf.set_auto_page_break(True, margin=12)
+    font = REPORT_FONT or next((p for p in FONT_CANDIDATES if os.path.exists(p)), "")
+    if font:
+        pdf.add_font("report", fname=font)
+        pdf.set_font("report", size=8)
+        text = str
+        try:
+            # Bidi and shaping per cell, so mixed Hebrew/English lays out like dir=auto in the HTML
+            pdf.set_text_shaping(True)
+        except FPDFException:
+            log.warning("⚠️ Install uharfbuzz to lay out right-to-left text in the PDF report")
+    else:
+        log.warning("⚠️ No TrueType font found for the PDF report (set REPORT_FONT); non-Latin text is replaced")
+        pdf.set_font("helvetica", size=8)
+
+        def text(value):
+            return str(value).encode("latin-1", "replace").decode("latin-1")
+
+    columns = [(key, label, width) for key, label, width in REPORT_COLUMNS if key in pending.columns]
+    pdf.add_page()
+    pdf.set_font_size(14)
+    pdf.cell(text=text(title), new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font_size(9)
+    for line in lines:
+        pdf.multi_cell(0, 5, text(line), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(3)
+    pdf.set_font_size(8)
+    # The header row repeats on every page; long cells wrap instead of being cut
+    with pdf.table(col_widths=[width for _, _, width in columns], text_align="LEFT", line_height=4,
+                   headings_style=FontFace(fill_color=224)) as table:
+        table.row([label for _, label, _ in columns])
+        for values in pending[[key for key, _, _ in columns]].itertuples(index=False, name=None):
+            table.row([text("" if value is None else value) for value in values])
+    pdf.output(path)
+    return True
+
+
+def render_html(pending: pd.DataFrame, path: str, title: str, lines: list):
+    columns = [(key, label) for key, label, _ in REPORT_COLUMNS if key in pending.columns]
+    table = pending[[key for key, _ in columns]].rename(columns=dict(columns))
+    body = "".join(f"<p>{html.escape(line)}</p>" for line in lines)
+    # dir=auto lets each Hebrew cell lay out right-to-left on its own
+    cells = table.to_html(index=False).replace("<td>", '<td dir="auto">')
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+            "td,th{border:1px solid #ccc;padding:2px 6px;text-align:start}th{background:#e0e0e0}</style></head>"
+            f"<body><h1>{html.escape(title)}</h1>{body}{cells}</body></html>"
+        )
+
+
+def render(fmt: str, pending: pd.DataFrame, path: str, title: str, lines: list) -> bool:
+    """Write one report format; False when it cannot be produced here."""
+    if fmt == "csv":
+        pending.to_csv(path, index=False)
+    elif fmt == "parquet":
+        try:
+            pending.to_parquet(path, index=False)
+        except ImportError:
+            log.warning("⚠️ Parquet report skipped - install pyarrow (or fastparquet)")
+            return False
+    elif fmt == "pdf":
+        return render_pdf(pending, path, title, lines)
+    elif fmt == "html":
+        render_html(pending, path, title, lines)
+    else:
+        log.warning(f"⚠️ Unknown report format {fmt!r} (use csv, pdf, html or parquet)")
+        return False
+    return True
+
+
+def generate_summary_report(df=None, store=None, formats: list = None, force: bool = False):
+    """Write the follow-up report from `df` (the active rows), or from the store if not given.
+
+    Nothing is rendered when the pending rows and status totals hash the same
+    as the last report's; the earlier files are returned instead. Status totals
+    come from the store's incrementally maintained status aggregate; the
+    pending and stale figures from the rows in the table.
+    """
+    formats = formats or REPORT_FORMATS
+    if df is None or store is None:
+        from app_store import get_store
+
+        store = store or get_store(EXCEL_FILE)
+        if df is None:
+            from excel_writer import split_archived
+
+            df, _ = split_archived(store.to_dataframe())
+
+    if "response_type" not in df.columns:
+        log.error("❌ Missing 'response_type' column.")
+        return
+
+    today = datetime.now()
+    stale_before = (pd.Timestamp(today.date()) - pd.Timedelta(days=STALE_AFTER_DAYS)).strftime("%Y-%m-%d")
+    pending = pending_rows(df)
+    summary = {**store.status_summary(PENDING), **pending_summary(pending, stale_before)}
+
+    digest = content_hash(pending, summary, formats)
+    state = load_state()
+    if not force and state.get("hash") == digest and all(os.path.exists(p) for p in state.get("paths", [])):
+        count("report.skipped")
+        log.info(f"📄 Report unchanged since {state.get('generated')}, skipping: {', '.join(state['paths'])}")
+        return state["paths"]
+
+    today_str = today.strftime("%Y-%m-%d")
+    title = f"Job application follow-ups - {today_str}"
+    lines = summary_lines(summary)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(REPORTS_DIR, f"job_followup_{today_str}.{fmt}")
+        with span(f"report.{fmt}"):
+            if render(fmt, pending, path, title, lines):
+                paths.append(path)
+    save_state({"hash": digest, "generated": today_str, "paths": paths})
+    count("report.rendered")
+    log.info(f"📄 Report saved ({len(pending)} pending): {', '.join(paths)}")
+    return paths
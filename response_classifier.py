@@ -3,6 +3,10 @@ from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 import time
 
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
 client: OpenAI = None  # Global OpenAI client instance
 
 def configure_openai(api_key: str):
@@ -38,6 +42,6 @@ Respond with only the label, nothing else.
         classification = response.choices[0].message.content.strip()
         return classification
     except Exception as e:
-        print("OpenAI API error:", e)
+        log.error("OpenAI API error: %s", e)
         time.sleep(2)
         return "Error"
@@ -0,0 +1,155 @@
+import os
+import re
+from collections import Counter
+
+from run_metrics import count, get_logger
+
+log = get_logger(__name__)
+
+# (label, weight, pattern). Weights express how decisive a phrase is on its own:
+# 3 = the label by itself, 1 = supporting evidence that needs another hit.
+RULES = [
+    ("Rejected", 3, r"regret to inform"),
+    ("Rejected", 3, r"not (?:to )?(?:be )?mov(?:e|ing) forward"),
+    ("Rejected", 3, r"(?:decided|chosen) to (?:pursue|proceed|move forward|go ahead) with other candidates"),
+    ("Rejected", 3, r"no longer (?:being )?consider(?:ed|ing)"),
+    ("Rejected", 3, r"will not be (?:moving|proceeding|progressing)"),
+    ("Rejected", 3, r"position has (?:now )?been filled"),
+    ("Rejected", 3, r"(?:were|was|have) not (?:been )?selected"),
+    ("Rejected", 3, r"other candidates whose"),
+    ("Rejected", 2, r"unfortunately"),
+    ("Rejected", 3, r"החלטנו (?:שלא|לא) להתקדם"),
+    ("Rejected", 3, r"לא נוכל להתקדם"),
+    ("Rejected", 2, r"לצערנו"),
+
+    ("Interview", 3, r"invitation to .{0,40}?interview"),
+    ("Interview", 3, r"interview (?:invitation|invite|request)"),
+    ("Interview", 3, r"schedule (?:an? |your )?(?:interview|call|chat|meeting)"),
+    ("Interview", 3, r"(?:phone|technical|video|onsite|on-site) (?:screen|interview)"),
+    ("Interview", 3, r"technical exam and guidelines"),
+    ("Interview", 2, r"home (?:assignment|assessment|task)"),
+    ("Interview", 2, r"your availability"),
+    ("Interview", 2, r"calendly\.com"),
+    ("Interview", 3, r"הזמנה לראיון"),
+    ("Interview", 2, r"ראיון"),
+
+    ("Offer", 3, r"offer letter"),
+    ("Offer", 3, r"(?:pleased|happy|delighted|excited) to (?:extend an |make you an )?offer"),
+    ("Offer", 3, r"job offer"),
+    ("Offer", 2, r"welcome (?:aboard|to the team)"),
+    ("Offer", 2, r"joining our .{0,40}? program"),
+    ("Offer", 1, r"congratulations"),
+    ("Offer", 3, r"הצעת עבודה"),
+
+    ("Applied", 3, r"thank you for (?:applying|your application|submitting)"),
+    ("Applied", 3, r"thanks for (?:applying|your application)"),
+    ("Applied", 3, r"application (?:has been |was )?(?:received|submitted)"),
+    ("Applied", 3, r"(?:we|we've|we have) received your application"),
+    ("Applied", 3, r"your application (?:was sent|to|for)"),
+    ("Applied", 2, r"applying for"),
+    ("Applied", 2, r"application for"),
+    ("Applied", 1, r"thank you for your interest"),
+    ("Applied", 3, r"מועמדות למשרת"),
+    ("Applied", 3, r"קיבלנו את (?:מועמדותך|קורות החיים)"),
+    ("Applied", 3, r"תודה על הגשת"),
+]
+
+
+class RuleClassifier:
+    """Deterministic labeler for templated job mail.
+
+    All rules are folded into one compiled alternation with a named group per
+    rule, so a message is scanned once per field. A label is only returned
+    when its score reaches `min_score` and beats the runner-up by `min_margin`;
+    otherwise the message is left for the LLM.
+    """
+
+    def __init__(self, rules: list = None, min_score: int = None, min_margin: int = None):
+        self.rules = rules or RULES
+        self.min_score = min_score if min_score is not None else int(os.environ.get("RULES_MIN_SCORE", "2"))
+        self.min_margin = min_margin if min_margin is not None else int(os.environ.get("RULES_MIN_MARGIN", "1"))
+        self.pattern = re.compile(
+            "|".join(f"(?P<r{i}>{pattern})" for i, (_, _, pattern) in enumerate(self.rules)),
+            re.IGNORECASE,
+        )
+
+    def matches(self, text: str) -> set:
+        hits = set()
+        for m in self.pattern.finditer(text or ""):
+            hits.add(int(m.lastgroup[1:]))
+        return hits
+
+    def classify(self, subject: str, preview: str):
+        """Return (label or None, decision path string)."""
+        hits = self.matches(subject) | self.matches(preview)
+        if not hits:
+            return None, "rules:no-match"
+
+        scores = Counter()
+        for i in hits:
+            label, weight, _ = self.rules[i]
+            scores[label] += weight
+
+        ranked = scores.most_common()
+        top_label, top_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        detail = ",".join(f"{label}={score}" for label, score in ranked)
+
+        if top_score >= self.min_score and top_score - runner_up >= self.min_margin:
+            return top_label, f"rules:{top_label}({detail})"
+        return None, f"rules:low-confidence({detail})"
+
+
+def classify_cascade(records: list, llm_classify=None, rules: RuleClassifier = None, model=None):
+    """Label records with the rules where confident, then with the local model
+    (local_classifier) if given, and send only the rest to the LLM.
+
+    Returns (labels, decision_paths) in input order.
+    """
+    if llm_classify is None:
+        from llm_classifier import classify_many  # openai is only needed once something escalates
+
+        llm_classify = classify_many
+    rules = rules or RuleClassifier()
+    labels = [None] * len(records)
+    paths = [""] * len(records)
+    escalate = []
+
+    for i, record in enumerate(records):
+        label, path = rules.classify(record.get("subject", ""), record.get("preview", ""))
+        labels[i] = label
+        paths[i] = path
+        if label is None:
+            escalate.append(i)
+    by_rules = len(records) - len(escalate)
+
+    guesses = {}
+    if model is not None and escalate:
+        remaining = []
+        for i, (label, confidence) in zip(escalate, model.predict([records[i] for i in escalate])):
+            guesses[i] = (label, confidence)
+            if label is not None and model.confident(confidence):
+                paths[i] += f" -> local:{label}({confidence:.2f})"
+                if not model.audit():
+                    labels[i] = label
+                    continue
+            remaining.append(i)
+        model.stats["local"] += len(escalate) - len(remaining)
+        model.stats["llm"] += len(remaining)
+        escalate = remaining
+
+    if escalate:
+        llm_labels = llm_classify([records[i] for i in escalate])
+        for i, label in zip(escalate, llm_labels):
+            labels[i] = label
+            paths[i] += " -> llm"
+        if model is not None:
+            model.learn([records[i] for i in escalate], llm_labels, [guesses[i] for i in escalate])
+
+    count("classified.rules", by_rules)
+    count("classified.local", len(records) - by_rules - len(escalate) if model is not None else 0)
+    count("classified.llm", len(escalate))
+    local = f", local model {len(records) - by_rules - len(escalate)}" if model is not None else ""
+    log.info(f"⚡ Rules labeled {by_rules}/{len(records)} emails locally{local}, "
+             f"{len(escalate)} escalated to the LLM")
+    return labels, paths
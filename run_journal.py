@@ -0,0 +1,204 @@
+import os
+import sqlite3
+from datetime import datetime
+
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+JOURNAL_FILE = os.environ.get("RUN_JOURNAL", "run_journal.db")
+
+
+class Page(list):
+    """A page of Graph messages that remembers where it came from.
+
+    `stream` identifies the paging chain (a shard URL or a delta state key),
+    `url` is the request that produced the page and `next_url` the
+    @odata.nextLink it returned, so a journal can restart the chain here.
+    """
+
+    def __init__(self, messages=(), stream: str = "", url: str = "", next_url: str = None, delta_link: str = None):
+        super().__init__(messages)
+        self.stream = stream
+        self.url = url
+        self.next_url = next_url
+        self.delta_link = delta_link  # set on the last page of a delta round
+        self.seq = None
+
+
+class RunJournal:
+    """Per-page progress journal that lets an interrupted run resume.
+
+    Records which pages each paging chain has fetched, the label of every
+    classified message and which messages have been committed to the store.
+    A rerun restarts each chain at its oldest page that was not fully
+    committed, skips committed messages and reuses known labels.
+    """
+
+    def __init__(self, path: str = JOURNAL_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS run (key TEXT PRIMARY KEY, value TEXT)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    stream TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    next_url TEXT,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (stream, seq)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id TEXT PRIMARY KEY,
+                    label TEXT,
+                    committed INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+        self._outstanding = {}  # (stream, seq) -> records from that page not yet committed
+        self.resumed = False
+
+    def get(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM run WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set(self, key: str, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO run VALUES (?, ?)", (key, value))
+
+    @property
+    def active(self) -> bool:
+        return self.get("status") == "in_progress"
+
+    def start(self, since: str) -> str:
+        """Begin a run, or resume the interrupted one; returns the watermark to use."""
+        if self.active:
+            since = self.get("since")
+            pages = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            committed = self.conn.execute("SELECT COUNT(*) FROM messages WHERE committed = 1").fetchone()[0]
+            log.info(f"⏯️ Resuming run started {self.get('started')}: {pages} pages fetched, {committed} messages committed")
+            self.resumed = True
+            return since
+
+        self.clear()
+        self.set("status", "in_progress")
+        self.set("since", since)
+        self.set("started", datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"))
+        return since
+
+    def resume_urls(self) -> dict:
+        """Where each journaled stream should restart: its oldest unfinished page,
+        otherwise the page after its last one, or None once the chain is finished.
+
+        Returned as a plain dict so fetch threads never touch the journal.
+        """
+        resume = {}
+        streams = [r[0] for r in self.conn.execute("SELECT DISTINCT stream FROM pages")]
+        for stream in streams:
+            row = self.conn.execute(
+                "SELECT url FROM pages WHERE stream = ? AND done = 0 ORDER BY seq LIMIT 1", (stream,)
+            ).fetchone()
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT next_url FROM pages WHERE stream = ? ORDER BY seq DESC LIMIT 1", (stream,)
+                ).fetchone()
+            resume[stream] = row[0]
+        return resume
+
+    def delta_links(self) -> dict:
+        """deltaLinks of delta rounds that finished before the interruption, by state key."""
+        rows = self.conn.execute("SELECT key, value FROM run WHERE key LIKE 'delta_link:%'").fetchall()
+        return {key[len("delta_link:"):]: value for key, value in rows}
+
+    def page_fetched(self, page: Page):
+        """Record a fetched page and drop messages a previous attempt already committed."""
+        if page.delta_link:
+            self.set(f"delta_link:{page.stream}", page.delta_link)
+        row = self.conn.execute(
+            "SELECT seq FROM pages WHERE stream = ? AND url = ?", (page.stream, page.url)
+        ).fetchone()
+        with self.conn:
+            if row:
+                seq = row[0]
+                self.conn.execute("UPDATE pages SET next_url = ? WHERE stream = ? AND seq = ?",
+                                  (page.next_url, page.stream, seq))
+            else:
+                seq = self.conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM pages WHERE stream = ?", (page.stream,)
+                ).fetchone()[0]
+                self.conn.execute("INSERT INTO pages VALUES (?, ?, ?, ?, 0)",
+                                  (page.stream, seq, page.url, page.next_url))
+
+        ids = [m["id"] for m in page if m.get("id")]
+        committed = self.committed_ids(ids)
+        fresh = Page([m for m in page if m.get("id") not in committed], page.stream, page.url,
+                     page.next_url, page.delta_link)
+        fresh.seq = seq
+        self._outstanding[(page.stream, seq)] = 0
+        return fresh
+
+    def committed_ids(self, ids: list) -> set:
+        found = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT id FROM messages WHERE committed = 1 AND id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(r[0] for r in rows)
+        return found
+
+    def track(self, page: Page, count: int):
+        """`count` records from `page` are on their way to the store."""
+        key = (page.stream, page.seq)
+        self._outstanding[key] = self._outstanding.get(key, 0) + count
+        if not self._outstanding[key]:
+            self._page_done(key)
+
+    def labels(self, ids: list) -> dict:
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT id, label FROM messages WHERE label IS NOT NULL AND id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def classified(self, items: list):
+        """Remember (message_id, label) pairs so a replay does not classify them again."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO messages (id, label) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET label = excluded.label",
+                [(mid, label) for mid, label in items if mid and label != "Error"],
+            )
+
+    def committed(self, records: list):
+        """Mark records (carrying message_id and page_key) as persisted and close finished pages."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO messages (id, committed) VALUES (?, 1) ON CONFLICT(id) DO UPDATE SET committed = 1",
+                [(r.message_id,) for r in records if r.message_id],
+            )
+        for r in records:
+            if r.page_key in self._outstanding:
+                self._outstanding[r.page_key] -= 1
+                if not self._outstanding[r.page_key]:
+                    self._page_done(r.page_key)
+
+    def _page_done(self, key):
+        with self.conn:
+            self.conn.execute("UPDATE pages SET done = 1 WHERE stream = ? AND seq = ?", key)
+
+    def complete(self):
+        """The run's results are exported; forget it so the next run starts fresh."""
+        self.clear()
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM run")
+            self.conn.execute("DELETE FROM pages")
+            self.conn.execute("DELETE FROM messages")
+        self._outstanding.clear()
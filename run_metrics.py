@@ -0,0 +1,274 @@
+"""Run instrumentation: timing spans, counters, profiling, a JSON run report and a Prometheus textfile.
+
+    with span("graph.request"):
+        ...
+    count("emails.fetched", len(page))
+
+Spans aggregate by name (calls, total and max seconds); counters are plain
+sums. At the end of a run write_reports() saves both as METRICS_JSON and,
+for node_exporter's textfile collector, METRICS_PROM. PROFILE=cprofile or
+PROFILE=sample profiles the run (see profiled()). Everything goes through
+get_logger(): LOG_FORMAT=text prints the familiar lines, LOG_FORMAT=json
+one JSON object per line with the run id, mailbox and enclosing span.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+METRICS_JSON = os.environ.get("METRICS_JSON", "run_metrics.json")  # "" disables
+METRICS_PROM = os.environ.get("METRICS_PROM", "run_metrics.prom")  # "" disables
+PROFILE = os.environ.get("PROFILE", "").lower()  # "", "cprofile" or "sample"
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+PROM_PREFIX = "jobtracker"
+
+_current_span = contextvars.ContextVar("span", default="")
+_metrics = None
+
+
+class RunMetrics:
+    """Thread-safe spans and counters for one run, keyed by dotted names."""
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.labels = {}  # e.g. mailbox; attached to every Prometheus sample
+        self.counters = Counter()
+        self.spans = {}  # name -> [calls, total seconds, max seconds]
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        token = _current_span.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            _current_span.reset(token)
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            stats = self.spans.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def count(self, name: str, amount=1):
+        if amount:
+            with self.lock:
+                self.counters[name] += amount
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "run_id": self.run_id,
+                "labels": dict(self.labels),
+                "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+                "duration_s": round(time.time() - self.started, 3),
+                "counters": {name: round(value, 6) for name, value in sorted(self.counters.items())},
+                "spans": {
+                    name: {"calls": calls, "total_s": round(total, 6), "max_s": round(peak, 6)}
+                    for name, (calls, total, peak) in sorted(self.spans.items())
+                },
+            }
+
+    def prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        labels = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(snap["labels"].items()))
+
+        def sample(metric, value, extra=""):
+            inner = ",".join(part for part in (extra, labels) if part)
+            return f"{PROM_PREFIX}_{metric}{{{inner}}} {value}" if inner else f"{PROM_PREFIX}_{metric} {value}"
+
+        lines = [
+            f"# HELP {PROM_PREFIX}_run_duration_seconds Wall time of the last run.",
+            f"# TYPE {PROM_PREFIX}_run_duration_seconds gauge",
+            sample("run_duration_seconds", snap["duration_s"]),
+            f"# HELP {PROM_PREFIX}_run_timestamp_seconds When the last run finished.",
+            f"# TYPE {PROM_PREFIX}_run_timestamp_seconds gauge",
+            sample("run_timestamp_seconds", int(time.time())),
+        ]
+        for name, value in snap["counters"].items():
+            metric = f"{_metric_name(name)}_total"
+            lines += [f"# TYPE {PROM_PREFIX}_{metric} counter", sample(metric, value)]
+        if snap["spans"]:
+            for metric, kind, field in (("span_seconds_total", "counter", "total_s"),
+                                        ("span_calls_total", "counter", "calls"),
+                                        ("span_max_seconds", "gauge", "max_s")):
+                lines.append(f"# TYPE {PROM_PREFIX}_{metric} {kind}")
+                lines += [sample(metric, s[field], f'span="{_escape(name)}"') for name, s in snap["spans"].items()]
+        return "\n".join(lines) + "\n"
+
+
+def _metric_name(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name).lower()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, text: str):
+    # node_exporter may read the file at any moment, so never expose a half-written one
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def get_metrics() -> RunMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = RunMetrics()
+    return _metrics
+
+
+def span(name: str):
+    """Time a block under `name`: `with span("openai.call"): ...`."""
+    return get_metrics().span(name)
+
+
+def count(name: str, amount=1):
+    get_metrics().count(name, amount)
+
+
+def write_reports(json_path: str = METRICS_JSON, prom_path: str = METRICS_PROM) -> list:
+    """Save the run's metrics; returns the paths written."""
+    metrics = get_metrics()
+    written = []
+    if json_path:
+        _write_atomic(json_path, json.dumps(metrics.snapshot(), indent=2) + "\n")
+        written.append(json_path)
+    if prom_path:
+        _write_atomic(prom_path, metrics.prometheus())
+        written.append(prom_path)
+    if written:
+        get_logger("metrics").info("📈 Run metrics saved: %s", ", ".join(written))
+    return written
+
+
+class StdoutHandler(logging.Handler):
+    """Writes to whatever sys.stdout is when a record is emitted, so redirect_stdout still works."""
+
+    def emit(self, record):
+        try:
+            sys.stdout.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        metrics = get_metrics()
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": metrics.run_id,
+            **metrics.labels,
+        }
+        if _current_span.get():
+            entry["span"] = _current_span.get()
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A child of the "jobtracker" logger, which is set up on first use from LOG_FORMAT/LOG_LEVEL."""
+    root = logging.getLogger("jobtracker")
+    if not root.handlers:
+        handler = StdoutHandler()
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root.getChild(name)
+
+
+class SamplingProfiler:
+    """Samples every thread's stack each `interval` seconds into folded stacks (flamegraph.pl, speedscope)."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+    def top(self, limit: int = 10) -> list:
+        """(function, share of samples) for the functions most often on top of a stack."""
+        leaves = Counter()
+        for stack, samples in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += samples
+        total = sum(leaves.values()) or 1
+        return [(leaf, samples / total) for leaf, samples in leaves.most_common(limit)]
+
+
+@contextlib.contextmanager
+def profiled(mode: str = PROFILE, prefix: str = "run_profile"):
+    """Profile the block: "cprofile" saves <prefix>.pstats, "sample" saves <prefix>.folded."""
+    log = get_logger("profile")
+    if mode == "cprofile":
+        import cProfile
+        import io
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{prefix}.pstats")
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+            log.info("🔬 cProfile saved to %s.pstats\n%s", prefix, out.getvalue())
+    elif mode == "sample":
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            profiler.save(f"{prefix}.folded")
+            hot = ", ".join(f"{leaf} {share:.0%}" for leaf, share in profiler.top(8))
+            log.info("🔬 Sampled %d stacks to %s.folded; hottest: %s", sum(profiler.stacks.values()), prefix, hot)
+    else:
+        yield
@@ -0,0 +1,181 @@
+import os
+import queue
+import threading
+
+from email_parser import ApplicationRecord, parse_batch, parse_message
+from local_classifier import get_local_model
+from pipeline import TrackerContext
+from prefilter import Prefilter, prefilter_enabled
+from rule_classifier import classify_cascade
+from run_metrics import count, get_logger, span
+
+log = get_logger(__name__)
+
+PREFETCH_PAGES = int(os.environ.get("PIPELINE_PREFETCH_PAGES", "2"))
+MICRO_BATCH = int(os.environ.get("PIPELINE_MICRO_BATCH", "100"))
+# Only this much of bodyPreview is kept once a record has been classified
+PREVIEW_CHARS = int(os.environ.get("PIPELINE_PREVIEW_CHARS", "100"))
+
+
+def prefetch(iterable, maxsize: int = PREFETCH_PAGES):
+    """Run `iterable` on a background thread, at most `maxsize` items ahead of the consumer.
+
+    This is what lets page N+1 download while page N is parsed and classified.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=max(maxsize, 1))
+    stop = threading.Event()
+    done = object()
+    error = []
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            error.append(e)
+        finally:
+            # Close the source here, on its own thread, so e.g. fetch workers stop too
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+            put(done)
+
+    thread = threading.Thread(target=producer, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+        thread.join()
+
+
+def classify_records(records: list, journal=None, model=None) -> list:
+    """Label a micro-batch in place (rules, then the local model, LLM for the rest) and trim previews.
+
+    With a journal, messages labelled before an interruption keep their label
+    and new labels are journaled before the batch is committed. `model` is the
+    local_classifier.LocalClassifier consulted before the LLM.
+    """
+    known = journal.labels([r.message_id for r in records if r.message_id]) if journal else {}
+    todo = [r for r in records if r.message_id not in known]
+    labels, paths = classify_cascade([{"subject": r.subject, "preview": r.preview} for r in todo], model=model)
+    for record, label, path in zip(todo, labels, paths):
+        record.response_type = label
+        # The last stage in the decision path decided: "rules:…", "… -> local:…" or "… -> llm"
+        record.label_source = path.rsplit(" -> ", 1)[-1].split(":", 1)[0]
+    if journal:
+        journal.classified([(r.message_id, r.response_type) for r in todo])
+    paths = iter(paths)
+    for record in records:
+        if record.message_id in known:
+            record.response_type, path = known[record.message_id], "journal"
+        else:
+            path = next(paths)
+        record.preview = record.preview[:PREVIEW_CHARS]
+        log.info(f"{record.company} | {record.job_title} | {record.response_type} | {record.subject} | {path}")
+    return records
+
+
+def page_records(page, messages: list) -> list:
+    """Parse messages into records that remember their Graph id and journaled page."""
+    records = []
+    for msg in messages:
+        parsed = parse_message(msg)
+        if parsed is not None:
+            record = ApplicationRecord.from_dict(parsed)
+            record.message_id = msg.get("id", "")
+            record.page_key = (page.stream, page.seq)
+            records.append(record)
+    return records
+
+
+def run_pipeline(pages, ctx: TrackerContext = None, micro_batch: int = MICRO_BATCH, journal=None,
+                 enricher=None) -> int:
+    """Stream fetched pages through prefilter → parse → classify → persist.
+
+    Pages are consumed as they arrive; records are committed to the store in
+    micro-batches, and the workbook export and report run once at the end.
+    With a RunJournal every page, label and commit is checkpointed so an
+    interrupted run can resume (see run_journal). An `enricher`
+    (graph_batch.BatchEnricher) fetches full bodies for emails that passed
+    the prefilter. Returns the number of records committed.
+    """
+    ctx = ctx or TrackerContext()
+    prefilter = Prefilter() if prefilter_enabled() else None
+    model = get_local_model()
+    pending = []
+    fetched = 0
+    committed = 0
+
+    def flush():
+        nonlocal committed
+        if not pending:
+            return
+        with span("stage.classify"):
+            classify_records(pending, journal, model)
+        with span("stage.persist"):
+            ctx.merge([record.to_dict() for record in pending])
+            if journal:
+                journal.committed(pending)
+        committed += len(pending)
+        count("records.committed", len(pending))
+        pending.clear()
+
+    source = prefetch(pages)
+    while True:
+        # Time the consumer spends blocked on Graph, i.e. what overlapping did not hide
+        with span("stage.fetch_wait"):
+            page = next(source, None)
+        if page is None:
+            break
+        fetched += len(page)
+        count("emails.fetched", len(page))
+        if journal:
+            page = journal.page_fetched(page)
+        with span("stage.prefilter"):
+            kept = prefilter.filter(page) if prefilter else page
+        if enricher:
+            with span("stage.enrich"):
+                enricher.enrich(kept)
+        with span("stage.parse"):
+            if journal:
+                records = page_records(page, kept)
+                journal.track(page, len(records))
+                pending.extend(records)
+            else:
+                pending.extend(ApplicationRecord.from_dict(record) for record in parse_batch(kept))
+        if len(pending) >= micro_batch:
+            flush()
+    flush()
+
+    ctx.fetched += fetched
+    log.info(f"Fetched {fetched} emails.")
+    if prefilter:
+        prefilter.report()
+    if enricher:
+        enricher.report()
+    if model is not None:
+        model.report()
+    # A resumed run may have committed everything before the interruption but never exported
+    if committed or (journal and journal.resumed):
+        active_df = ctx.export()
+        ctx.report(active_df)
+        ctx.print_io_summary()
+    return committed
@@ -0,0 +1,204 @@
+import atexit
+import os
+import pickle
+import threading
+from contextlib import ExitStack, contextmanager
+
+import msal
+
+from run_metrics import get_logger
+
+log = get_logger(__name__)
+
+# "" keeps tokens in memory only, e.g. for app-only CI runs whose tokens expire before the next run
+TOKEN_CACHE_FILE = os.environ.get("TOKEN_CACHE_FILE", "msal_token_cache.bin")
+HTTP_CACHE_FILE = os.environ.get("MSAL_HTTP_CACHE_FILE", "msal_http_cache.bin")
+# Fernet key (cryptography ships with msal) for where the OS keystore is unavailable; keep it in a
+# secret store or the environment, never next to the cache
+TOKEN_CACHE_KEY = os.environ.get("TOKEN_CACHE_KEY", "")
+LEGACY_KEY_FILE = "msal_token_cache.key"  # generated by an earlier version, next to the cache
+
+try:
+    import msal_extensions
+except ImportError:  # optional: OS keystore encryption (DPAPI / Keychain / libsecret)
+    msal_extensions = None
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive advisory lock on `path + ".lock"`, held across processes."""
+    with open(path + ".lock", "a+") as f:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TokenCacheError(Exception):
+    """No way to encrypt the token cache: neither the OS keystore nor TOKEN_CACHE_KEY."""
+
+
+class FilePersistence:
+    """Fernet-encrypted, owner-only token cache file."""
+
+    def __init__(self, path: str, key: str):
+        from cryptography.fernet import Fernet
+
+        self.path = path
+        self.fernet = Fernet(key.encode())
+
+    def modified(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        from cryptography.fernet import InvalidToken
+
+        try:
+            return self.fernet.decrypt(data).decode("utf-8")
+        except InvalidToken:
+            if data.lstrip().startswith(b"{"):
+                # Plaintext cache from an older version: encrypt it in place
+                content = data.decode("utf-8")
+                self.save(content)
+                log.info(f"🔑 Encrypted the existing token cache {self.path}")
+                return content
+            log.warning("⚠️ Token cache %s does not match the key; signing in again", self.path)
+            return None
+
+    def save(self, content: str):
+        data = self.fernet.encrypt(content.encode("utf-8"))
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+
+
+class LockedTokenCache(msal.SerializableTokenCache):
+    """SerializableTokenCache kept in sync with a file shared by several processes.
+
+    Reads reload the file when another process changed it; writes reload,
+    apply and save under the file lock so concurrent refreshes never lose
+    each other's tokens. (Same design as msal-extensions' PersistedTokenCache.)
+    """
+
+    def __init__(self, persistence: FilePersistence):
+        super().__init__()
+        self.persistence = persistence
+        self.loaded_at = None
+        self._held = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def _locked(self):
+        # msal calls search/modify from inside add, so only the outermost call takes the file lock
+        with self._held, ExitStack() as stack:
+            if not self._depth:
+                stack.enter_context(file_lock(self.persistence.path))
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+
+    def _reload_if_changed(self):
+        modified = self.persistence.modified()
+        if self.loaded_at is None or modified > self.loaded_at:
+            content = self.persistence.load()
+            if content:
+                self.deserialize(content)
+            self.loaded_at = modified
+
+    def _write(self, change, *args, **kwargs):
+        with self._locked():
+            self._reload_if_changed()
+            change(*args, **kwargs)
+            self.persistence.save(self.serialize())
+            self.loaded_at = self.persistence.modified()
+
+    def add(self, event, **kwargs):
+        self._write(super().add, event, **kwargs)
+
+    def modify(self, credential_type, old_entry, new_key_value_pairs=None):
+        self._write(super().modify, credential_type, old_entry, new_key_value_pairs)
+
+    def search(self, credential_type, *args, **kwargs):
+        with self._locked():
+            self._reload_if_changed()
+        return super().search(credential_type, *args, **kwargs)
+
+    def find(self, credential_type, *args, **kwargs):
+        with self._locked():
+            self._reload_if_changed()
+        return super().find(credential_type, *args, **kwargs)
+
+
+def get_token_cache(path: str = TOKEN_CACHE_FILE, key: str = TOKEN_CACHE_KEY) -> msal.SerializableTokenCache:
+    """Persistent, process-shared MSAL token cache, always encrypted at rest.
+
+    TOKEN_CACHE_KEY (Fernet) is used when set; otherwise msal-extensions
+    encrypts with the OS keystore. With neither, TokenCacheError is raised
+    rather than leaving the key where the cache can be read. An empty
+    `path` gives an in-memory cache.
+    """
+    if not path:
+        return msal.SerializableTokenCache()
+    if key:
+        return LockedTokenCache(FilePersistence(path, key))
+
+    reason = "msal-extensions is not installed"
+    if msal_extensions is not None:
+        try:
+            persistence = msal_extensions.build_encrypted_persistence(path)
+            return msal_extensions.PersistedTokenCache(persistence)
+        except Exception as e:
+            reason = f"the OS keystore is unavailable ({e})"
+
+    hint = f" An earlier version generated {LEGACY_KEY_FILE}; its content is the key." if os.path.exists(
+        LEGACY_KEY_FILE) else ""
+    raise TokenCacheError(
+        f"Cannot encrypt the token cache {path}: {reason}. Set TOKEN_CACHE_KEY to a Fernet key from a "
+        f"secret store (python -c \"from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())\"), "
+        f"or set TOKEN_CACHE_FILE=\"\" to keep tokens in memory only.{hint}")
+
+
+def save_http_cache(cache: dict, path: str = HTTP_CACHE_FILE):
+    try:
+        with file_lock(path):
+            with open(path, "wb") as f:
+                pickle.dump(cache, f)
+    except OSError as e:
+        log.warning("⚠️ Could not save MSAL HTTP cache: %s", e)
+
+
+def get_http_cache(path: str = HTTP_CACHE_FILE) -> dict:
+    """MSAL's HTTP cache (authority discovery/metadata), persisted at exit so startup skips those calls."""
+    try:
+        with open(path, "rb") as f:
+            cache = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError):
+        cache = {}
+    atexit.register(save_http_cache, cache, path)
+    return cache
@@ -0,0 +1,413 @@
+"""Watch mode: a long-running process that applies new mail to the tracker as it arrives.
+
+    python cli.py watch
+
+Everything a batch run rebuilds each time stays warm here: the Graph token
+(refreshed from the msal cache), the pooled Graph session, the OpenAI
+client and classification cache, the local model and the TrackerContext
+with its DataFrame.
+
+With WATCH_NOTIFICATION_URL set (a public HTTPS URL that forwards to
+WATCH_HOST:WATCH_PORT, e.g. a tunnel or reverse proxy) the daemon
+subscribes to Graph change notifications for the inbox. Each notification
+makes it fetch and apply just that message. Without it, it polls the usual
+delta sync: every WATCH_POLL_MIN seconds while mail keeps arriving,
+doubling up to WATCH_POLL_MAX when the mailbox is quiet. With notifications
+a poll still runs every WATCH_POLL_MAX seconds, because Graph does not
+guarantee delivery.
+
+The store is updated as soon as a message is classified. The workbook and
+report are rewritten once mail has stopped arriving for WATCH_EXPORT_DELAY
+seconds.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+from run_metrics import count, get_logger, get_metrics, span, write_reports
+
+log = get_logger(__name__)
+
+WATCH_HOST = os.environ.get("WATCH_HOST", "127.0.0.1")
+WATCH_PORT = int(os.environ.get("WATCH_PORT", "8765"))
+WATCH_NOTIFICATION_URL = os.environ.get("WATCH_NOTIFICATION_URL", "")  # "" polls only
+WATCH_CLIENT_STATE = os.environ.get("WATCH_CLIENT_STATE", "")  # shared secret; random per run if unset
+WATCH_POLL_MIN = float(os.environ.get("WATCH_POLL_MIN", "30"))
+WATCH_POLL_MAX = float(os.environ.get("WATCH_POLL_MAX", "600"))
+WATCH_EXPORT_DELAY = float(os.environ.get("WATCH_EXPORT_DELAY", "60"))
+WATCH_TOKEN_REFRESH = float(os.environ.get("WATCH_TOKEN_REFRESH", "1800"))
+# Graph allows mail subscriptions up to 7 days; renew well before expiry
+SUBSCRIPTION_MINUTES = int(os.environ.get("WATCH_SUBSCRIPTION_MINUTES", "4200"))
+SUBSCRIPTION_RENEW_BEFORE = 3600
+SEEN_LIMIT = 10000  # message ids remembered so a notification and a later poll never apply one email twice
+ALERT_STATUSES = {"Interview", "Offer"}
+
+
+class NotificationReceiver:
+    """The webhook endpoint Graph posts change notifications to.
+
+    Answers the subscription validation handshake, drops notifications whose
+    clientState does not match, and queues (message id, received at) pairs.
+    Graph wants a reply within 3 seconds, so nothing is fetched here.
+    """
+
+    def __init__(self, client_state: str, host: str = WATCH_HOST, port: int = WATCH_PORT):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.client_state = client_state
+        self.queue = queue.Queue()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                receiver.handle(self)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="webhook", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_port
+
+    def start(self) -> "NotificationReceiver":
+        self.thread.start()
+        log.info("👂 Listening for Graph notifications on %s:%s", *self.server.server_address[:2])
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        token = parse_qs(urlparse(request.path).query).get("validationToken")
+        if token:
+            return self._reply(request, 200, token[0].encode(), "text/plain")
+        try:
+            payload = json.loads(request.rfile.read(int(request.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            return self._reply(request, 400)
+        now = time.monotonic()
+        for notification in payload.get("value", []):
+            if notification.get("clientState") != self.client_state:
+                count("watch.rejected")
+                continue
+            message_id = (notification.get("resourceData") or {}).get("id")
+            if message_id:
+                count("watch.notifications")
+                self.queue.put((message_id, now))
+        self._reply(request, 202)
+
+    @staticmethod
+    def _reply(request, status: int, body: bytes = b"", content_type: str = None):
+        request.send_response(status)
+        if content_type:
+            request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+class WatchDaemon:
+    """Keeps one mailbox's tracker current until stop() is called.
+
+    `token_provider` returns a Graph access token (auth.authenticate_graph
+    with the loaded config); it is called again every WATCH_TOKEN_REFRESH
+    seconds and after a 401. `on_update` is called with the records of every
+    applied batch; by default interviews and offers are logged loudly.
+    """
+
+    def __init__(self, token_provider, user_email: str, is_ci: bool, notification_url: str = WATCH_NOTIFICATION_URL,
+                 poll_min: float = WATCH_POLL_MIN, poll_max: float = WATCH_POLL_MAX,
+                 export_delay: float = WATCH_EXPORT_DELAY, on_update=None, port: int = WATCH_PORT):
+        from graph_fetcher import mailbox_path
+        from local_classifier import get_local_model
+        from pipeline import TrackerContext
+        from prefilter import Prefilter, prefilter_enabled
+
+        self.token_provider = token_provider
+        self.user_email = user_email
+        self.is_ci = is_ci
+        self.mailbox = mailbox_path(user_email, is_ci)
+        self.notification_url = notification_url
+        self.poll_min = poll_min
+        self.poll_max = max(poll_max, poll_min)
+        self.export_delay = export_delay
+        self.on_update = on_update or self.alert
+        self.port = port
+
+        self.ctx = TrackerContext()
+        self.prefilter = Prefilter() if prefilter_enabled() else None
+        self.model = get_local_model()
+        self.receiver = None
+        self.subscription = None  # {"id", "expires"} once Graph accepted it
+        self.next_renewal = 0.0  # after a failed renewal, the next attempt waits until then
+        self.seen = OrderedDict()
+        self.stopped = threading.Event()
+
+        self.token = None
+        self.token_at = 0.0
+        self.interval = poll_min
+        self.next_poll = 0.0  # catch up on what arrived while the daemon was down first
+        self.export_due = None  # set while applied changes wait for the workbook/report
+        self.watermark = None  # date-mode polls fetch from here
+
+    # -- warm state ------------------------------------------------------------
+
+    def access_token(self, refresh: bool = False) -> str:
+        if refresh or self.token is None or time.monotonic() - self.token_at > WATCH_TOKEN_REFRESH:
+            with span("watch.auth"):
+                self.token = self.token_provider()
+            self.token_at = time.monotonic()
+        return self.token
+
+    def graph(self, method: str, path: str, ok_statuses=(200,), **kwargs):
+        """One Graph call on the shared session, retried once with a fresh token after a 401."""
+        from graph_fetcher import GRAPH_BASE_URL, get_scheduler
+
+        url = path if path.startswith("http") else f"{GRAPH_BASE_URL}/{path}"
+        for refresh in (False, True):
+            headers = {"Authorization": f"Bearer {self.access_token(refresh)}"}
+            response = get_scheduler().request(method, url, ok_statuses=ok_statuses, headers=headers, **kwargs)
+            if response.status_code != 401:
+                break
+        return response
+
+    # -- change notifications --------------------------------------------------
+
+    def subscribe(self) -> bool:
+        """Start the webhook receiver and ask Graph to notify it of new inbox mail."""
+        import secrets
+
+        client_state = WATCH_CLIENT_STATE or secrets.token_urlsafe(24)
+        self.receiver = NotificationReceiver(client_state, port=self.port).start()
+        expires = datetime.now(timezone.utc) + timedelta(minutes=SUBSCRIPTION_MINUTES)
+        response = self.graph("POST", "subscriptions", ok_statuses=(201,), json={
+            "changeType": "created",
+            "notificationUrl": self.notification_url,
+            "resource": f"{self.mailbox}/mailFolders('inbox')/messages",
+            "expirationDateTime": expires.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "clientState": client_state,
+        })
+        if response.status_code != 201:
+            log.warning("⚠️ Graph subscription failed, polling instead: %s %s",
+                        response.status_code, response.text[:200])
+            return False
+        self.subscription = {"id": response.json()["id"], "expires": time.monotonic() + SUBSCRIPTION_MINUTES * 60}
+        log.info("🔔 Subscribed to new mail in %s (subscription %s)", self.mailbox, self.subscription["id"])
+        return True
+
+    def renew_subscription(self):
+        now = time.monotonic()
+        if (not self.subscription or now < self.next_renewal
+                or self.subscription["expires"] - now > SUBSCRIPTION_RENEW_BEFORE):
+            return
+        expires = datetime.now(timezone.utc) + timedelta(minutes=SUBSCRIPTION_MINUTES)
+        response = self.graph("PATCH", f"subscriptions/{self.subscription['id']}",
+                              json={"expirationDateTime": expires.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        if response.status_code == 200:
+            self.subscription["expires"] = time.monotonic() + SUBSCRIPTION_MINUTES * 60
+            count("watch.renewals")
+        else:
+            # Gone (e.g. removed by Graph); start over, the poll covers the gap
+            log.warning("⚠️ Subscription renewal failed (%s), subscribing again", response.status_code)
+            self.receiver.stop()
+            self.subscription = None
+            if not self.subscribe():
+                self.interval = self.poll_min
+
+    def unsubscribe(self):
+        if self.subscription:
+            try:
+                self.graph("DELETE", f"subscriptions/{self.subscription['id']}", ok_statuses=(204,))
+            except Exception as e:
+                log.warning("⚠️ Could not delete subscription %s: %s", self.subscription["id"], e)
+            self.subscription = None
+        if self.receiver:
+            self.receiver.stop()
+
+    def fetch_messages(self, message_ids: list) -> list:
+        from graph_fetcher import SELECT_FIELDS
+
+        messages = []
+        for message_id in message_ids:
+            response = self.graph("GET", f"{self.mailbox}/messages/{message_id}?$select={SELECT_FIELDS}",
+                                  ok_statuses=(200, 404))
+            if response.status_code == 200:
+                messages.append(response.json())
+        return messages
+
+    # -- polling ---------------------------------------------------------------
+
+    def poll(self) -> int:
+        """One delta (or date) sync round; returns emails applied."""
+        from delta_sync import commit_delta_links
+        from graph_fetcher import GRAPH_TIME_FORMAT
+        from main import get_last_run, save_last_run, stream_job_emails
+
+        started = datetime.now(timezone.utc)
+        since = self.watermark or get_last_run()
+        applied = 0
+        with span("watch.poll"):
+            for page in stream_job_emails(self.access_token(), self.user_email, self.is_ci, since=since):
+                applied += self.apply(list(page))
+        commit_delta_links()
+        # Date-mode polls overlap the previous one a little; seen ids make that harmless
+        self.watermark = (started - timedelta(minutes=5)).strftime(GRAPH_TIME_FORMAT)
+        if applied:
+            save_last_run(started.strftime("%Y-%m-%dT00:00:00Z"))
+        count("watch.polls")
+
+        if self.subscription:
+            self.interval = self.poll_max
+        else:
+            self.interval = self.poll_min if applied else min(self.interval * 2, self.poll_max)
+        self.next_poll = time.monotonic() + self.interval
+        return applied
+
+    # -- applying mail ---------------------------------------------------------
+
+    def remember(self, message_ids: list):
+        for message_id in message_ids:
+            self.seen[message_id] = None
+        while len(self.seen) > SEEN_LIMIT:
+            self.seen.popitem(last=False)
+
+    def apply(self, messages: list) -> int:
+        """prefilter → parse → classify → store for messages not applied before; returns records stored."""
+        from email_parser import ApplicationRecord, parse_message
+        from stream_pipeline import classify_records
+
+        messages = [msg for msg in messages if msg.get("id") not in self.seen]
+        count("emails.fetched", len(messages))
+        ids = [msg["id"] for msg in messages if msg.get("id")]
+        if self.prefilter:
+            messages = self.prefilter.filter(messages)
+        records = []
+        for msg in messages:
+            parsed = parse_message(msg)
+            if parsed is not None:
+                record = ApplicationRecord.from_dict(parsed)
+                record.message_id = msg.get("id", "")
+                records.append(record)
+        if not records:
+            self.remember(ids)
+            return 0
+        with span("stage.classify"):
+            classify_records(records, model=self.model)
+        with span("stage.persist"):
+            self.ctx.merge([record.to_dict() for record in records])
+        # Only now: a batch that failed above is fetched and applied again by the next poll
+        self.remember(ids)
+        count("records.committed", len(records))
+        if self.export_due is None:
+            self.export_due = time.monotonic() + self.export_delay
+        self.on_update(records)
+        return len(records)
+
+    def apply_notified(self, items: list):
+        """Fetch and apply the messages named by a burst of notifications."""
+        ids = list(dict.fromkeys(message_id for message_id, _ in items if message_id not in self.seen))
+        if ids:
+            with span("watch.apply"):
+                self.apply(self.fetch_messages(ids))
+        done = time.monotonic()
+        for _, received in items:
+            get_metrics().observe("watch.notification_to_store", done - received)
+
+    @staticmethod
+    def alert(records: list):
+        for record in records:
+            if record.response_type in ALERT_STATUSES:
+                log.warning(f"🔔 {record.response_type}: {record.company} | {record.job_title} | {record.subject}")
+
+    def export(self):
+        with span("watch.export"):
+            active_df = self.ctx.export()
+            self.ctx.report(active_df)
+        self.export_due = None
+        write_reports()
+
+    def try_export(self):
+        """export(), rescheduled instead of raised: the store already holds the changes."""
+        try:
+            self.export()
+        except Exception as e:
+            # e.g. PermissionError while the workbook is open in Excel
+            delay = max(self.export_delay, self.poll_min)
+            count("watch.export_failed")
+            log.error("❌ Export failed, retrying in %.0fs: %s", delay, e)
+            self.export_due = time.monotonic() + delay
+
+    # -- main loop -------------------------------------------------------------
+
+    def next_notifications(self, timeout: float) -> list:
+        """Notifications that arrived within `timeout` seconds, drained as one burst."""
+        if not self.receiver:
+            self.stopped.wait(timeout)
+            return []
+        try:
+            items = [self.receiver.queue.get(timeout=max(timeout, 0))]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                items.append(self.receiver.queue.get_nowait())
+            except queue.Empty:
+                return [item for item in items if item is not None]
+
+    def run(self):
+        get_metrics().labels["mailbox"] = self.user_email
+        self.access_token()
+        if self.notification_url:
+            self.subscribe()
+        log.info("👀 Watching %s (poll every %.0f-%.0fs%s)", self.user_email, self.poll_min, self.poll_max,
+                 ", plus change notifications" if self.subscription else "")
+        try:
+            while not self.stopped.is_set():
+                now = time.monotonic()
+                if now >= self.next_poll:
+                    try:
+                        self.poll()
+                    except Exception as e:
+                        # A bad round (network, throttling) must not end the daemon
+                        count("watch.poll_failed")
+                        log.error("❌ Poll failed, retrying in %.0fs: %s", self.poll_min, e)
+                        self.next_poll = now + self.poll_min
+                if self.export_due is not None and time.monotonic() >= self.export_due:
+                    self.try_export()
+                try:
+                    self.renew_subscription()
+                except Exception as e:
+                    count("watch.renew_failed")
+                    log.error("❌ Subscription renewal failed, retrying in %.0fs: %s", self.poll_min, e)
+                    self.next_renewal = time.monotonic() + self.poll_min
+
+                deadlines = [self.next_poll] + ([self.export_due] if self.export_due is not None else [])
+                items = self.next_notifications(min(deadlines) - time.monotonic())
+                if items:
+                    try:
+                        self.apply_notified(items)
+                    except Exception as e:
+                        count("watch.apply_failed")
+                        log.error("❌ Could not apply %d notified emails, the next poll will: %s", len(items), e)
+                        self.next_poll = min(self.next_poll, time.monotonic() + self.poll_min)
+        finally:
+            if self.export_due is not None:
+                self.try_export()
+            self.unsubscribe()
+            write_reports()
+            log.info("👋 Watch stopped.")
+
+    def stop(self):
+        self.stopped.set()
+        if self.receiver:
+            self.receiver.queue.put(None)  # wake the loop